@@ -1,72 +1,384 @@
 # agents.py - command router connecting memory/vision/LLM/search
-import re
-from llm_adapter import chat
-from history import add_history, get_history
-from memory import remember, recall, get_last_capture
-from ocr_tools import capture_image, ocr_image
-from web_search import search_web_fallback
-from spellfix import maybe_fix_query
+import os, re, time, queue, datetime, threading
+from config import HEDGE_DELAY, HEDGE_DEADLINE
+from llm_adapter import chat, chat_stream, ChatSession, known_available
+from history import add_history, get_history, find_history
+from memory import remember, recall, get_last_capture, fact_keys
+from ocr_index import search_text
+from spellfix import maybe_fix_query, add_command, add_vocabulary, add_vocabulary_source
+from tracing import span, record, format_summary
+from namespace import PerNamespace, start_thread, on_drop, captures_dir
 
 SYSTEM_PROMPT = (
     "You are Lyra, a concise, helpful personal assistant. Answer in clear short sentences. "
     "If information may be outdated, mention briefly that it may be."
 )
 
-def handle_command(text: str) -> str:
+RESET_COMMANDS = ("new chat", "reset chat", "new conversation", "forget conversation")
+
+# fixed replies, listed so their speech can be synthesized ahead of time (tts_handler.prewarm)
+NO_CAPTURE = "No recent capture found."
+CAMERA_FAILED = "Camera not available or capture failed."
+LLM_OFFLINE = "Cannot analyze image (LLM offline)."
+RESET_DONE = "Okay, starting a fresh conversation."
+NO_HISTORY = "No history yet."
+NO_ANSWER = "Sorry, I couldn't get an answer in time."
+FIXED_REPLIES = (NO_CAPTURE, CAMERA_FAILED, LLM_OFFLINE, RESET_DONE, NO_HISTORY, NO_ANSWER)
+
+def _recent_turns(budget: int, since):
+    """(user, reply) pairs from the history log, oldest first, for ChatSession replay."""
+    ev = find_history(ev_type=["chat", "reply"], since=since, limit=max(4, budget // 16))
+    turns, pending = [], None
+    for e in ev:
+        if e["type"] == "chat":
+            pending = e["detail"]
+        elif pending is not None:
+            turns.append((pending, e["detail"]))
+            pending = None
+    return turns
+
+# one conversation for the desktop UI, plus one per server session
+_session = ChatSession(system=SYSTEM_PROMPT, window=_recent_turns)
+_sessions = PerNamespace(lambda name: ChatSession(system=SYSTEM_PROMPT, window=_recent_turns) if name else _session)
+on_drop(_sessions.drop)
+
+def _log_turn(question: str, answer: str):
+    add_history("chat", question)
+    add_history("reply", answer[:2000])
+
+# ---- command registry ----
+# Keyword commands are hashed by their exact lowercased text; parameterized
+# ones are bucketed by first word and tried with precompiled patterns.
+class Intent:
+    __slots__ = ("name", "handler", "exact", "pattern", "prefix")
+
+    def __init__(self, name, handler, exact=(), pattern=None, prefix=None):
+        self.name = name
+        self.handler = handler
+        self.exact = tuple(p.lower() for p in exact)
+        self.pattern = re.compile(pattern, re.I) if isinstance(pattern, str) else pattern
+        self.prefix = prefix.lower() if prefix else None
+
+_intents = {}                # name -> Intent
+_exact_routes = {}           # "read text" -> Intent
+_prefix_routes = {}          # "remember" -> [Intent, ...]
+_pattern_routes = []         # patterns with no fixed first word
+_timing_hooks = []
+
+def register_command(name: str, handler, exact=(), pattern=None, prefix: str | None = None,
+                     correctable: bool = True):
+    """
+    Registers an intent. handler(text, match) -> reply string; match is the
+    re.Match for pattern intents and None for exact ones. prefix is the
+    literal first word of the pattern, used to skip unrelated patterns.
+    correctable=False keeps the spell-fixer from turning typos into the exact
+    phrases (for commands that change state). Registering an existing name
+    replaces it.
+    """
+    if name in _intents:
+        unregister_command(name)
+    intent = Intent(name, handler, exact, pattern, prefix)
+    _intents[name] = intent
+    for phrase in intent.exact:
+        _exact_routes[phrase] = intent
+        add_command(phrase, correctable=correctable)
+    if intent.pattern is not None:
+        if intent.prefix:
+            _prefix_routes.setdefault(intent.prefix, []).append(intent)
+        else:
+            _pattern_routes.append(intent)
+    return intent
+
+def unregister_command(name: str):
+    intent = _intents.pop(name, None)
+    if intent is None:
+        return
+    for phrase in intent.exact:
+        if _exact_routes.get(phrase) is intent:
+            del _exact_routes[phrase]
+    if intent.prefix and intent in _prefix_routes.get(intent.prefix, ()):
+        _prefix_routes[intent.prefix].remove(intent)
+    if intent in _pattern_routes:
+        _pattern_routes.remove(intent)
+
+def add_timing_hook(fn):
+    """fn(intent_name, seconds) is called after every handled command (and "chat" for Q&A)."""
+    _timing_hooks.append(fn)
+
+def _report_timing(name: str, seconds: float):
+    for fn in _timing_hooks:
+        try:
+            fn(name, seconds)
+        except Exception:
+            pass
+
+def route(t: str):
+    """Returns (intent, match) for a command, or (None, None) for general Q&A."""
+    key = t.lower()
+    intent = _exact_routes.get(key)
+    if intent is not None:
+        return intent, None
+    words = key.split(None, 1)
+    for intent in _prefix_routes.get(words[0] if words else "", ()):
+        m = intent.pattern.match(t)
+        if m:
+            return intent, m
+    for intent in _pattern_routes:
+        m = intent.pattern.match(t)
+        if m:
+            return intent, m
+    return None, None
+
+def _handle_builtin(t: str) -> str | None:
+    """Runs a built-in command; returns None when t should go to general Q&A."""
+    intent, m = route(t)
+    if intent is None:
+        return None
+    t0 = time.perf_counter()
+    try:
+        return intent.handler(t, m)
+    finally:
+        if _timing_hooks:
+            _report_timing(intent.name, time.perf_counter() - t0)
+
+# ---- built-in commands ----
+def _cmd_remember(t, m):
+    k, v = m.group(1).strip(), m.group(2).strip()
+    add_vocabulary([k], kind="fact")
+    return remember(k, v)
+
+def _cmd_recall(t, m):
+    q = m.group(1).strip()
+    out = recall(q)
+    if out.startswith("I don't have anything saved"):
+        hits = search_text(q, limit=3)
+        if hits:
+            out += " But it appears in your captures:\n" + _format_text_hits(hits)
+    return out
+
+def _format_text_hits(hits):
+    return "\n".join(f"{os.path.basename(p)}: {snippet}" for p, snippet in hits)
+
+def _cmd_find_text(t, m):
+    hits = search_text(m.group(1).strip(), limit=5)
+    if not hits:
+        return "No OCR'd capture contains that. (Run 'python ocr_batch.py' to index older captures.)"
+    return _format_text_hits(hits)
+
+# OCR/camera (cv2, pytesseract) and web search (bs4) are imported by the
+# commands that need them, so starting Lyra doesn't pay for them.
+def _cmd_capture(t, m):
+    from ocr_tools import capture_image
+    p = capture_image()
+    if not p:
+        return CAMERA_FAILED
+    add_vocabulary([os.path.splitext(os.path.basename(p))[0]], kind="capture")
+    return f"Captured to {p}. You can say 'read text' or 'describe'."
+
+def _cmd_read_text(t, m):
+    last = get_last_capture()
+    if not last:
+        return NO_CAPTURE
+    from ocr_tools import ocr_image
+    return ocr_image(last["path"]) or "(No text detected.)"
+
+def _cmd_describe(t, m):
+    last = get_last_capture()
+    if not last:
+        return NO_CAPTURE
+    from ocr_tools import ocr_image
+    hint = ocr_image(last["path"])
+    prompt = f"Describe the latest captured image briefly. OCR text (may be noisy):\n{hint}"
+    ans = chat(prompt, system=SYSTEM_PROMPT)
+    if ans.startswith("(LLM offline/error)"):
+        return LLM_OFFLINE
+    return ans
+
+def _cmd_reset(t, m):
+    _sessions.get().reset()
+    return RESET_DONE
+
+def _cmd_stats(t, m):
+    return format_summary()
+
+def _cmd_history(t, m):
+    # history [type] [last N minutes|hours|days]
+    ev_type, num, unit = m.group(1), m.group(2), m.group(3)
+    if not ev_type and not num:
+        ev = get_history(30)
+    else:
+        since = None
+        if num:
+            try:
+                delta = datetime.timedelta(**{unit.lower() + "s": int(num)})
+                since = datetime.datetime.now(datetime.timezone.utc) - delta
+            except (OverflowError, ValueError):
+                since = None            # further back than datetime goes: the whole history
+        ev = find_history(ev_type=ev_type and ev_type.lower(), since=since, limit=30)
+    if not ev:
+        return NO_HISTORY
+    return "\n".join(f"[{e['time']}] {e['type']}: {e['detail']}" for e in ev)
+
+# per-intent timings ("command.recall", "command.chat", ...) feed the tracing histograms
+add_timing_hook(lambda name, seconds: record(f"command.{name}", seconds))
+
+def _capture_names():
+    folder = captures_dir()
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.splitext(f)[0] for f in os.listdir(folder)]
+
+# words the spell-fixer must treat as known, loaded on first lookup
+add_vocabulary_source("fact", fact_keys)
+add_vocabulary_source("capture", _capture_names)
+
+register_command("remember", _cmd_remember, pattern=r"^remember\s+(.+?)\s+as\s+(.+)$", prefix="remember")
+register_command("recall", _cmd_recall, pattern=r"^what did i say about\s+(.+)$", prefix="what")
+register_command("find_text", _cmd_find_text, pattern=r"^find text\s+(.+)$", prefix="find")
+register_command("capture", _cmd_capture, exact=("capture",))
+register_command("read_text", _cmd_read_text, exact=("read text", "ocr", "read"))
+register_command("describe", _cmd_describe, exact=("describe", "analyze", "describe image", "what's in the image"))
+register_command("reset", _cmd_reset, exact=RESET_COMMANDS, correctable=False)
+register_command("stats", _cmd_stats, exact=("stats", "show stats", "timings"))
+register_command("history", _cmd_history, prefix="history", pattern=(
+    r"^history(?:\s+(?!last\b|past\b)(\w+))?(?:\s+(?:last|past)\s+(\d+)\s*(minute|hour|day)s?)?$"))
+
+def handle_command(text: str, stats: dict | None = None) -> str:
+    return "".join(handle_command_stream(text, stats=stats))
+
+def handle_command_stream(text: str, stats: dict | None = None):
+    """
+    Like handle_command but yields the reply in fragments. Built-in commands
+    yield their whole reply at once; general Q&A streams the hedged answer
+    (see _hedged_answer). stats receives ttft/total from the LLM stream,
+    "winner" ("llm", "web" or "none") and "answer_time" (seconds until the
+    winning path produced its first text).
+    """
     t = (text or "").strip()
     if not t:
-        return ""
-
-    # Light spell-fix for command-like phrases
-    t = maybe_fix_query(t)
-
-    # remember <k> as <v>
-    m = re.match(r"^remember\s+(.+?)\s+as\s+(.+)$", t, flags=re.I)
-    if m:
-        k, v = m.group(1).strip(), m.group(2).strip()
-        return remember(k, v)
-
-    # recall
-    m = re.match(r"^what did i say about\s+(.+)$", t, flags=re.I)
-    if m:
-        return recall(m.group(1).strip())
-
-    # capture
-    if t.lower() == "capture":
-        p = capture_image()
-        if not p:
-            return "Camera not available or capture failed."
-        return f"Captured to {p}. You can say 'read text' or 'describe'."
-
-    # OCR last capture
-    if t.lower() in ("read text", "ocr", "read"):
-        last = get_last_capture()
-        if not last:
-            return "No recent capture found."
-        return ocr_image(last["path"]) or "(No text detected.)"
-
-    # describe image
-    if t.lower() in ("describe", "analyze", "describe image", "what's in the image"):
-        last = get_last_capture()
-        if not last:
-            return "No recent capture found."
-        hint = ocr_image(last["path"])
-        prompt = f"Describe the latest captured image briefly. OCR text (may be noisy):\n{hint}"
-        ans = chat(prompt, system=SYSTEM_PROMPT)
-        if ans.startswith("(LLM offline/error)"):
-            return "Cannot analyze image (LLM offline)."
-        return ans
-
-    # history
-    if t.lower() == "history":
-        ev = get_history(30)
-        if not ev:
-            return "No history yet."
-        return "\n".join(f"[{e['time']}] {e['type']}: {e['detail']}" for e in ev)
-
-    # General Q&A: LLM first, fallback to web search if LLM fails or returns too short.
-    ans = chat(t, system=SYSTEM_PROMPT)
-    if ans.startswith("(LLM offline/error)") or len(ans.strip()) < 4:
-        ans = search_web_fallback(t)
-    add_history("chat", t)
-    return ans
+        return
+    t_start = time.perf_counter()
+    try:
+        # Light spell-fix for command-like phrases
+        with span("spellfix"):
+            t = maybe_fix_query(t)
+        out = _handle_builtin(t)
+        if out is not None:
+            yield out
+            return
+
+        reply = []
+        t0 = time.perf_counter()
+        for piece in _hedged_answer(t, stats if stats is not None else {}):
+            reply.append(piece)
+            yield piece
+        _log_turn(t, "".join(reply).strip())
+        if _timing_hooks:
+            _report_timing("chat", time.perf_counter() - t0)
+    finally:
+        # the whole request, including time the consumer spent between fragments
+        record("handle_command", time.perf_counter() - t_start)
+
+def _web_acceptable(ans: str) -> bool:
+    return bool(ans) and not ans.startswith("Search error")
+
+def _hedged_answer(t: str, stats: dict, delay: float | None = HEDGE_DELAY, deadline: float = HEDGE_DEADLINE):
+    """
+    General Q&A: LLM first, web search as a hedge. The search starts when
+    the LLM fails, when it has produced nothing after `delay` seconds, or
+    right away if the model server is known to be down (from the last
+    health check or chat call; this never blocks on a check). The first
+    acceptable answer wins and the other path is cancelled. LLM output
+    counts once 4 characters are in, so errors and too-short answers can
+    still lose. If neither path has an answer after `deadline` seconds,
+    both are cancelled.
+    """
+    events = queue.Queue()
+    stop_llm, stop_web = threading.Event(), threading.Event()
+    t0 = time.monotonic()
+    session = _sessions.get()
+
+    def llm_worker():
+        err = None
+        try:
+            for piece in chat_stream(t, stats=stats, session=session, cancel=stop_llm):
+                events.put(("llm", piece))
+        except Exception as e:
+            err = e
+        finally:
+            events.put(("llm_end", err))   # always, or a won answer would wait forever
+
+    def web_worker():
+        from web_search import search_web_fallback
+        left = max(deadline - (time.monotonic() - t0), 0.0)
+        events.put(("web", search_web_fallback(t, cancel=stop_web, timeout=left)))
+
+    # never wait on a health check: unknown counts as up, and a dead server fails the stream fast
+    llm_up = known_available() is not False
+    if llm_up:
+        start_thread(llm_worker)
+    web_started = not llm_up
+    if web_started:
+        start_thread(web_worker)
+    llm_done, web_done = not llm_up, False
+    winner, buf, fallback = None, "", ""
+    try:
+        while True:
+            now = time.monotonic() - t0
+            if winner is None and now >= deadline:
+                break
+            if winner is None and not web_started and delay is not None and now >= delay:
+                web_started = True
+                start_thread(web_worker)
+            if winner is None and llm_done and (web_done or not web_started):
+                if not web_started:
+                    web_started = True
+                    start_thread(web_worker)
+                else:
+                    break
+            wait = None
+            if winner is None:
+                wait = deadline - now
+                if not web_started and delay is not None:
+                    wait = min(wait, delay - now)
+            try:
+                kind, val = events.get(timeout=max(wait, 0.01) if wait is not None else None)
+            except queue.Empty:
+                continue
+            if kind == "llm":
+                if winner == "llm":
+                    yield val
+                    continue
+                buf += val
+                if buf.startswith("(LLM offline/error)"):
+                    llm_done = True
+                elif len(buf.strip()) >= 4 and winner is None:
+                    winner = "llm"
+                    stats["answer_time"] = time.monotonic() - t0
+                    stop_web.set()
+                    yield buf.lstrip()
+            elif kind == "llm_end":
+                llm_done = True
+                if val is not None:
+                    stats["llm_error"] = str(val)
+                if winner == "llm":
+                    break
+            elif kind == "web":
+                web_done = True
+                if winner is None and _web_acceptable(val):
+                    winner = "web"
+                    stats["answer_time"] = time.monotonic() - t0
+                    stop_llm.set()
+                    yield val
+                    break
+                fallback = fallback or val
+        if winner is None:
+            yield fallback or NO_ANSWER
+    finally:
+        stop_llm.set()
+        if winner != "web":
+            stop_web.set()
+        else:
+            session.drop_context()      # the model never saw this answer; replay it from the history log
+        stats["winner"] = winner or "none"
+        stats.setdefault("answer_time", time.monotonic() - t0)
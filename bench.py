@@ -0,0 +1,307 @@
+# bench.py - offline end-to-end benchmark: local stand-ins for Ollama and the web, synthetic camera, null TTS
+import os, sys, json, time, random, shutil, argparse, tempfile, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+from concurrent.futures import ThreadPoolExecutor
+
+WORDS = ("amber", "bridge", "cobalt", "delta", "ember", "fjord", "granite", "harbor", "indigo", "juniper",
+         "kestrel", "lantern", "meadow", "nickel", "orbit", "pepper", "quartz", "river", "saffron", "timber",
+         "umber", "velvet", "willow", "xenon", "yarrow", "zephyr")
+
+def _words(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+def _serve(handler, owner):
+    """Starts a threaded HTTP server on a free localhost port; handler.owner is the fake's config."""
+    handler = type(handler.__name__, (handler,), {"owner": owner})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, addr: None     # clients hang up on cancelled requests
+    threading.Thread(target=server.serve_forever, name=f"{handler.__name__}-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, so the clients' pooled sessions behave as in production
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+class _OllamaHandler(_Handler):
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            time.sleep(self.owner.health_latency)
+            self._send(200, json.dumps({"models": [{"name": "bench"}]}).encode(), "application/json")
+        else:
+            self._send(404, b"{}", "application/json")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        fake = self.owner
+        fake.requests += 1
+        prompt = body.get("prompt", "")
+        if not prompt:                                  # warm-up: just "load the model"
+            self._send(200, json.dumps({"done": True}).encode(), "application/json")
+            return
+        stream = body.get("stream", True)
+        if stream and fake.fail_marker and prompt.rsplit("\n", 1)[-1].startswith(fake.fail_marker):
+            self._send(503, json.dumps({"error": "model unavailable"}).encode(), "application/json")
+            return
+        tokens = fake.reply(prompt)
+        done = {"done": True, "context": [1, 2, 3], "prompt_eval_count": len(prompt) // 4, "eval_count": len(tokens)}
+        if not stream:
+            time.sleep(fake.ttft + len(tokens) / fake.tokens_per_second)
+            self._send(200, json.dumps({"response": "".join(tokens), **done}).encode(), "application/json")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(fake.ttft)
+        for tok in tokens:
+            self._chunk(json.dumps({"response": tok, "done": False}).encode() + b"\n")
+            time.sleep(1.0 / fake.tokens_per_second)
+        self._chunk(json.dumps({"response": "", **done}).encode() + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+class FakeOllama:
+    """
+    /api/tags and /api/generate (NDJSON stream or one JSON reply) with a
+    fixed time to first token and token rate. Streamed questions starting
+    with fail_marker get a 503, so the hedged answer falls back to web search
+    (the summary prompt, which only quotes the question, still succeeds).
+    health_latency delays /api/tags, the health check.
+    """
+    def __init__(self, ttft: float = 0.15, tokens_per_second: float = 50.0, reply_tokens: int = 40,
+                 fail_marker: str = "[web]", health_latency: float = 0.0):
+        self.ttft = ttft
+        self.health_latency = health_latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.fail_marker = fail_marker
+        self.requests = 0
+        self.server = self.url = None
+
+    def reply(self, prompt: str) -> list:
+        rnd = random.Random(prompt)
+        return [("" if i == 0 else " ") + rnd.choice(WORDS) for i in range(self.reply_tokens)]
+
+    def start(self):
+        self.server, self.url = _serve(_OllamaHandler, self)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+class _SearchHandler(_Handler):
+    def do_GET(self):
+        fake = self.owner
+        fake.requests += 1
+        u = urlparse(self.path)
+        q = parse_qs(u.query).get("q", [""])[0]
+        if u.path.startswith("/html"):
+            time.sleep(fake.serp_latency)
+            links = "".join(f'<div class="result"><a class="result__a" href="{fake.url}/page/{i}?q={quote(q)}">'
+                            f'Result {i} for {q}</a></div>' for i in range(3))
+            self._send(200, f"<html><body>{links}</body></html>".encode(), "text/html; charset=utf-8")
+        elif u.path.startswith("/page/"):
+            time.sleep(fake.page_latency * random.uniform(0.5, 1.5))
+            rnd = random.Random(self.path)
+            paras = "".join(f"<p>{_words(rnd, 40)}.</p>" for _ in range(fake.paragraphs))
+            html = f"<html><head><title>{q}</title></head><body><nav>home | about</nav><article>{paras}</article></body></html>"
+            self._send(200, html.encode(), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"", "text/plain")
+
+class FakeSearch:
+    """A DuckDuckGo-shaped results page (/html/?q=) whose links point at generated article pages (/page/N)."""
+    def __init__(self, serp_latency: float = 0.1, page_latency: float = 0.1, paragraphs: int = 8):
+        self.serp_latency = serp_latency
+        self.page_latency = page_latency
+        self.paragraphs = paragraphs
+        self.requests = 0
+        self.server = self.url = None
+
+    def start(self):
+        self.server, self.url = _serve(_SearchHandler, self)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+def synthetic_frames(seed: int = 0, size=(480, 640), truth: list | None = None):
+    """
+    Frame source for ocr_tools.set_frame_source: dark lines of random words
+    on white. If given, truth gets each frame's text (lines joined by newlines).
+    """
+    import numpy as np, cv2
+    rnd, lock = random.Random(seed), threading.Lock()
+
+    def frame():
+        with lock:
+            lines = [_words(rnd, 3) for _ in range(5)]
+            if truth is not None:
+                truth.append("\n".join(lines))
+        img = np.full((*size, 3), 255, np.uint8)
+        for i, line in enumerate(lines):
+            cv2.putText(img, line, (30, 80 + 70 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (20, 20, 20), 2)
+        return img
+    return frame
+
+# ---- workloads: each returns one script (commands run in order by one client) ----
+def _memory_script(i, rnd):
+    keys = [f"{rnd.choice(WORDS)} {i} {k}" for k in range(5)]
+    return ([("remember", f"remember {k} as {_words(rnd, 2)}") for k in keys] +
+            [("recall", f"what did i say about {k}") for k in keys])
+
+def _chat_script(i, rnd):
+    return [("chat", f"tell me about {_words(rnd, 3)} number {i}")]
+
+def _capture_script(i, rnd):
+    return [("capture", "capture"), ("read_text", "read text"), ("describe", "describe")]
+
+def _search_script(i, rnd):
+    return [("search", f"[web] latest news on {_words(rnd, 2)} {i}")]
+
+WORKLOADS = {"memory": _memory_script, "chat": _chat_script, "capture": _capture_script, "search": _search_script}
+
+# replies that mean the command failed rather than answered (plus agents' fixed failure replies)
+ERROR_PREFIXES = ("(LLM offline/error)", "(ocr error)", "(ocr) file not found", "Search error")
+
+def _pct(xs: list, p: float) -> float:
+    return xs[min(len(xs) - 1, int(p * len(xs)))] if xs else 0.0
+
+def run(workloads, clients: int = 4, iterations: int = 10, seed: int = 0, speak=None) -> dict:
+    """
+    Runs `iterations` scripts of each workload on `clients` concurrent
+    clients and returns {"wall", "throughput", "commands": {label: stats}}.
+    """
+    from agents import handle_command, CAMERA_FAILED, LLM_OFFLINE, NO_ANSWER
+    failed = ERROR_PREFIXES + (CAMERA_FAILED, LLM_OFFLINE, NO_ANSWER)
+    rnd = random.Random(seed)
+    scripts = [WORKLOADS[w](i, rnd) for i in range(iterations) for w in workloads]
+    rnd.shuffle(scripts)
+    samples, lock = {}, threading.Lock()
+
+    def client(script):
+        for label, text in script:
+            t0 = time.perf_counter()
+            try:
+                reply = handle_command(text)
+                error = reply.startswith(failed)
+            except Exception:
+                reply, error = "", True
+            dt = time.perf_counter() - t0
+            if speak is not None and reply:
+                speak(reply)
+            with lock:
+                samples.setdefault(label, []).append((dt, error))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients, thread_name_prefix="bench-client") as pool:
+        list(pool.map(client, scripts))
+    wall = time.perf_counter() - t0
+    commands = {}
+    for label, xs in sorted(samples.items()):
+        times = sorted(dt for dt, _ in xs)
+        commands[label] = {"count": len(xs), "errors": sum(e for _, e in xs), "rate": len(xs) / wall,
+                           "p50": _pct(times, 0.50), "p95": _pct(times, 0.95), "p99": _pct(times, 0.99),
+                           "max": times[-1]}
+    total = sum(c["count"] for c in commands.values())
+    return {"wall": wall, "throughput": total / wall, "clients": clients, "commands": commands}
+
+def format_report(res: dict) -> str:
+    ms = lambda x: f"{x * 1000:.1f}"
+    lines = [f"{res['clients']} clients, {res['wall']:.2f}s wall, {res['throughput']:.1f} commands/s",
+             f"{'command':12s} {'n':>5s} {'err':>4s} {'/s':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (ms)"]
+    for label, c in res["commands"].items():
+        lines.append(f"{label:12s} {c['count']:5d} {c['errors']:4d} {c['rate']:7.1f} {ms(c['p50']):>8s} "
+                     f"{ms(c['p95']):>8s} {ms(c['p99']):>8s} {ms(c['max']):>8s}")
+    return "\n".join(lines)
+
+def compare(res: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Commands whose p95 grew, or throughput dropped, by more than tolerance versus baseline."""
+    out = []
+    for label, c in res["commands"].items():
+        b = baseline.get("commands", {}).get(label)
+        if b and b["p95"] > 0 and c["p95"] > b["p95"] * (1 + tolerance):
+            out.append(f"{label}: p95 {b['p95'] * 1000:.1f} -> {c['p95'] * 1000:.1f} ms")
+    if baseline.get("throughput") and res["throughput"] < baseline["throughput"] * (1 - tolerance):
+        out.append(f"throughput {baseline['throughput']:.1f} -> {res['throughput']:.1f} commands/s")
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark of handle_command.")
+    ap.add_argument("--workload", default="memory,chat,capture,search",
+                    help=f"comma-separated, from: {', '.join(WORKLOADS)}")
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--iterations", type=int, default=10, help="scripts per workload")
+    ap.add_argument("--ttft", type=float, default=0.15, help="fake model: seconds to first token")
+    ap.add_argument("--tps", type=float, default=50.0, help="fake model: tokens per second")
+    ap.add_argument("--reply-tokens", type=int, default=40)
+    ap.add_argument("--serp-latency", type=float, default=0.1)
+    ap.add_argument("--page-latency", type=float, default=0.1)
+    ap.add_argument("--tts-delay", type=float, default=0.0, help="null TTS backend: seconds per sentence")
+    ap.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stages", action="store_true", help="also print the per-stage tracing summary")
+    ap.add_argument("--json", help="write the results here")
+    ap.add_argument("--baseline", help="results JSON from an earlier run; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--keep", action="store_true", help="keep the temporary data directory")
+    args = ap.parse_args(argv)
+    workloads = [w.strip() for w in args.workload.split(",") if w.strip()]
+    unknown = [w for w in workloads if w not in WORKLOADS]
+    if unknown:
+        ap.error(f"unknown workload(s): {', '.join(unknown)}")
+    if "config" in sys.modules:
+        raise RuntimeError("bench.main() must run before Lyra's modules are imported")
+
+    ollama = FakeOllama(args.ttft, args.tps, args.reply_tokens).start()
+    search = FakeSearch(args.serp_latency, args.page_latency).start()
+    tmp = tempfile.mkdtemp(prefix="lyra_bench_")
+    # everything Lyra reads from config points at the stand-ins and a throwaway data dir
+    os.environ.update({"OLLAMA_HOST": ollama.url, "LYRA_SEARCH_URL": f"{search.url}/html/",
+                       "LYRA_DATA_DIR": os.path.join(tmp, "data"), "LYRA_CAPTURES_DIR": os.path.join(tmp, "captures"),
+                       "LLM_CACHE": "1" if args.llm_cache else "0", "OLLAMA_WARMUP": "0",
+                       "CAMERA_PERSISTENT": "0", "LYRA_TRACE": "1"})
+    try:
+        import ocr_tools, tts_handler, tracing
+        ocr_tools.set_frame_source(synthetic_frames(args.seed))
+        tts_handler.set_backend(tts_handler.FakeBackend(synth_delay=args.tts_delay, chars_per_second=0))
+        res = run(workloads, args.clients, args.iterations, args.seed, speak=tts_handler.speak)
+        tts_handler.get_tts().idle.wait(30)
+        res["fakes"] = {"ollama_requests": ollama.requests, "search_requests": search.requests}
+        print(format_report(res))
+        if args.stages:
+            print("\n" + tracing.format_summary())
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(res, f, indent=2)
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                regressions = compare(res, json.load(f), args.tolerance)
+            for r in regressions:
+                print(f"REGRESSION {r}")
+            return 1 if regressions else 0
+        return 0
+    finally:
+        ollama.stop()
+        search.stop()
+        if args.keep:
+            print(f"data kept in {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# benchmarks - micro-benchmarks of single modules (python -m benchmarks.<name> from the repo root); end to end: bench.py
@@ -0,0 +1,26 @@
+# benchmarks/agents.py - per-message cost of command routing and the spell-fixer (no handlers run)
+import time, random
+from agents import route
+from spellfix import maybe_fix_query
+
+def bench(n: int = 5000):
+    """python -m benchmarks.agents - routing overhead per message over synthetic inputs."""
+    rnd = random.Random(7)
+    samples = ["capture", "read text", "describe", "history", "history chat last 2 hours",
+               "remember wifi password as hunter2", "what did i say about wifi",
+               "what is the capital of france", "explain how tcp handshakes work in detail please",
+               "new chat", "ocr", "tell me a joke about databases"]
+    inputs = [rnd.choice(samples) + ("" if rnd.random() < 0.7 else f" {rnd.randint(0, 999)}")
+              for _ in range(n)]
+    t0 = time.perf_counter()
+    hits = sum(1 for x in inputs if route(x)[0] is not None)
+    dt = time.perf_counter() - t0
+    print(f"route(): {n} messages, {dt / n * 1e6:.2f} us/message, {hits} routed to commands")
+    t0 = time.perf_counter()
+    for x in inputs:
+        maybe_fix_query(x)
+    dt = time.perf_counter() - t0
+    print(f"maybe_fix_query(): {dt / n * 1e6:.2f} us/message")
+
+if __name__ == "__main__":
+    bench()
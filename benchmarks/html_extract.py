@@ -0,0 +1,74 @@
+# benchmarks/html_extract.py - extraction backends vs the old BeautifulSoup path over saved pages
+import os, sys, glob, time, random
+from html_extract import BACKENDS, extract_text
+from bench import WORDS
+
+def _legacy_extract(html: str) -> str:
+    # the previous _fetch_text implementation: full BeautifulSoup tree, all text
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script","style","noscript"]):
+        tag.extract()
+    return " ".join(soup.get_text(separator=" ").split())
+
+def synthetic_pages(n: int = 120, seed: int = 0) -> list:
+    """Saved-page stand-ins: inline scripts/styles, nav, comments and an article of 20-400 KB of markup."""
+    rnd = random.Random(seed)
+    words = lambda k: " ".join(rnd.choice(WORDS) for _ in range(k))
+    pages = []
+    for i in range(n):
+        head = (f"<head><title>{words(4)}</title><meta charset='utf-8'>"
+                f"<style>{'.c%d{margin:0 auto}' * 200}</style><script>var cfg = {{{'k: 1, ' * 500}}};</script></head>")
+        nav = "<nav>" + "".join(f"<a href='/{w}'>{w}</a> | " for w in WORDS) + "</nav>"
+        paras = []
+        for _ in range(rnd.randint(40, 800)):
+            paras.append(f"<p>{words(rnd.randint(10, 30))} <b>{words(2)}</b> {words(8)}"
+                         f"<!-- ad slot --> <a href='#'>{words(2)}</a>.</p>")
+            if rnd.random() < 0.1:
+                paras.append(f"<script>track({rnd.random()})</script><aside>{words(20)}</aside>")
+        footer = f"<footer>{words(30)}</footer>"
+        pages.append(f"<!doctype html><html>{head}<body>{nav}<article>{''.join(paras)}</article>"
+                     f"{footer}</body></html>".encode("utf-8"))
+    return pages
+
+def bench(corpus_dir: str | None = None, rounds: int = 3):
+    """
+    python -m benchmarks.html_extract [dir of saved .html pages] - compares
+    backends with the old bs4 path; without a dir, on generated pages.
+    """
+    pages = []
+    if corpus_dir:
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.htm*"), recursive=True)):
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        if not pages:
+            print(f"no .html files under {corpus_dir}")
+            return
+    else:
+        pages = synthetic_pages()
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 1e6:.1f} MB")
+
+    def chunked(b):
+        return (b[i:i + 16384] for i in range(0, len(b), 16384))
+
+    candidates = [("bs4 (old)", lambda b: _legacy_extract(b.decode("utf-8", errors="replace"))[:4000])]
+    for name in BACKENDS:
+        try:
+            BACKENDS[name]([b"<p>x</p>"], "utf-8", 10)
+        except ImportError:
+            continue
+        candidates.append((name, lambda b, n=name: extract_text(chunked(b), "utf-8", backend=n)))
+    for name, fn in candidates:
+        try:
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                out = [fn(b) for b in pages]
+            dt = (time.perf_counter() - t0) / rounds
+        except ImportError as e:
+            print(f"{name:12s} skipped ({e})")
+            continue
+        chars = sum(len(o) for o in out) / len(out)
+        print(f"{name:12s} {dt * 1000 / len(pages):8.2f} ms/page   avg {chars:6.0f} chars")
+
+if __name__ == "__main__":
+    bench(sys.argv[1] if len(sys.argv) > 1 else None)
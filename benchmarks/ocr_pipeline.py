@@ -0,0 +1,55 @@
+# benchmarks/ocr_pipeline.py - single image_to_string call vs the staged pipeline on a folder of images
+import os, sys, glob, time, tempfile
+import pytesseract
+from PIL import Image
+from ocr_pipeline import ocr_file
+from bench import synthetic_frames
+
+def _similarity(a: str, b: str) -> float:
+    import difflib
+    return difflib.SequenceMatcher(None, " ".join(a.split()), " ".join(b.split())).ratio()
+
+def make_fixtures(folder: str, n: int = 12, seed: int = 0) -> str:
+    """Writes n synthetic text images (bench.synthetic_frames) with their .txt ground truth into folder."""
+    import cv2
+    os.makedirs(folder, exist_ok=True)
+    truth = []
+    frame = synthetic_frames(seed, truth=truth)
+    for i in range(n):
+        img = frame()
+        cv2.imwrite(os.path.join(folder, f"synthetic_{i:03d}.png"), img)
+        with open(os.path.join(folder, f"synthetic_{i:03d}.txt"), "w", encoding="utf-8") as f:
+            f.write(truth[-1])
+    return folder
+
+def bench(fixture_dir: str | None = None):
+    """
+    python -m benchmarks.ocr_pipeline [dir] - images (optionally with a
+    same-named .txt ground truth) OCR'd by the old single image_to_string
+    call and by the staged pipeline; prints latency and, where truth
+    exists, character similarity. Without a dir, generated text images.
+    """
+    if fixture_dir is None:
+        fixture_dir = make_fixtures(tempfile.mkdtemp(prefix="lyra_ocr_bench_"))
+    paths = sorted(p for ext in ("png", "jpg", "jpeg") for p in glob.glob(os.path.join(fixture_dir, f"*.{ext}")))
+    if not paths:
+        print(f"no images under {fixture_dir}")
+        return
+    rows = {"single call": [], "staged": []}
+    for p in paths:
+        truth_path = os.path.splitext(p)[0] + ".txt"
+        truth = open(truth_path, encoding="utf-8").read() if os.path.exists(truth_path) else None
+        t0 = time.perf_counter()
+        old = pytesseract.image_to_string(Image.open(p)).strip()
+        rows["single call"].append((time.perf_counter() - t0, truth and _similarity(old, truth)))
+        t0 = time.perf_counter()
+        new = ocr_file(p)["text"]
+        rows["staged"].append((time.perf_counter() - t0, truth and _similarity(new, truth)))
+    for name, vals in rows.items():
+        lat = sorted(v[0] for v in vals)
+        q = [v[1] for v in vals if v[1] is not None]
+        qs = f"similarity {sum(q) / len(q):.3f}" if q else "no ground truth"
+        print(f"{name:12s} median {lat[len(lat) // 2] * 1000:8.1f} ms   max {lat[-1] * 1000:8.1f} ms   {qs}")
+
+if __name__ == "__main__":
+    bench(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,30 @@
+# benchmarks/recall_index.py - build time and lookup latency of the fact recall index
+import time, random
+from recall_index import RecallIndex
+
+def bench(n: int = 100_000, queries: int = 200):
+    """python -m benchmarks.recall_index - build an n-fact index and time lookups."""
+    rnd = random.Random(3)
+    words = ["wifi", "password", "router", "office", "door", "code", "mom", "birthday", "car", "plate",
+             "gym", "locker", "bank", "pin", "doctor", "phone", "netflix", "login", "garage", "alarm",
+             "dentist", "address", "parking", "spot", "passport", "number", "server", "ip", "vpn", "key"]
+    facts = [(f"{rnd.choice(words)} {rnd.choice(words)} {i}", f"value {i}") for i in range(n)]
+    idx = RecallIndex()
+    t0 = time.perf_counter()
+    for k_, v in facts:
+        idx.add(k_, v)
+    build = time.perf_counter() - t0
+    qs = [f"my {rnd.choice(words)} {rnd.choice(words)}" for _ in range(queries)]
+    qs += [rnd.choice(facts)[0][:-1] for _ in range(queries)]
+    lat = []
+    for q in qs:
+        t0 = time.perf_counter()
+        idx.search(q, k=5)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    p = lambda x: lat[min(len(lat) - 1, int(x * len(lat)))] * 1000
+    print(f"{n} facts (numpy={'yes' if idx.vectorized else 'no'}): build {build:.2f}s "
+          f"({build / n * 1e6:.1f} us/add); search p50 {p(0.5):.2f} ms, p95 {p(0.95):.2f} ms, max {lat[-1] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    bench()
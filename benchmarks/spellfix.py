@@ -0,0 +1,35 @@
+# benchmarks/spellfix.py - throughput of the indexed command corrector vs the old rapidfuzz scan
+import time, random
+from spellfix import COMMON_COMMANDS, maybe_fix_query
+
+def _legacy_suggest(user_text: str):
+    # the previous implementation: rapidfuzz WRatio of the whole input against every command
+    from rapidfuzz import process as rf_process
+    result = rf_process.extractOne(user_text.lower(), COMMON_COMMANDS, score_cutoff=80)
+    return result[0] if result else None
+
+def bench(n: int = 20000):
+    """python -m benchmarks.spellfix - throughput of the indexed matcher vs the old rapidfuzz scan."""
+    rnd = random.Random(11)
+    samples = ["capture", "captur", "read text", "raed text", "remembr wifi as hunter2",
+               "remember door code as 1234", "wat did i say about wifi", "histroy chat",
+               "what is the weather like in paris today", "how do i reverse a linked list in python",
+               "tell me something interesting about octopuses", "describe imgae", "ocr"]
+    inputs = [rnd.choice(samples) for _ in range(n)]
+    t0 = time.perf_counter()
+    new = [maybe_fix_query(x) for x in inputs]
+    dt_new = time.perf_counter() - t0
+    print(f"indexed: {n / dt_new:,.0f} msgs/s ({dt_new / n * 1e6:.2f} us/msg)")
+    try:
+        import rapidfuzz
+    except ImportError:
+        return
+    t0 = time.perf_counter()
+    old = [_legacy_suggest(x) or x for x in inputs]
+    dt_old = time.perf_counter() - t0
+    print(f"rapidfuzz scan: {n / dt_old:,.0f} msgs/s ({dt_old / n * 1e6:.2f} us/msg)")
+    for s in samples:
+        print(f"  {s!r:48} old={_legacy_suggest(s) or s!r:28} new={maybe_fix_query(s)!r}")
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,25 @@
+# benchmarks/tracing.py - per-call overhead of @traced, enabled vs disabled
+import time
+from config import TRACE_ENABLED
+from tracing import traced, enable
+
+def bench(n: int = 200_000):
+    """python -m benchmarks.tracing - per-call overhead of a traced no-op, enabled vs disabled."""
+    def plain():
+        return None
+
+    def decorated(on):
+        enable(on)                      # @traced checks the flag when it decorates
+        return traced("bench.noop")(plain)
+    cases = (("plain", plain, False), ("traced, off at import", decorated(False), False),
+             ("traced, turned off", decorated(True), False), ("traced, enabled", decorated(True), True))
+    for label, fn, on in cases:
+        enable(on)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        print(f"{label:22s} {(time.perf_counter() - t0) / n * 1e9:8.0f} ns/call")
+    enable(TRACE_ENABLED)
+
+if __name__ == "__main__":
+    bench()
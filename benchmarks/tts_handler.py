@@ -0,0 +1,25 @@
+# benchmarks/tts_handler.py - time to first audio: whole-reply synthesis vs the sentence pipeline (silent backend)
+import time
+from tts_handler import FakeBackend, TTSWorker
+
+def bench(sentences: int = 6):
+    """python -m benchmarks.tts_handler - time to first audio and barge-in with FakeBackend."""
+    text = " ".join(f"This is sentence number {i} of a longer spoken reply." for i in range(sentences))
+    per_char = 0.002                    # fake synthesis cost per character
+    whole = FakeBackend(synth_delay=per_char * len(text))
+    t0 = time.perf_counter()
+    whole.synthesize(text)
+    print(f"whole reply: first audio after {(time.perf_counter() - t0) * 1000:.0f} ms")
+    fake = FakeBackend(synth_delay=per_char * len(text) / sentences, chars_per_second=400)
+    w = TTSWorker(backend=fake)
+    w.speak(text)
+    w.idle.wait()
+    print(f"sentence pipeline: first audio after {w.stats['last_ttfa'] * 1000:.0f} ms, {len(fake.played)} sentences")
+    w.speak(text)
+    time.sleep(0.15)
+    w.speak("Barge in.")
+    w.idle.wait()
+    print(f"barge-in: cancelled {w.stats['cancelled']}, played {[(s[:12], done) for s, done in fake.played[-3:]]}")
+
+if __name__ == "__main__":
+    bench()
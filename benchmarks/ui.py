@@ -0,0 +1,37 @@
+# benchmarks/ui.py - append/render/scroll cost of the virtualized transcript with many messages
+import sys, time, random
+import tkinter as tk
+from ui import TranscriptView
+
+def bench(n: int = 10000):
+    """
+    python -m benchmarks.ui [n] - append n messages to a bare TranscriptView
+    and report append/render cost early vs late and how many bubble widgets
+    exist. Needs a display; headless: xvfb-run python -m benchmarks.ui
+    """
+    rnd = random.Random(5)
+    root = tk.Tk()
+    root.geometry("940x680")
+    view = TranscriptView(root)
+    root.update()
+    words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+    batch, times = 100, []
+    for start in range(0, n, batch):
+        t0 = time.perf_counter()
+        for i in range(start, min(n, start + batch)):
+            view.append(" ".join(rnd.choice(words) for _ in range(rnd.randint(3, 60))), is_user=i % 2 == 0)
+        root.update()               # one render per batch, as the Tk loop would do
+        times.append((time.perf_counter() - t0) / batch)
+    ms = lambda xs: sum(xs) / len(xs) * 1000
+    k = max(1, len(times) // 10)
+    print(f"{n} messages: append+render {ms(times[:k]):.3f} ms/msg (first 10%), {ms(times[-k:]):.3f} ms/msg (last 10%)")
+    t0 = time.perf_counter()
+    for f in [rnd.random() for _ in range(200)]:
+        view.canvas.yview_moveto(f)
+        root.update()
+    print(f"random scroll: {(time.perf_counter() - t0) / 200 * 1000:.2f} ms/jump; "
+          f"bubble widgets: {len(view.live) + len(view.free)} for {len(view.model)} messages")
+    root.destroy()
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -4,29 +4,142 @@ import os
 # ---- LLM / Ollama ----
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "gemma:2b")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")   # how long Ollama keeps the model loaded
+OLLAMA_MAX_CONCURRENCY = 2         # generations in flight; further calls queue
+OLLAMA_POOL_SIZE = 4               # pooled keep-alive connections to OLLAMA_HOST
+OLLAMA_WARMUP = os.environ.get("OLLAMA_WARMUP", "1") == "1"      # load the model in the background at startup
+LLM_HEALTH_TTL = 10                # seconds a model up/down health check result is reused
+
+# ---- Hedged Q&A (LLM vs web search) ----
+HEDGE_DELAY = 4.0                  # start web search if the LLM has produced nothing after this many seconds (None = only on failure)
+HEDGE_DEADLINE = 30.0              # give up on both paths after this many seconds without an answer
 
 # ---- Paths ----
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-CAPTURES_DIR = os.path.join(BASE_DIR, "captures")
-MEMORY_FILE = os.path.join(DATA_DIR, "memory.json")
-HISTORY_FILE = os.path.join(DATA_DIR, "history.json")
+DATA_DIR = os.environ.get("LYRA_DATA_DIR", os.path.join(BASE_DIR, "data"))
+CAPTURES_DIR = os.environ.get("LYRA_CAPTURES_DIR", os.path.join(BASE_DIR, "captures"))
+MEMORY_FILE = os.path.join(DATA_DIR, "memory.json")        # legacy JSON store (imported on first use)
+MEMORY_DB = os.path.join(DATA_DIR, "memory.db")             # SQLite (WAL) fact store
+HISTORY_FILE = os.path.join(DATA_DIR, "history.json")      # legacy single-file store (migrated on first use)
+HISTORY_DIR = os.path.join(DATA_DIR, "history")             # append-only JSONL segments
+SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")           # per-session memory/history/captures for server mode
+
+# ---- Memory ----
+RECALL_MIN_SCORE = 0.35            # fuzzy recall matches below this score are ignored
+
+# ---- History log ----
+HISTORY_SEGMENT_EVENTS = 5000      # events per segment before rotating
+HISTORY_MAX_SEGMENTS = 20          # oldest segments beyond this are deleted
+HISTORY_TAIL_SIZE = 500            # recent events kept in memory for get_history()
+
+# ---- LLM response cache ----
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") == "1"
+LLM_CACHE_FILE = os.path.join(DATA_DIR, "llm_cache.db")
+LLM_CACHE_TTL = 7 * 24 * 3600      # seconds before a cached answer is considered stale
+LLM_CACHE_MAX_ENTRIES = 5000       # on-disk entries; least recently used evicted first
+LLM_CACHE_MEM_ENTRIES = 256        # hot entries kept in memory
+
+# ---- Conversational sessions ----
+CHAT_CONTEXT_TOKENS = 2048         # drop Ollama's carried context once it grows past this
+CHAT_WINDOW_TOKENS = 768           # budget for recent turns replayed when a session (re)starts
+CHAT_SESSION_TTL = 15 * 60         # idle seconds before a session forgets its context
+
+# ---- Startup ----
+STARTUP_WARM = os.environ.get("STARTUP_WARM", "1") == "1"   # load OCR/web/TTS/LLM in the background once the window is up
+STARTUP_BUDGET = float(os.environ.get("STARTUP_BUDGET", "2.0"))  # seconds to first paint allowed by tests/test_startup.py
+
+# ---- Tracing ----
+TRACE_ENABLED = os.environ.get("LYRA_TRACE", "1") == "1"   # per-stage latency histograms ("stats" command)
+TRACE_FILE = os.environ.get("LYRA_TRACE_FILE", "")         # also append every span to this JSONL file ("" = off)
+TRACE_MAX_BYTES = 5 * 1024 * 1024  # trace file size before it rotates
+TRACE_BACKUPS = 3                  # rotated trace files kept (.1 .. .N)
+TRACE_SAMPLES = 1024               # recent timings per stage used for percentiles
+
+# ---- Server (headless mode: python server.py / main.py --serve) ----
+SERVER_HOST = os.environ.get("LYRA_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("LYRA_SERVER_PORT", "8765"))
+SERVER_TOKEN = os.environ.get("LYRA_SERVER_TOKEN", "")     # if set, clients must send "Authorization: Bearer <token>"
+SERVER_MAX_CONCURRENCY = 8         # commands running at once across all sessions
+SERVER_MAX_QUEUE = 32              # commands waiting for a slot before new ones get 503
+SERVER_SESSION_QUEUE = 4           # commands one session may have waiting before it gets 429
+SERVER_FAST_WORKERS = 4            # executor for memory/history/other quick commands
+SERVER_LLM_WORKERS = 6             # executor for general Q&A (LLM stream + web hedge)
+SERVER_OCR_WORKERS = 2             # executor for capture/OCR commands
+SERVER_SESSION_TTL = 30 * 60       # idle seconds before a session's open stores are released
+SERVER_MAX_BODY = 64 * 1024        # request body limit (bytes)
 
 # ---- UI ----
 UI_THEME = "light"                 # use "light" for preferred light UI
 MAX_CHAT_WIDTH = 720
+TRANSCRIPT_RESTORE = 200           # chat turns from the history log shown again at startup
+TRANSCRIPT_OVERSCAN = 600          # pixels above/below the viewport kept materialized
+UI_WORKERS = 4                     # background threads for send/mic/capture actions
+UI_MAX_PENDING = 16                # queued actions beyond this are refused ("busy")
+UI_FRAME_MS = 16                   # the Tk loop applies worker updates every frame (~60 fps)
+UI_FRAME_BUDGET_MS = 8             # max time per frame spent applying updates; the rest waits a frame
 
 # ---- Voice / TTS ----
-TTS_MODE = os.environ.get("TTS_MODE", "offline")  # "offline" or "elevenlabs"
+TTS_MODE = os.environ.get("TTS_MODE", "offline")  # "offline", "elevenlabs" or "fake" (silent, for tests)
 ELEVEN_API_KEY = os.environ.get("ELEVEN_API_KEY", "")
 ELEVEN_VOICE_ID = os.environ.get("ELEVEN_VOICE_ID", "Bella")
+ELEVEN_MODEL_ID = os.environ.get("ELEVEN_MODEL_ID", "eleven_multilingual_v2")
+TTS_MIN_SENTENCE_CHARS = 24        # shorter fragments are spoken together with the next sentence
+TTS_BARGE_IN = True                # a new reply interrupts the one being spoken
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE", "1") == "1"
+TTS_CACHE_FILE = os.path.join(DATA_DIR, "tts_cache.db")    # synthesized audio per (text, voice, model, settings)
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024                     # least recently played audio evicted beyond this
+TTS_PREWARM = os.environ.get("TTS_PREWARM", "0") == "1"     # synthesize the fixed system phrases at startup
+TTS_PLAYER = os.environ.get("TTS_PLAYER", "")   # command that plays a file and exits when done ("" = first found)
 
 # ---- Speech Recognition ----
 USE_SPEECH_RECOG = True
+VOICE_RECOGNIZER = os.environ.get("VOICE_RECOGNIZER", "google")   # "google", "sphinx" or "vosk" (offline), "fake"
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "")            # unpacked Vosk model directory
+VOICE_DEVICE = os.environ.get("VOICE_DEVICE", "")  # PyAudio input device index ("" = default microphone)
+VOICE_HANDS_FREE = os.environ.get("VOICE_HANDS_FREE", "0") == "1"  # recognize every utterance, no 🎤 press needed
+VOICE_RATE = 16000                 # capture sample rate (mono, 16-bit)
+VOICE_CHUNK_MS = 100               # audio read per capture step
+VOICE_FRAME_MS = 20                # VAD frame
+VOICE_BUFFER_SECONDS = 30          # ring buffer of recent audio
+VOICE_CALIBRATE_SECONDS = 0.5      # initial noise-floor estimate (once, when capture starts)
+VOICE_START_DB = 12                # speech starts this many dB above the noise floor...
+VOICE_START_MS = 120               # ...held for this long
+VOICE_END_DB = 7                   # and ends after VOICE_HANGOVER_MS below floor + this
+VOICE_HANGOVER_MS = 500
+VOICE_PREROLL_MS = 300             # audio kept from before the detected start
+VOICE_MIN_UTTERANCE_MS = 250       # shorter blips are ignored
+VOICE_MAX_UTTERANCE = 15           # seconds; longer speech is cut and recognized in pieces
+VOICE_LISTEN_TIMEOUT = 8           # 🎤: give up if no speech starts within this many seconds
+
+# ---- Camera ----
+CAMERA_PERSISTENT = os.environ.get("CAMERA_PERSISTENT", "0") == "1"   # keep the webcam open between captures
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")   # device index, or a video file / stream URL
+CAMERA_BUFFER_FRAMES = 8           # recent frames kept to pick the sharpest from
+CAMERA_WARMUP_FRAMES = 5           # frames dropped after opening while exposure settles
+CAMERA_IDLE_TIMEOUT = 60           # seconds without a capture before the device is released
+CAMERA_FPS = 15                    # background read rate cap
 
 # ---- OCR / Tesseract ----
 TESSERACT_PATH = os.environ.get("TESSERACT_PATH", r"C:\Program Files\Tesseract-OCR\tesseract.exe")
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_PSM = 3                        # tesseract page segmentation mode
+OCR_CACHE_MEM_ENTRIES = 64         # OCR results kept in memory (sidecar .ocr.json files hold the rest)
+OCR_PRECOMPUTE = True              # OCR a new capture in the background so "read text" is instant
+OCR_PIPELINE = os.environ.get("OCR_PIPELINE", "single")    # "single" (one tesseract call, psm OCR_PSM) or "staged" (preprocess + regions)
+OCR_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))     # processes OCR'ing text regions in parallel
+OCR_INDEX_DB = os.path.join(DATA_DIR, "ocr_index.db")       # full-text index of OCR'd captures
+OCR_BATCH_FILE = os.path.join(DATA_DIR, "ocr_batch.jsonl")  # batch OCR results, one JSON object per image
 
 # ---- Web search ----
 SEARCH_TIMEOUT = 10
+SEARCH_URL = os.environ.get("LYRA_SEARCH_URL", "https://duckduckgo.com/html/")   # DuckDuckGo HTML endpoint (or a stand-in)
+WEB_FETCH_TOP_N = 3                # result pages fetched concurrently; first usable one wins
+WEB_FETCH_WORKERS = 3              # bounded fetch pool (also the per-host connection pool size)
+WEB_MIN_PAGE_CHARS = 200           # a page with less extracted text than this is "thin"
+WEB_MAX_BYTES = 1_500_000          # stop downloading a page after this many bytes
+WEB_TEXT_LIMIT = 4000              # stop extracting once this much text is collected
+WEB_PARSER = os.environ.get("WEB_PARSER", "auto")   # "auto" (lxml if installed), "html.parser" or "lxml"
+WEB_CACHE_FILE = os.path.join(DATA_DIR, "web_cache.db")
+WEB_PAGE_TTL = 6 * 3600            # seconds extracted page text stays cached
+WEB_SERP_TTL = 3600                # seconds search results per query stay cached
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) LyraAI/1.0"
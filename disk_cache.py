@@ -0,0 +1,140 @@
+# disk_cache.py - TTL + size-bounded key/value cache: in-memory LRU in front of a SQLite table
+import os, time, sqlite3, threading
+from collections import OrderedDict
+
+class DiskCache:
+    """
+    Values are str or bytes. Entries older than ttl seconds are treated as
+    misses; once the table holds more than max_entries rows (or max_bytes of
+    values) the least recently used rows are evicted. Several caches can
+    share one database file by using different table names.
+    Hits only note their time in memory; the "used" column is written in
+    batches of touch_batch, and always before an eviction picks its victims.
+    """
+    def __init__(self, path: str, ttl: float | None = None, max_entries: int = 10000,
+                 max_bytes: int | None = None, mem_entries: int = 256, table: str = "cache",
+                 touch_batch: int = 64):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.mem_entries = mem_entries
+        self.touch_batch = touch_batch
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()           # key -> (value, created)
+        self._touched = {}                  # key -> last hit time, not yet written
+        self._conn = None
+        self._count = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value BLOB, "
+                         "size INTEGER, created REAL, used REAL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_used ON {self.table} (used)")
+            self._count, self._bytes = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+            self._conn = conn
+        return self._conn
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key, value, created):
+        self._mem[key] = (value, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is None:
+                row = self._db().execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row:
+                    hit = (row[0], row[1])
+            if hit is None or self._expired(hit[1]):
+                if hit is not None:
+                    self._delete(key)
+                self.misses += 1
+                return default
+            self._remember(key, *hit)
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.touch_batch:
+                self._flush()
+            self.hits += 1
+            return hit[0]
+
+    def _flush(self):
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._db().executemany(f"UPDATE {self.table} SET used = ? WHERE key = ?",
+                                   [(used, key) for key, used in touched.items()])
+
+    def flush(self):
+        """Writes pending hit times (they only affect which entries are evicted first)."""
+        with self._lock:
+            self._flush()
+
+    def put(self, key: str, value):
+        size = len(value.encode("utf-8") if isinstance(value, str) else value)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            old = db.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, used) VALUES (?, ?, ?, ?, ?)",
+                       (key, value, size, now, now))
+            self._touched.pop(key, None)
+            if old:
+                self._bytes -= old[0]
+            else:
+                self._count += 1
+            self._bytes += size
+            self._remember(key, value, now)
+            self._evict()
+
+    def _evict(self):
+        db = self._db()
+        if self._count > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            self._flush()
+        while self._count > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes and self._count > 1):
+            n = max(1, self._count - self.max_entries, self._count // 20)
+            rows = db.execute(f"SELECT key, size FROM {self.table} ORDER BY used LIMIT ?", (n,)).fetchall()
+            if not rows:
+                break
+            db.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k, _ in rows])
+            for k, size in rows:
+                self._mem.pop(k, None)
+                self._count -= 1
+                self._bytes -= size
+
+    def _delete(self, key: str):
+        row = self._db().execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._db().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._count -= 1
+            self._bytes -= row[0]
+        self._mem.pop(key, None)
+        self._touched.pop(key, None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute(f"DELETE FROM {self.table}")
+            self._mem.clear()
+            self._touched.clear()
+            self._count = self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._count, "bytes": self._bytes}
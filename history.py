@@ -1,31 +1,191 @@
-# history.py - simple timeline store (events)
-import os, json, datetime
-from config import DATA_DIR, HISTORY_FILE
+# history.py - append-only timeline store (JSONL segments + in-memory tail index)
+import os, json, glob, datetime, threading
+from collections import deque
+from itertools import islice
+from config import (DATA_DIR, HISTORY_FILE, HISTORY_DIR, HISTORY_SEGMENT_EVENTS,
+                    HISTORY_MAX_SEGMENTS, HISTORY_TAIL_SIZE)
+from tracing import traced
+from namespace import PerNamespace, data_dir, on_drop
 
 def _utc_now():
     return datetime.datetime.now(datetime.timezone.utc).isoformat()
 
-def ensure_history_file():
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump({"events": []}, f, indent=2)
+def _parse_time(value):
+    """Accepts an ISO string or datetime; naive values are treated as UTC."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+def _read_segment(path):
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # torn last line after a crash - skip it
+                continue
+    return events
+
+class _EventLog:
+    """
+    Events are appended as one JSON line each to numbered segment files.
+    The newest HISTORY_TAIL_SIZE events stay in memory so the common
+    "last n events" read never touches disk.
+    """
+    def __init__(self, directory: str, legacy_file: str | None = None):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._tail = deque(maxlen=HISTORY_TAIL_SIZE)
+        self._fh = None
+        self._seg_no = 0
+        self._seg_count = 0
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "events-*.jsonl")))
+
+    def _seg_path(self, n: int):
+        return os.path.join(self.directory, f"events-{n:06d}.jsonl")
+
+    def _open(self):
+        if self._fh is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self.legacy_file and not self._segments():
+            migrate_legacy_history(self.legacy_file, self.directory)
+        segs = self._segments()
+        # warm the tail index from the newest segments only
+        recent = []
+        for path in reversed(segs):
+            recent = _read_segment(path) + recent
+            if len(recent) >= self._tail.maxlen:
+                break
+        self._tail.extend(recent)
+        if segs:
+            self._seg_no = int(os.path.basename(segs[-1])[7:13])
+            self._seg_count = len(_read_segment(segs[-1]))
+        else:
+            self._seg_no, self._seg_count = 1, 0
+        self._fh = open(self._seg_path(self._seg_no), "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._fh.close()
+        self._seg_no += 1
+        self._seg_count = 0
+        self._fh = open(self._seg_path(self._seg_no), "a", encoding="utf-8")
+        for old in self._segments()[:-HISTORY_MAX_SEGMENTS]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def append(self, ev: dict):
+        with self._lock:
+            self._open()
+            if self._seg_count >= HISTORY_SEGMENT_EVENTS:
+                self._rotate()
+            self._fh.write(json.dumps(ev, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            self._seg_count += 1
+            self._tail.append(ev)
 
-def _load():
-    ensure_history_file()
-    with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    def tail(self, n: int):
+        with self._lock:
+            self._open()
+            if n <= len(self._tail):
+                out = list(islice(reversed(self._tail), n))
+                out.reverse()
+                return out
+        return self.query(limit=n)
 
-def _save(data):
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    def query(self, ev_type=None, since=None, until=None, limit=None):
+        """Newest-first scan over segments; returns matches in chronological order."""
+        since, until = _parse_time(since), _parse_time(until)
+        types = {ev_type} if isinstance(ev_type, str) else (set(ev_type) if ev_type else None)
+        with self._lock:
+            self._open()
+            self._fh.flush()
+            segs = self._segments()
+        out = []
+        for path in reversed(segs):
+            events = _read_segment(path)
+            if since and events and _parse_time(events[-1]["time"]) < since:
+                break
+            for ev in reversed(events):
+                if types and ev.get("type") not in types:
+                    continue
+                t = _parse_time(ev["time"])
+                if until and t > until:
+                    continue
+                if since and t < since:
+                    continue
+                out.append(ev)
+                if limit and len(out) >= limit:
+                    out.reverse()
+                    return out
+        out.reverse()
+        return out
 
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+                self._tail.clear()
+
+def migrate_legacy_history(legacy_file: str = HISTORY_FILE, directory: str = HISTORY_DIR) -> int:
+    """
+    Converts the old {"events": [...]} history.json into JSONL segments.
+    The legacy file is renamed to *.migrated so it's only imported once.
+    Returns the number of events migrated.
+    """
+    if not os.path.exists(legacy_file):
+        return 0
+    try:
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            events = json.load(f).get("events", [])
+    except (OSError, ValueError):
+        return 0
+    os.makedirs(directory, exist_ok=True)
+    for i in range(0, max(len(events), 1), HISTORY_SEGMENT_EVENTS):
+        chunk = events[i:i + HISTORY_SEGMENT_EVENTS]
+        path = os.path.join(directory, f"events-{i // HISTORY_SEGMENT_EVENTS + 1:06d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for ev in chunk:
+                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    os.replace(legacy_file, legacy_file + ".migrated")
+    return len(events)
+
+_log = _EventLog(HISTORY_DIR, legacy_file=HISTORY_FILE)
+
+# one event log per namespace (the desktop user's is _log)
+_logs = PerNamespace(lambda name: _EventLog(os.path.join(data_dir(name), "history")) if name else _log,
+                     close=lambda log: log.close())
+on_drop(_logs.drop)
+
+def ensure_history_file():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with _log._lock:
+        _log._open()
+
+@traced("history.append")
 def add_history(ev_type: str, detail: str):
-    data = _load()
-    data["events"].append({"time": _utc_now(), "type": ev_type, "detail": detail})
-    data["events"] = data["events"][-500:]
-    _save(data)
+    _logs.get().append({"time": _utc_now(), "type": ev_type, "detail": detail})
 
 def get_history(n: int = 30):
-    data = _load()
-    return data.get("events", [])[-n:]
+    return _logs.get().tail(n)
+
+def find_history(ev_type=None, since=None, until=None, limit: int | None = None):
+    """
+    Filter events by type (a name or list of names) and/or a time range.
+    since/until accept ISO strings or datetimes.
+    """
+    return _logs.get().query(ev_type=ev_type, since=since, until=until, limit=limit)
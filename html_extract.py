@@ -0,0 +1,142 @@
+# html_extract.py - streaming, size-capped visible-text extraction for fetched pages
+import codecs
+from html.parser import HTMLParser
+
+# containers whose text is never main content
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav",
+             "footer", "aside", "form", "iframe", "button", "select"}
+# </head> is optional: any other start tag (<body> included) means the head has ended
+HEAD_TAGS = {"head", "title", "meta", "link", "base", "style", "script", "noscript", "template"}
+
+def _capped(chunks, max_bytes: int, cancel=None):
+    """Yields byte chunks until max_bytes have been read (or cancel is set)."""
+    seen = 0
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            return
+        if not chunk:
+            continue
+        if seen + len(chunk) > max_bytes:
+            yield chunk[:max_bytes - seen]
+            return
+        seen += len(chunk)
+        yield chunk
+
+class _TextCollector(HTMLParser):
+    def __init__(self, limit: int):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.skip = {}          # open skipped tags by name
+        self.depth = 0          # total open skipped tags
+
+    def handle_starttag(self, tag, attrs):
+        self.parts.append(" ")
+        if self.skip.get("head") and tag not in HEAD_TAGS:
+            self.depth -= self.skip.pop("head")
+        if tag in SKIP_TAGS:
+            self.skip[tag] = self.skip.get(tag, 0) + 1
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        self.parts.append(" ")
+        if self.skip.get(tag):
+            self.skip[tag] -= 1
+            self.depth -= 1
+
+    def handle_data(self, data):
+        # data can arrive split at chunk boundaries, so keep it raw and normalize at the end
+        if not self.depth:
+            self.parts.append(data)
+            self.size += len(data)
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.limit
+
+def _extract_stdlib(chunks, encoding: str, limit: int) -> str:
+    """Incremental: feeds decoded chunks to html.parser and stops once limit chars are collected."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    p = _TextCollector(limit)
+    for chunk in chunks:
+        p.feed(decoder.decode(chunk))
+        if p.full:
+            break
+    else:
+        p.feed(decoder.decode(b"", final=True))
+        p.close()
+    return " ".join("".join(p.parts).split())
+
+def _extract_lxml(chunks, encoding: str, limit: int) -> str:
+    """
+    Incremental too: feeds chunks to lxml's pull parser and stops once limit
+    chars are collected. Text is taken in document order as elements open
+    (the parent's leading text or the previous sibling's tail is complete by
+    then) and close (the last piece inside the element).
+    """
+    from lxml import etree
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding,
+                                  remove_comments=True, remove_pis=True)
+    parts, state = [], {"size": 0, "depth": 0}     # depth: open SKIP_TAGS elements
+
+    def take(text):
+        if text and not state["depth"]:
+            parts.append(text)
+            state["size"] += len(text)
+
+    def read():
+        for event, el in parser.read_events():
+            parts.append(" ")
+            if event == "start":
+                prev, parent = el.getprevious(), el.getparent()
+                take(prev.tail if prev is not None else parent.text if parent is not None else None)
+                if el.tag in SKIP_TAGS:
+                    state["depth"] += 1
+            else:
+                take(el[-1].tail if len(el) else el.text)
+                if el.tag in SKIP_TAGS:
+                    state["depth"] -= 1
+                el.clear(keep_tail=True)          # its text is taken; only the tail is still needed
+        return state["size"] >= limit
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        if read():
+            break
+    else:
+        try:
+            parser.close()
+        except etree.LxmlError:                   # empty or hopeless document
+            pass
+        read()
+    return " ".join("".join(parts).split())
+
+BACKENDS = {"html.parser": _extract_stdlib, "lxml": _extract_lxml}
+
+def _pick_backend(name: str):
+    if name == "auto":
+        try:
+            import lxml.html  # noqa: F401
+            return _extract_lxml
+        except ImportError:
+            return _extract_stdlib
+    return BACKENDS[name]
+
+def extract_text(chunks, encoding: str | None = None, limit: int = 4000,
+                 max_bytes: int = 1_500_000, backend: str = "auto", cancel=None) -> str:
+    """
+    Visible text from an iterable of HTML byte chunks (e.g. response.iter_content()).
+    Reads at most max_bytes, skips non-content elements (SKIP_TAGS) and stops
+    once about `limit` characters have been collected.
+    backend: "auto" (lxml if installed), "html.parser" or "lxml".
+    """
+    encoding = encoding or "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    text = _pick_backend(backend)(_capped(chunks, max_bytes, cancel), encoding, limit)
+    if cancel is not None and cancel.is_set():
+        return ""
+    return text[:limit]
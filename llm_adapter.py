@@ -1,26 +1,294 @@
-# llm_adapter.py - minimal Ollama client returning clean text
-import requests
-from config import OLLAMA_HOST, OLLAMA_MODEL
+# llm_adapter.py - minimal Ollama client returning clean text (blocking or streamed)
+import re, json, time, socket, hashlib, datetime, threading
+from contextlib import contextmanager
+from config import (OLLAMA_HOST, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE,
+                    OLLAMA_MAX_CONCURRENCY, OLLAMA_POOL_SIZE,
+                    LLM_CACHE_ENABLED, LLM_CACHE_FILE, LLM_CACHE_TTL,
+                    LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MEM_ENTRIES,
+                    CHAT_CONTEXT_TOKENS, CHAT_WINDOW_TOKENS, CHAT_SESSION_TTL, LLM_HEALTH_TTL)
+from disk_cache import DiskCache
+from tracing import traced, record
 
-def chat(prompt: str, system: str | None = None, timeout: int = 60) -> str:
+# ---- shared client: one pooled keep-alive session + a concurrency limit ----
+_session = None
+_session_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(OLLAMA_MAX_CONCURRENCY)
+_counts = {"in_flight": 0, "waiting": 0}
+_counts_lock = threading.Lock()
+
+def _get_session():
+    """The pooled requests.Session (requests itself is imported on first use to keep startup fast)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _session = s
+    return _session
+
+def _is_connection_error(e: Exception) -> bool:
+    import requests
+    return isinstance(e, requests.ConnectionError)
+
+def _bump(key: str, n: int):
+    with _counts_lock:
+        _counts[key] += n
+
+@contextmanager
+def _llm_slot(deadline: float):
+    """Waits (FIFO-ish) for a generation slot, but never past the request deadline."""
+    _bump("waiting", 1)
+    try:
+        remaining = deadline - time.monotonic()
+        ok = remaining > 0 and _slots.acquire(timeout=remaining)
+    finally:
+        _bump("waiting", -1)
+    if not ok:
+        raise TimeoutError("LLM busy: request deadline passed while queued")
+    _bump("in_flight", 1)
+    try:
+        yield
+    finally:
+        _bump("in_flight", -1)
+        _slots.release()
+
+def client_stats() -> dict:
+    """Current number of generations running and queued."""
+    with _counts_lock:
+        return dict(_counts)
+
+def _remaining(deadline: float) -> float:
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("LLM request deadline exceeded")
+    return left
+
+@contextmanager
+def _abort_on(cancel: threading.Event | None, r):
     """
-    Uses Ollama /api/generate to get a plain-text response.
-    Returns a short string or an error string starting with (LLM offline/error)
+    While the block runs, a watcher shuts down r's socket as soon as cancel is
+    set, so a read blocked between chunks returns at once and the slot is freed
+    (closing the response from another thread waits for that read instead).
     """
-    url = f"{OLLAMA_HOST}/api/generate"
-    payload = {
+    if cancel is None:
+        yield
+        return
+    finished, lock = threading.Event(), threading.Lock()
+    def watch():
+        while not finished.is_set():
+            if cancel.wait(0.05):
+                with lock:
+                    sock = getattr(getattr(r.raw, "_connection", None), "sock", None)
+                    if not finished.is_set() and sock is not None:
+                        try:
+                            sock.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+                return
+    threading.Thread(target=watch, daemon=True, name="llm-cancel").start()
+    try:
+        yield
+    finally:
+        with lock:
+            finished.set()
+
+# ---- health: is the model server reachable? ----
+_health = {"ok": None, "checked": 0.0}
+_health_refresh = threading.Lock()      # held while a background check runs
+
+def _note_health(ok: bool):
+    _health["ok"], _health["checked"] = ok, time.monotonic()
+
+def is_available(max_age: float = LLM_HEALTH_TTL) -> bool:
+    """Cheap, cached check that Ollama answers; chat calls also refresh it."""
+    if _health["ok"] is not None and time.monotonic() - _health["checked"] < max_age:
+        return _health["ok"]
+    try:
+        ok = _get_session().get(f"{OLLAMA_HOST}/api/tags", timeout=1.5).ok
+    except Exception:
+        ok = False
+    _note_health(ok)
+    return ok
+
+def known_available(max_age: float = LLM_HEALTH_TTL):
+    """
+    Non-blocking is_available(): the last result if it's fresh, else None
+    (unknown) while a background thread checks again.
+    """
+    if _health["ok"] is not None and time.monotonic() - _health["checked"] < max_age:
+        return _health["ok"]
+    if _health_refresh.acquire(blocking=False):
+        def run():
+            try:
+                is_available(max_age)
+            finally:
+                _health_refresh.release()
+        threading.Thread(target=run, name="llm-health", daemon=True).start()
+    return None
+
+# ---- response cache: (model, system, normalized prompt) -> answer ----
+_cache = DiskCache(LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES,
+                   mem_entries=LLM_CACHE_MEM_ENTRIES)
+
+def _cache_key(prompt: str, system: str | None) -> str:
+    norm = re.sub(r"\s+", " ", prompt).strip().casefold().rstrip("?!. ")
+    raw = json.dumps([OLLAMA_MODEL, system or "", norm], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _session_cache_key(payload: dict) -> str:
+    # a fresh session with no replayed turns shares keys with stateless calls
+    return _cache_key(payload["prompt"], payload.get("system"))
+
+def _cacheable(ans: str) -> bool:
+    return bool(ans and ans.strip()) and not ans.startswith("(LLM offline/error)")
+
+def cache_stats() -> dict:
+    """hits/misses since startup plus on-disk entry count."""
+    return _cache.stats()
+
+def clear_cache():
+    _cache.clear()
+
+# ---- conversational sessions: reuse Ollama's returned context between turns ----
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+class ChatSession:
+    """
+    Multi-turn state for one conversation. After each answer Ollama returns
+    a `context` token array; sending it back with the next prompt lets the
+    model continue from that state instead of re-evaluating the system
+    prompt and earlier turns.
+    When there's no context (first turn, after reset(), after the idle TTL
+    or once the context outgrows max_tokens) the session replays a short
+    transcript from window(budget, since) -> [(user, reply), ...], oldest
+    first, where since is a UTC datetime bounding how far back to look.
+    """
+    def __init__(self, system: str | None = None, window=None, max_tokens: int = CHAT_CONTEXT_TOKENS,
+                 window_tokens: int = CHAT_WINDOW_TOKENS, idle_ttl: float = CHAT_SESSION_TTL):
+        self.system = system
+        self.window = window
+        self.max_tokens = max_tokens
+        self.window_tokens = window_tokens
+        self.idle_ttl = idle_ttl
+        self.context = None
+        self.started = None         # UTC time of the last reset(); older turns aren't replayed
+        self.last_used = 0.0
+        self.turns = 0
+        self.last_eval = {}         # prompt_eval_count / eval_count of the last turn
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.context = None
+            self.turns = 0
+            self.started = datetime.datetime.now(datetime.timezone.utc)
+
+    def drop_context(self):
+        """Keeps the conversation but not the model state: the next turn replays the transcript."""
+        with self._lock:
+            self.context = None
+
+    def _transcript(self) -> str:
+        if not self.window:
+            return ""
+        lines, used = [], 0
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.idle_ttl)
+        if self.started and self.started > since:
+            since = self.started
+        try:
+            turns = list(self.window(self.window_tokens, since))
+        except Exception:
+            return ""
+        for user, reply in reversed(turns):
+            block = f"User: {user}\nLyra: {reply}\n"
+            used += _estimate_tokens(block)
+            if used > self.window_tokens:
+                break
+            lines.append(block)
+        if not lines:
+            return ""
+        return "Earlier in this conversation:\n" + "".join(reversed(lines)) + "\n"
+
+    def payload(self, prompt: str, system: str | None, stream: bool) -> dict:
+        with self._lock:
+            if self.context and time.monotonic() - self.last_used > self.idle_ttl:
+                self.context, self.turns = None, 0
+            context = self.context
+        system = system if system is not None else self.system
+        p = {"model": OLLAMA_MODEL, "stream": stream, "keep_alive": OLLAMA_KEEP_ALIVE}
+        if context:
+            # system prompt and earlier turns are already inside the context
+            p["context"] = context
+            p["prompt"] = prompt
+        else:
+            if system:
+                p["system"] = system
+            p["prompt"] = self._transcript() + prompt
+        return p
+
+    def update(self, data: dict):
+        with self._lock:
+            ctx = data.get("context")
+            self.context = ctx if ctx and len(ctx) <= self.max_tokens else None
+            self.last_used = time.monotonic()
+            self.turns += 1
+            self.last_eval = {k: data[k] for k in ("prompt_eval_count", "eval_count") if k in data}
+
+def _payload(prompt: str, system: str | None, stream: bool, session: ChatSession | None = None) -> dict:
+    if session is not None:
+        return session.payload(prompt, system, stream)
+    return {
         "model": OLLAMA_MODEL,
         "prompt": (system + "\n\n" + prompt) if system else prompt,
-        "stream": False
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE
     }
+
+@traced("llm.chat")
+def chat(prompt: str, system: str | None = None, timeout: int = 60, use_cache: bool = True,
+         session: ChatSession | None = None) -> str:
+    """
+    Uses Ollama /api/generate to get a plain-text response.
+    timeout is the whole-request deadline, including time spent queued.
+    Answers are served from / stored in the response cache unless
+    use_cache=False (or LLM_CACHE is off); errors are never cached.
+    With a session, the previous turn's context is carried forward (and the
+    cache is skipped while a context is being carried).
+    Returns a short string or an error string starting with (LLM offline/error)
+    """
+    payload = _payload(prompt, system, stream=False, session=session)
+    use_cache = use_cache and LLM_CACHE_ENABLED and "context" not in payload
+    if use_cache:
+        key = _session_cache_key(payload) if session is not None else _cache_key(prompt, system)
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+    ans, data = _generate(payload, timeout)
+    if session is not None and data:
+        session.update(data)
+    if use_cache and _cacheable(ans):
+        _cache.put(key, ans)
+    return ans
+
+def _generate(payload: dict, timeout: int):
+    """Returns (text, raw response dict or None)."""
+    url = f"{OLLAMA_HOST}/api/generate"
+    deadline = time.monotonic() + timeout
     try:
-        r = requests.post(url, json=payload, timeout=timeout)
+        with _llm_slot(deadline):
+            r = _get_session().post(url, json=payload, timeout=_remaining(deadline))
         r.raise_for_status()
+        _note_health(True)
         data = r.json()
         # Try common keys
         if isinstance(data, dict):
             if "response" in data and data["response"]:
-                return str(data["response"]).strip()
+                return str(data["response"]).strip(), data
             if "choices" in data and isinstance(data["choices"], list) and data["choices"]:
                 # Ollama can sometimes return choices with message/content-like structure
                 first = data["choices"][0]
@@ -28,8 +296,101 @@ def chat(prompt: str, system: str | None = None, timeout: int = 60) -> str:
                     for k in ("message","text","content"):
                         v = first.get(k)
                         if v:
-                            return str(v).strip()
+                            return str(v).strip(), data
         # fallback to stringification
-        return str(data).strip()
+        return str(data).strip(), None
     except Exception as e:
-        return f"(LLM offline/error) {e}"
+        if _is_connection_error(e):
+            _note_health(False)
+        return f"(LLM offline/error) {e}", None
+
+def chat_stream(prompt: str, system: str | None = None, timeout: int = 60, stats: dict | None = None,
+                use_cache: bool = True, session: ChatSession | None = None,
+                cancel: threading.Event | None = None):
+    """
+    Generator over response fragments as Ollama produces them (NDJSON chunks).
+    If the request fails before any text arrives, yields a single
+    "(LLM offline/error) ..." string, same as chat(). A failure mid-stream
+    (including hitting the deadline) just ends the stream.
+    A cache hit yields the whole cached answer at once; only streams that
+    finish normally are stored. session works as in chat().
+    Setting cancel aborts the stream promptly, even mid-read (nothing is cached).
+    If given, stats is filled with "ttft" (seconds to first token) and
+    "total" (seconds until the stream finished).
+    """
+    url = f"{OLLAMA_HOST}/api/generate"
+    payload = _payload(prompt, system, stream=True, session=session)
+    t0 = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    got_text = False
+    if stats is not None:
+        stats["ttft"] = None
+    use_cache = use_cache and LLM_CACHE_ENABLED and "context" not in payload
+    if use_cache:
+        key = _session_cache_key(payload) if session is not None else _cache_key(prompt, system)
+        cached = _cache.get(key)
+        if cached is not None:
+            if stats is not None:
+                stats["ttft"] = stats["total"] = time.perf_counter() - t0
+            yield cached
+            return
+    parts, done = [], False
+    try:
+        with _llm_slot(deadline), \
+             _get_session().post(url, json=payload, timeout=_remaining(deadline), stream=True) as r, \
+             _abort_on(cancel, r):
+            r.raise_for_status()
+            _note_health(True)
+            for line in r.iter_lines():
+                if cancel is not None and cancel.is_set():
+                    break
+                _remaining(deadline)
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                piece = chunk.get("response") or ""
+                if piece:
+                    if not got_text:
+                        ttft = time.perf_counter() - t0
+                        record("llm.ttft", ttft)
+                        if stats is not None:
+                            stats["ttft"] = ttft
+                    got_text = True
+                    parts.append(piece)
+                    yield piece
+                if chunk.get("done"):
+                    done = True
+                    if session is not None:
+                        session.update(chunk)
+                    break
+    except Exception as e:
+        if _is_connection_error(e):
+            _note_health(False)
+        if not got_text and not (cancel is not None and cancel.is_set()):
+            yield f"(LLM offline/error) {e}"
+    finally:
+        total = time.perf_counter() - t0
+        record("llm.stream", total, error=not got_text)
+        if stats is not None:
+            stats["total"] = total
+    ans = "".join(parts).strip()
+    if use_cache and done and _cacheable(ans):
+        _cache.put(key, ans)
+
+def warm_up(background: bool = True, timeout: int = 120):
+    """
+    Asks Ollama to load OLLAMA_MODEL (an empty prompt only loads the model)
+    so the first real query doesn't pay for it. Errors are ignored.
+    """
+    def _run():
+        try:
+            _get_session().post(f"{OLLAMA_HOST}/api/generate", timeout=timeout,
+                                json={"model": OLLAMA_MODEL, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE})
+        except Exception:
+            pass
+    if background:
+        threading.Thread(target=_run, daemon=True).start()
+    else:
+        _run()
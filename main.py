@@ -1,6 +1,67 @@
-# main.py
-from ui import LyraUI
+# main.py - entry point; heavy subsystems load on first use or warm up after the window is shown
+import sys, importlib, threading, subprocess
+from config import OLLAMA_WARMUP, TTS_PREWARM, STARTUP_WARM
 
-if __name__ == "__main__":
+# must not be imported before the first paint (checked by tests/test_startup.py)
+HEAVY_MODULES = ("cv2", "numpy", "pytesseract", "PIL", "bs4", "rapidfuzz", "requests",
+                 "pyttsx3", "pydub", "speech_recognition", "pyaudio")
+# preloaded in the background after the window is up, so first use doesn't stall
+WARM_MODULES = ("requests", "llm_adapter", "web_search", "numpy", "cv2", "pytesseract", "ocr_tools")
+
+def _warm_background():
+    def run():
+        if OLLAMA_WARMUP:
+            from llm_adapter import warm_up
+            warm_up(background=False)
+        from tts_handler import cleanup_temp_audio, prewarm
+        cleanup_temp_audio()
+        if TTS_PREWARM:
+            from agents import FIXED_REPLIES
+            from ui import SPOKEN_PHRASES
+            prewarm(FIXED_REPLIES + SPOKEN_PHRASES, background=False)
+        if not STARTUP_WARM:
+            return
+        for name in WARM_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+        try:
+            from memory import _get_index
+            from spellfix import _vocab
+            _get_index()
+            _vocab.prepare()
+        except Exception:
+            pass
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+def import_profile(module: str = "ui", top: int = 20):
+    """Prints the slowest imports (cumulative) when importing `module` in a fresh interpreter."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True).stderr
+    rows = []
+    for line in out.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), int(parts[0].split(":")[1]), parts[2].strip()))
+    rows.sort(reverse=True)
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cum, own, name in rows[:top]:
+        print(f"{cum / 1000:14.1f} {own / 1000:8.1f}  {name}")
+    heavy = [name for _, _, name in rows if name in HEAVY_MODULES]
+    print(f"heavy modules imported eagerly: {', '.join(heavy) or 'none'}")
+
+def main():
+    from ui import LyraUI
     app = LyraUI()
+    app.root.after(100, _warm_background)   # after the first frames are on screen
     app.run()
+
+if __name__ == "__main__":
+    if "--import-profile" in sys.argv:
+        import_profile()
+    elif "--serve" in sys.argv:
+        from server import serve
+        serve([a for a in sys.argv[1:] if a != "--serve"])
+    else:
+        main()
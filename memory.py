@@ -1,46 +1,195 @@
-# memory.py - persistent key/value facts + last capture pointer
-import os, json, datetime
-from config import DATA_DIR, MEMORY_FILE
+# memory.py - persistent key/value facts + last capture pointer (SQLite WAL + in-process cache)
+import os, json, sqlite3, datetime, threading
+from collections import OrderedDict
+from config import DATA_DIR, MEMORY_FILE, MEMORY_DB, RECALL_MIN_SCORE
 from history import add_history
+from recall_index import RecallIndex
+from namespace import PerNamespace, data_dir, on_drop
+
+MAX_CACHED_MISSES = 1024      # keys remembered as absent (LRU), so lookups of arbitrary text can't grow the cache
 
 def _utc_now():
     return datetime.datetime.now(datetime.timezone.utc).isoformat()
 
+class _FactStore:
+    """
+    One shared SQLite connection in WAL mode guarded by a lock, with a
+    read-through cache in front of it. Every write is a single transaction
+    so racing UI threads can't lose each other's updates.
+    """
+    def __init__(self, db_path: str, legacy_file: str | None = None):
+        self.db_path = db_path
+        self.legacy_file = legacy_file
+        self._lock = threading.RLock()
+        self._conn = None
+        self._facts = {}        # key -> entry dict
+        self._misses = OrderedDict()    # keys known not to exist, least recently asked first
+        self._meta = {}
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS facts (key TEXT PRIMARY KEY, value TEXT NOT NULL, time TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+            if self.legacy_file:
+                import_json_memory(self.legacy_file, store=self)
+        return self._conn
+
+    def get_fact(self, key: str):
+        with self._lock:
+            entry = self._facts.get(key)
+            if entry is not None:
+                return entry
+            if key in self._misses:
+                self._misses.move_to_end(key)
+                return None
+            row = self._db().execute("SELECT value, time FROM facts WHERE key = ?", (key,)).fetchone()
+            if row:
+                entry = self._facts[key] = {"value": row[0], "time": row[1]}
+                return entry
+            self._misses[key] = None
+            if len(self._misses) > MAX_CACHED_MISSES:
+                self._misses.popitem(last=False)
+            return None
+
+    def put_facts(self, items):
+        """items: iterable of (key, value, time). Written atomically."""
+        items = list(items)
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("INSERT OR REPLACE INTO facts (key, value, time) VALUES (?, ?, ?)", items)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            for k, v, t in items:
+                self._facts[k] = {"value": v, "time": t}
+                self._misses.pop(k, None)
+
+    def iter_facts(self):
+        """All (key, value, time) rows; used to build the recall index."""
+        with self._lock:
+            rows = self._db().execute("SELECT key, value, time FROM facts").fetchall()
+        return rows
+
+    def count_facts(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+
+    def get_meta(self, key: str):
+        with self._lock:
+            if key not in self._meta:
+                row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                self._meta[key] = json.loads(row[0]) if row and row[0] is not None else None
+            return self._meta[key]
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (key, json.dumps(value)))
+            self._meta[key] = value
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._facts.clear()
+            self._misses.clear()
+            self._meta.clear()
+
+def import_json_memory(path: str = MEMORY_FILE, store: "_FactStore | None" = None) -> int:
+    """
+    Imports facts and the last-capture pointer from the old memory.json layout
+    ({"facts": {k: {"value", "time"}}, "last_capture": ...}) and renames the
+    file to *.migrated. Returns the number of facts imported.
+    """
+    store = store or _store
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    facts = obj.get("facts", {}) or {}
+    store.put_facts((k, e.get("value", ""), e.get("time") or _utc_now()) for k, e in facts.items())
+    if obj.get("last_capture"):
+        store.set_meta("last_capture", obj["last_capture"])
+    os.replace(path, path + ".migrated")
+    return len(facts)
+
+_store = _FactStore(MEMORY_DB, legacy_file=MEMORY_FILE)
+
+def _make_store(name: str) -> _FactStore:
+    return _store if not name else _FactStore(os.path.join(data_dir(name), "memory.db"))
+
+# one fact store per namespace (the desktop user's is _store)
+_stores = PerNamespace(_make_store, close=lambda s: s.close())
+
 def ensure_memory_file():
     os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump({"facts": {}, "last_capture": None}, f, indent=2)
+    with _store._lock:
+        _store._db()
+
+def _build_index(name: str) -> RecallIndex:
+    idx = RecallIndex()
+    for k, v, _ in _stores.get(name).iter_facts():
+        idx.add(k, v)
+    return idx
 
-def _load():
-    ensure_memory_file()
-    with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# fuzzy recall index over fact keys, built on first use and kept current by remember()
+_indexes = PerNamespace(_build_index)
 
-def _save(obj):
-    with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2)
+def _drop(name: str):
+    _indexes.drop(name)
+    _stores.drop(name)
+
+on_drop(_drop)
+
+def _get_index() -> RecallIndex:
+    return _indexes.get()
 
 def remember(key: str, value: str) -> str:
-    obj = _load()
-    obj["facts"][key.lower().strip()] = {"value": value.strip(), "time": _utc_now()}
-    _save(obj)
+    k = key.lower().strip()
+    _stores.get().put_facts([(k, value.strip(), _utc_now())])
+    idx = _indexes.peek()
+    if idx is not None:
+        idx.add(k, value.strip())
     add_history("remember", f"{key} = {value}")
     return f"Okay, remembered {key} = {value}."
 
+def fact_keys():
+    return [k for k, _, _ in _stores.get().iter_facts()]
+
+def search_facts(query: str, k: int = 5, min_score: float = RECALL_MIN_SCORE):
+    """Fuzzy top-k [(key, value, score)] over remembered facts."""
+    return _get_index().search(query, k=k, min_score=min_score)
+
 def recall(key: str) -> str:
-    obj = _load()
-    entry = obj["facts"].get(key.lower().strip())
-    if not entry:
+    store = _stores.get()
+    entry = store.get_fact(key.lower().strip())
+    if entry:
+        return f"You told me: {key} = {entry['value']} (saved {entry['time']})."
+    matches = search_facts(key, k=3)
+    if not matches:
         return f"I don't have anything saved for '{key}'."
-    return f"You told me: {key} = {entry['value']} (saved {entry['time']})."
+    best_key = matches[0][0]
+    entry = store.get_fact(best_key) or {"value": matches[0][1], "time": "?"}
+    out = f"You told me: {best_key} = {entry['value']} (saved {entry['time']})."
+    if len(matches) > 1:
+        out += " Also close: " + "; ".join(f"{k_} = {v}" for k_, v, _ in matches[1:])
+    return out
 
 def set_last_capture(path: str):
-    obj = _load()
-    obj["last_capture"] = {"path": path, "time": _utc_now()}
-    _save(obj)
+    _stores.get().set_meta("last_capture", {"path": path, "time": _utc_now()})
     add_history("capture_set", path)
 
 def get_last_capture():
-    obj = _load()
-    return obj.get("last_capture")
+    return _stores.get().get_meta("last_capture")
@@ -0,0 +1,92 @@
+# namespace.py - whose memory/history/captures the current request uses ("" = the desktop user)
+import os, re, contextvars, threading
+from contextlib import contextmanager
+from config import DATA_DIR, CAPTURES_DIR, SESSIONS_DIR
+
+# A context variable rather than a thread-local: the server hops between
+# executor threads while streaming one reply, and asyncio tasks each keep
+# their own value. Threads started for a request must run under
+# contextvars.copy_context() (see start_thread) to inherit it.
+_current = contextvars.ContextVar("lyra_namespace", default="")
+_NAME_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def valid_name(name: str) -> bool:
+    return bool(name) and _NAME_RE.fullmatch(name) is not None
+
+def current() -> str:
+    return _current.get()
+
+@contextmanager
+def use(name: str):
+    """Everything under the with block (and threads started via start_thread) reads and writes name's data."""
+    if name and not valid_name(name):
+        raise ValueError(f"bad namespace name: {name!r}")
+    token = _current.set(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def bound_context(name: str) -> contextvars.Context:
+    """A copy of the current context with name as the namespace, for ctx.run(...) on executor threads."""
+    if name and not valid_name(name):
+        raise ValueError(f"bad namespace name: {name!r}")
+    ctx = contextvars.copy_context()
+    ctx.run(_current.set, name)
+    return ctx
+
+def data_dir(name: str | None = None) -> str:
+    name = current() if name is None else name
+    return os.path.join(SESSIONS_DIR, name) if name else DATA_DIR
+
+def captures_dir(name: str | None = None) -> str:
+    name = current() if name is None else name
+    return os.path.join(SESSIONS_DIR, name, "captures") if name else CAPTURES_DIR
+
+def start_thread(target, *args, name: str | None = None) -> threading.Thread:
+    """A daemon thread running target(*args) in the caller's namespace."""
+    t = threading.Thread(target=contextvars.copy_context().run, args=(target, *args), name=name, daemon=True)
+    t.start()
+    return t
+
+class PerNamespace:
+    """
+    Lazily built object per namespace: factory(name) makes it, close(obj)
+    (optional) releases it when the namespace is dropped.
+    """
+    def __init__(self, factory, close=None):
+        self.factory = factory
+        self.close = close
+        self._objs = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str | None = None):
+        name = current() if name is None else name
+        with self._lock:
+            obj = self._objs.get(name)
+            if obj is None:
+                obj = self._objs[name] = self.factory(name)
+            return obj
+
+    def peek(self, name: str | None = None):
+        """The object if it's been built, else None."""
+        return self._objs.get(current() if name is None else name)
+
+    def drop(self, name: str):
+        with self._lock:
+            obj = self._objs.pop(name, None)
+        if obj is not None and self.close is not None:
+            self.close(obj)
+
+_drop_hooks = []
+
+def on_drop(fn):
+    """fn(name) runs when a namespace is dropped (modules release their per-namespace state)."""
+    _drop_hooks.append(fn)
+
+def drop(name: str):
+    """Releases everything held open for namespace name (its data stays on disk)."""
+    if not name:
+        return
+    for fn in _drop_hooks:
+        fn(name)
@@ -0,0 +1,107 @@
+# ocr_batch.py - headless batch OCR over the captures directory (or any glob), streamed as JSONL
+import os, sys, glob, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from config import CAPTURES_DIR, OCR_LANG, OCR_PSM, OCR_PIPELINE, OCR_WORKERS, OCR_BATCH_FILE, TESSERACT_PATH
+from ocr_index import is_indexed, index_text
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+def iter_images(pattern: str | None = None):
+    """Image paths matching pattern (default: everything in CAPTURES_DIR), lazily and in sorted order per directory."""
+    if pattern is None:
+        pattern = os.path.join(CAPTURES_DIR, "*")
+    for p in sorted(glob.iglob(pattern, recursive=True)):
+        if p.lower().endswith(IMAGE_EXTS) and os.path.isfile(p):
+            yield os.path.abspath(p)
+
+def _ocr_one(path: str, lang: str, psm: int, pipeline: str) -> dict:
+    """Worker process: OCR a single file. Only the path crosses the process boundary, never pixels."""
+    t0 = time.perf_counter()
+    try:
+        if pipeline == "staged":
+            from ocr_pipeline import ocr_file
+            res = ocr_file(path, lang=lang, parallel=False)      # this process is already one of the pool
+            text, conf, regions = res["text"], res["conf"], len(res["regions"])
+        else:
+            import pytesseract
+            from PIL import Image
+            if TESSERACT_PATH and os.path.exists(TESSERACT_PATH):
+                pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+            with Image.open(path) as img:
+                text = (pytesseract.image_to_string(img, lang=lang, config=f"--psm {psm}") or "").strip()
+            conf, regions = None, None
+        return {"path": path, "text": text, "conf": conf, "regions": regions,
+                "seconds": round(time.perf_counter() - t0, 3)}
+    except Exception as e:
+        return {"path": path, "error": str(e), "seconds": round(time.perf_counter() - t0, 3)}
+
+def batch_ocr(pattern: str | None = None, out_path: str | None = OCR_BATCH_FILE, workers: int = OCR_WORKERS,
+              resume: bool = True, lang: str = OCR_LANG, psm: int = OCR_PSM, pipeline: str = OCR_PIPELINE,
+              index: bool = True, worker_fn=_ocr_one):
+    """
+    Yields one result dict per image as soon as it's done (completion order).
+    At most 2 * workers images are in flight, so memory stays flat however
+    many files match. Each result is appended to out_path (JSONL) and to the
+    full-text index, which is also the checkpoint: with resume, files already
+    indexed and unchanged are skipped. Successful results also fill the
+    per-image OCR cache, so "read text" on a batch-processed capture is instant.
+    """
+    from ocr_tools import _ocr_config, _file_sig, _store_ocr
+    cfg = _ocr_config(lang, psm, pipeline)
+    out = None
+    if out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        out = open(out_path, "a", encoding="utf-8")
+    pending = set()
+    paths = (p for p in iter_images(pattern) if not (resume and is_indexed(p)))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path in paths:
+                pending.add(pool.submit(worker_fn, path, lang, psm, pipeline))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from _finish(done, out, index, cfg, _file_sig, _store_ocr)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _finish(done, out, index, cfg, _file_sig, _store_ocr)
+    finally:
+        for f in pending:
+            f.cancel()
+        if out is not None:
+            out.close()
+
+def _finish(done, out, index, cfg, file_sig, store_ocr):
+    for fut in done:
+        res = fut.result()
+        if "error" not in res:
+            if index:
+                index_text(res["path"], res["text"], res["conf"])
+            try:
+                store_ocr(res["path"], cfg, file_sig(res["path"]), None, res["text"])
+            except OSError:
+                pass
+        if out is not None:
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            out.flush()
+        yield res
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OCR every image under the captures directory (or a glob) into the text index.")
+    ap.add_argument("pattern", nargs="?", help="glob of images (default: captures/*); ** is recursive")
+    ap.add_argument("--out", default=OCR_BATCH_FILE, help="JSONL results file ('' to skip)")
+    ap.add_argument("--workers", type=int, default=OCR_WORKERS)
+    ap.add_argument("--no-resume", action="store_true", help="re-OCR files that are already indexed")
+    ap.add_argument("--pipeline", choices=("staged", "single"), default=OCR_PIPELINE)
+    args = ap.parse_args(argv)
+    n = errors = 0
+    t0 = time.perf_counter()
+    for res in batch_ocr(args.pattern, out_path=args.out or None, workers=args.workers,
+                         resume=not args.no_resume, pipeline=args.pipeline):
+        n += 1
+        errors += "error" in res
+        sys.stdout.write(json.dumps(res, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    print(f"{n} images ({errors} errors) in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
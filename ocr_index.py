@@ -0,0 +1,98 @@
+# ocr_index.py - full-text index over OCR'd captures (SQLite FTS5, LIKE fallback) + batch checkpoint
+import os, re, sqlite3, datetime, threading
+from config import OCR_INDEX_DB
+from namespace import PerNamespace, data_dir, on_drop
+
+class OcrIndex:
+    """
+    files holds one row per OCR'd image (size/mtime double as the batch
+    checkpoint: an unchanged file is skipped); ocr_text is an FTS5 table of
+    the OCR output, or a plain table searched with LIKE when SQLite lacks FTS5.
+    """
+    def __init__(self, db_path: str = OCR_INDEX_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self.fts = True
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                         "mtime_ns INTEGER, conf REAL, time TEXT)")
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS ocr_text USING fts5(path UNINDEXED, body)")
+            except sqlite3.OperationalError:
+                self.fts = False
+                conn.execute("CREATE TABLE IF NOT EXISTS ocr_text (path TEXT, body TEXT)")
+            self._conn = conn
+        return self._conn
+
+    def is_current(self, path: str) -> bool:
+        """True when path was indexed and hasn't changed since."""
+        st = os.stat(path)
+        with self._lock:
+            row = self._db().execute("SELECT size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+        return row is not None and tuple(row) == (st.st_size, st.st_mtime_ns)
+
+    def add(self, path: str, text: str, conf: float | None = None):
+        st = os.stat(path)
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM ocr_text WHERE path = ?", (path,))
+                db.execute("INSERT INTO ocr_text (path, body) VALUES (?, ?)", (path, text))
+                db.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, conf, time) VALUES (?, ?, ?, ?, ?)",
+                           (path, st.st_size, st.st_mtime_ns, conf, now))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def search(self, query: str, limit: int = 5):
+        """[(path, snippet)] best match first."""
+        words = re.findall(r"\w+", query.lower())
+        if not words:
+            return []
+        with self._lock:
+            db = self._db()
+            if self.fts:
+                match = " ".join(f'"{w}"*' for w in words)
+                rows = db.execute("SELECT path, snippet(ocr_text, 1, '[', ']', '...', 12) FROM ocr_text "
+                                  "WHERE ocr_text MATCH ? ORDER BY rank LIMIT ?", (match, limit)).fetchall()
+            else:
+                where = " AND ".join("lower(body) LIKE ?" for _ in words)
+                rows = db.execute(f"SELECT path, substr(body, 1, 120) FROM ocr_text WHERE {where} LIMIT ?",
+                                  [f"%{w}%" for w in words] + [limit]).fetchall()
+        return [(p, " ".join(s.split())) for p, s in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+_index = OcrIndex()
+
+# each namespace searches only its own captures
+_indexes = PerNamespace(lambda name: OcrIndex(os.path.join(data_dir(name), "ocr_index.db")) if name else _index,
+                        close=lambda idx: idx.close())
+on_drop(_indexes.drop)
+
+def index_text(path: str, text: str, conf: float | None = None):
+    _indexes.get().add(path, text, conf)
+
+def search_text(query: str, limit: int = 5):
+    return _indexes.get().search(query, limit)
+
+def is_indexed(path: str) -> bool:
+    return _indexes.get().is_current(path)
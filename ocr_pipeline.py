@@ -0,0 +1,159 @@
+# ocr_pipeline.py - staged OCR: NumPy preprocessing, text-region detection, parallel Tesseract per region
+import os, time, threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+import pytesseract
+from config import OCR_WORKERS, TESSERACT_PATH
+
+TARGET_LONG_SIDE = 2000          # ~300 DPI for a page-sized photo; webcam frames get upscaled
+MAX_LONG_SIDE = 3500
+THRESH_WINDOW = 31               # adaptive threshold neighbourhood (px, odd)
+THRESH_OFFSET = 10               # pixel is ink if darker than local mean - offset
+MIN_REGION_AREA = 400
+REGION_PSM = 6                   # each detected region is OCR'd as one uniform block of text
+
+def to_gray(img: np.ndarray) -> np.ndarray:
+    """BGR/RGB uint8 -> float32 luma (ITU-R 601 weights, channel order doesn't matter much for text)."""
+    if img.ndim == 2:
+        return img.astype(np.float32)
+    return img[..., :3].astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+def normalize_scale(gray: np.ndarray):
+    """Resamples so the long side is near TARGET_LONG_SIDE; returns (image, scale)."""
+    long_side = max(gray.shape)
+    if long_side < TARGET_LONG_SIDE:
+        scale = TARGET_LONG_SIDE / long_side
+    elif long_side > MAX_LONG_SIDE:
+        scale = MAX_LONG_SIDE / long_side
+    else:
+        return gray, 1.0
+    interp = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interp), scale
+
+def adaptive_threshold(gray: np.ndarray, window: int = THRESH_WINDOW, offset: float = THRESH_OFFSET) -> np.ndarray:
+    """Mean-C threshold via an integral image; returns uint8 with ink = 0 and paper = 255."""
+    r = window // 2
+    pad = np.pad(gray, r + 1, mode="edge").astype(np.float64)
+    ii = pad.cumsum(0).cumsum(1)
+    h, w = gray.shape
+    s = (ii[window:window + h, window:window + w] - ii[:h, window:window + w]
+         - ii[window:window + h, :w] + ii[:h, :w])
+    mean = s / (window * window)
+    return np.where(gray < mean - offset, 0, 255).astype(np.uint8)
+
+def deskew(binary: np.ndarray) -> np.ndarray:
+    """Rotates so the dominant ink orientation is horizontal (skips tiny or extreme angles)."""
+    ys, xs = np.nonzero(binary == 0)
+    if len(xs) < 500:
+        return binary
+    angle = cv2.minAreaRect(np.column_stack([xs, ys]).astype(np.float32))[-1]
+    if angle > 45:
+        angle -= 90
+    if abs(angle) < 0.5 or abs(angle) > 15:
+        return binary
+    h, w = binary.shape
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(binary, m, (w, h), flags=cv2.INTER_NEAREST, borderValue=255)
+
+def find_text_regions(binary: np.ndarray, pad: int = 8):
+    """Boxes (x, y, w, h) of text blocks: ink dilated into lines/paragraphs, then connected components."""
+    ink = (binary == 0).astype(np.uint8)
+    kx = max(15, binary.shape[1] // 50)              # wide enough to bridge word gaps, not columns
+    blocks = cv2.dilate(ink, np.ones((max(5, kx // 3), kx), np.uint8))
+    n, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8)
+    h, w = binary.shape
+    boxes = []
+    for x, y, bw, bh, area in stats[1:]:
+        if area < MIN_REGION_AREA or bh < 8:
+            continue
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        boxes.append((int(x0), int(y0), int(min(w, x + bw + pad) - x0), int(min(h, y + bh + pad) - y0)))
+    return _merge_rows(boxes)
+
+def _merge_rows(boxes):
+    """Joins boxes on the same line whose horizontal gap is under a line height (wide word spacing)."""
+    boxes = sorted(boxes, key=lambda b: b[0])
+    out = []
+    for x, y, w, h in boxes:
+        for i, (ox, oy, ow, oh) in enumerate(out):
+            overlap = min(y + h, oy + oh) - max(y, oy)
+            if overlap > 0.5 * min(h, oh) and x - (ox + ow) < max(h, oh):
+                nx, ny = min(x, ox), min(y, oy)
+                out[i] = (nx, ny, max(x + w, ox + ow) - nx, max(y + h, oy + oh) - ny)
+                break
+        else:
+            out.append((x, y, w, h))
+    out.sort(key=lambda b: (b[1] // 20, b[0]))        # reading order: rows, then left to right
+    return out
+
+def preprocess(img: np.ndarray):
+    """Returns (binary image, scale) ready for Tesseract."""
+    gray, scale = normalize_scale(to_gray(img))
+    return deskew(adaptive_threshold(gray)), scale
+
+def _ocr_region(args):
+    """Runs in a worker process: OCR one crop, returns (text, mean confidence, word boxes)."""
+    crop, box, lang, psm = args
+    if TESSERACT_PATH and os.path.exists(TESSERACT_PATH):
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    data = pytesseract.image_to_data(crop, lang=lang, config=f"--psm {psm}",
+                                     output_type=pytesseract.Output.DICT)
+    words, confs, lines = [], [], {}
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        confs.append(conf)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        words.append({"text": word, "conf": conf,
+                      "box": (box[0] + data["left"][i], box[1] + data["top"][i], data["width"][i], data["height"][i])})
+    text = "\n".join(" ".join(ws) for _, ws in sorted(lines.items()))
+    return text, (sum(confs) / len(confs) if confs else 0.0), words
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _pool
+
+def ocr_structured(img: np.ndarray, lang: str = "eng", parallel: bool = True) -> dict:
+    """
+    Full pipeline on a BGR/gray array. Returns
+    {"text", "conf", "regions": [{"text", "conf", "box", "words"}], "timings": {...}}
+    with boxes in the preprocessed image's coordinates divided by "scale".
+    """
+    t0 = time.perf_counter()
+    binary, scale = preprocess(img)
+    t1 = time.perf_counter()
+    boxes = find_text_regions(binary) or [(0, 0, binary.shape[1], binary.shape[0])]
+    jobs = [(binary[y:y + h, x:x + w], (x, y, w, h), lang, REGION_PSM) for x, y, w, h in boxes]
+    t2 = time.perf_counter()
+    if parallel and len(jobs) > 1:
+        results = list(_get_pool().map(_ocr_region, jobs))
+    else:
+        results = [_ocr_region(j) for j in jobs]
+    t3 = time.perf_counter()
+    regions = []
+    for (text, conf, words), (x, y, w, h) in zip(results, boxes):
+        if not text:
+            continue
+        regions.append({"text": text, "conf": round(conf, 1), "words": words,
+                        "box": tuple(int(round(v / scale)) for v in (x, y, w, h))})
+    total_words = sum(len(r["words"]) for r in regions)
+    conf = sum(r["conf"] * len(r["words"]) for r in regions) / total_words if total_words else 0.0
+    return {"text": "\n".join(r["text"] for r in regions), "conf": round(conf, 1), "regions": regions,
+            "scale": scale,
+            "timings": {"preprocess": t1 - t0, "regions": t2 - t1, "ocr": t3 - t2, "total": t3 - t0}}
+
+def ocr_file(path: str, lang: str = "eng", parallel: bool = True) -> dict:
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"cannot read image {path}")
+    return ocr_structured(img, lang=lang, parallel=parallel)
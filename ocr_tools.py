@@ -1,38 +1,301 @@
 # ocr_tools.py - camera capture + OCR (Tesseract optional)
-import os, cv2, datetime
+import os, cv2, json, time, hashlib, datetime, threading
+from collections import deque, OrderedDict
+import numpy as np
 from PIL import Image
 import pytesseract
-from config import CAPTURES_DIR, TESSERACT_PATH
+from config import (TESSERACT_PATH, CAMERA_PERSISTENT, CAMERA_SOURCE, CAMERA_BUFFER_FRAMES,
+                    CAMERA_WARMUP_FRAMES, CAMERA_IDLE_TIMEOUT, CAMERA_FPS,
+                    OCR_LANG, OCR_PSM, OCR_CACHE_MEM_ENTRIES, OCR_PRECOMPUTE, OCR_PIPELINE)
 from memory import set_last_capture
 from history import add_history
+from namespace import captures_dir, start_thread
+from tracing import traced
 
 # configure tesseract if path exists
 if TESSERACT_PATH and os.path.exists(TESSERACT_PATH):
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
-os.makedirs(CAPTURES_DIR, exist_ok=True)
+def sharpness(frame) -> float:
+    """Variance of the 4-neighbour Laplacian on a 2x-subsampled grayscale frame (higher = sharper)."""
+    g = frame[::2, ::2].astype(np.float32)
+    if g.ndim == 3:
+        g = g.mean(axis=2)
+    lap = g[:-2, 1:-1] + g[2:, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:] - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
 
-def capture_image() -> str:
-    cap = cv2.VideoCapture(0)
+def _parse_source(source):
+    return int(source) if isinstance(source, str) and source.isdigit() else source
+
+class CameraService:
+    """
+    Keeps the capture device open on a background thread and holds the last
+    few frames (with their sharpness) in a ring buffer, so a capture is just
+    "pick the sharpest recent frame". The device is released after
+    idle_timeout seconds without a request and reopened on the next one.
+    opener(source) must return a cv2.VideoCapture-like object (isOpened,
+    read, release, optionally set); file sources are looped.
+    """
+    def __init__(self, source=CAMERA_SOURCE, buffer_frames: int = CAMERA_BUFFER_FRAMES,
+                 warmup_frames: int = CAMERA_WARMUP_FRAMES, idle_timeout: float = CAMERA_IDLE_TIMEOUT,
+                 fps: float = CAMERA_FPS, opener=cv2.VideoCapture):
+        self.source = _parse_source(source)
+        self.warmup_frames = warmup_frames
+        self.idle_timeout = idle_timeout
+        self.interval = 1.0 / fps if fps else 0.0
+        self.opener = opener
+        self._frames = deque(maxlen=buffer_frames)     # (sharpness, frame)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+        self._last_used = time.monotonic()
+        self.failed = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self._stop.clear()
+            self._frames.clear()
+            self.failed = False
+            self._last_used = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="camera", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=2)
+
+    def _run(self):
+        cap = self.opener(self.source)
+        try:
+            if not cap.isOpened():
+                self.failed = True
+                return
+            skipped = 0
+            while not self._stop.is_set():
+                if time.monotonic() - self._last_used > self.idle_timeout:
+                    break
+                t0 = time.monotonic()
+                ok, frame = cap.read()
+                if not ok:
+                    # end of a file source: rewind; a dead device: give up
+                    if hasattr(cap, "set") and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        continue
+                    self.failed = True
+                    break
+                if skipped < self.warmup_frames:
+                    skipped += 1
+                    continue
+                score = sharpness(frame)
+                with self._cond:
+                    self._frames.append((score, frame))
+                    self._cond.notify_all()
+                rest = self.interval - (time.monotonic() - t0)
+                if rest > 0:
+                    self._stop.wait(rest)
+        finally:
+            cap.release()
+            with self._cond:
+                self._frames.clear()
+                self._cond.notify_all()
+
+    def best_frame(self, timeout: float = 3.0):
+        """Sharpest buffered frame (a copy), starting the device if needed; None on failure."""
+        self._last_used = time.monotonic()
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._frames:
+                left = deadline - time.monotonic()
+                if left <= 0 or self.failed or not self.running:
+                    return None
+                self._cond.wait(left)
+            score, frame = max(self._frames, key=lambda sf: sf[0])
+            return frame.copy()
+
+_camera = None
+_camera_lock = threading.Lock()
+
+def get_camera() -> CameraService:
+    global _camera
+    with _camera_lock:
+        if _camera is None:
+            _camera = CameraService()
+    return _camera
+
+_frame_source = None            # callable() -> frame that replaces the camera (benchmarks, tests)
+
+def set_frame_source(fn):
+    """Captures take frames from fn() instead of the device; None restores the camera."""
+    global _frame_source
+    _frame_source = fn
+
+def _grab_frame():
+    if _frame_source is not None:
+        return _frame_source()
+    if CAMERA_PERSISTENT:
+        return get_camera().best_frame()
+    cap = cv2.VideoCapture(_parse_source(CAMERA_SOURCE))
     if not cap.isOpened():
-        return ""
+        return None
     ok, frame = cap.read()
     cap.release()
-    if not ok:
+    return frame if ok else None
+
+@traced("camera.capture")
+def capture_image() -> str:
+    frame = _grab_frame()
+    if frame is None:
         return ""
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = os.path.join(CAPTURES_DIR, f"capture_{ts}.png")
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")     # concurrent captures mustn't share a file
+    folder = captures_dir()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"capture_{ts}.png")
     cv2.imwrite(path, frame)
     set_last_capture(path)
     add_history("capture", path)
+    if OCR_PRECOMPUTE:
+        # warm the OCR cache so a follow-up "read text"/"describe" doesn't wait on Tesseract
+        start_thread(_precompute_ocr, path)
     return path
 
-def ocr_image(path: str) -> str:
+def _precompute_ocr(path: str):
+    text = ocr_image(path)
+    if not text.startswith("(ocr"):
+        from ocr_index import index_text
+        index_text(path, text)
+
+# ---- OCR result cache: content hash + OCR config -> text ----
+# Results live in a sidecar "<image>.ocr.json" next to the image, with an
+# in-memory LRU in front keyed by (path, size, mtime) so hits skip hashing.
+_ocr_mem = OrderedDict()
+_ocr_lock = threading.Lock()
+_ocr_inflight = {}              # (path, config) -> [Lock, users] while an OCR of it runs or waits, so a
+                                # background and a foreground OCR don't both run; removed by the last user
+
+def _ocr_config(lang: str, psm: int, pipeline: str = "single") -> str:
+    # the staged pipeline segments the page itself (ocr_pipeline.REGION_PSM per region): psm doesn't apply
+    if pipeline == "staged":
+        return f"lang={lang};pipeline=staged"
+    return f"lang={lang};psm={psm}"
+
+def _file_sig(path: str):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _sidecar_path(path: str) -> str:
+    return path + ".ocr.json"
+
+def _read_sidecar(path: str) -> dict:
+    try:
+        with open(_sidecar_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _mem_get(key):
+    with _ocr_lock:
+        if key in _ocr_mem:
+            _ocr_mem.move_to_end(key)
+            return _ocr_mem[key]
+    return None
+
+def _mem_put(key, text: str):
+    with _ocr_lock:
+        _ocr_mem[key] = text
+        _ocr_mem.move_to_end(key)
+        while len(_ocr_mem) > OCR_CACHE_MEM_ENTRIES:
+            _ocr_mem.popitem(last=False)
+
+def _cached_ocr(path: str, cfg: str, sig):
+    """Text from memory or a still-valid sidecar, else None. Returns (text, sha256 or None)."""
+    text = _mem_get((path, sig, cfg))
+    if text is not None:
+        return text, None
+    side = _read_sidecar(path)
+    if not side:
+        return None, None
+    if (side.get("size"), side.get("mtime_ns")) == tuple(sig):
+        sha = side.get("sha256")
+    else:
+        # file touched: only trust the sidecar if the content is the same
+        sha = _sha256(path)
+        if sha != side.get("sha256"):
+            return None, sha
+    entry = side.get("results", {}).get(cfg)
+    if entry is None:
+        return None, sha
+    _mem_put((path, sig, cfg), entry["text"])
+    return entry["text"], sha
+
+def _store_ocr(path: str, cfg: str, sig, sha: str | None, text: str):
+    _mem_put((path, sig, cfg), text)
+    sha = sha or _sha256(path)
+    side = _read_sidecar(path)
+    if side.get("sha256") != sha:
+        side = {"sha256": sha, "results": {}}
+    side.update(size=sig[0], mtime_ns=sig[1])
+    side.setdefault("results", {})[cfg] = {"text": text, "time": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    tmp = _sidecar_path(path) + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(side, f, ensure_ascii=False)
+        os.replace(tmp, _sidecar_path(path))
+    except OSError:
+        pass
+
+@traced("ocr.tesseract")
+def _run_tesseract(path: str, lang: str, psm: int, pipeline: str = "single") -> str:
+    if pipeline == "staged":
+        return ocr_details(path, lang)["text"]
+    img = Image.open(path)
+    text = pytesseract.image_to_string(img, lang=lang, config=f"--psm {psm}")
+    return (text or "").strip()
+
+def ocr_details(path: str, lang: str = OCR_LANG) -> dict:
+    """Staged pipeline result: {"text", "conf", "regions": [{"text", "conf", "box", "words"}], ...}."""
+    from ocr_pipeline import ocr_file
+    return ocr_file(path, lang=lang)
+
+@traced("ocr.image")
+def ocr_image(path: str, lang: str = OCR_LANG, psm: int = OCR_PSM, use_cache: bool = True,
+              pipeline: str = OCR_PIPELINE) -> str:
     if not os.path.exists(path):
         return "(ocr) file not found"
+    cfg = _ocr_config(lang, psm, pipeline)
     try:
-        img = Image.open(path)
-        text = pytesseract.image_to_string(img)
-        return (text or "").strip()
+        if not use_cache:
+            return _run_tesseract(path, lang, psm, pipeline)
+        key = (path, cfg)
+        with _ocr_lock:
+            slot = _ocr_inflight.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                sig = _file_sig(path)
+                text, sha = _cached_ocr(path, cfg, sig)
+                if text is None:
+                    text = _run_tesseract(path, lang, psm, pipeline)
+                    _store_ocr(path, cfg, sig, sha, text)
+        finally:
+            with _ocr_lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del _ocr_inflight[key]
+        return text
     except Exception as e:
         return f"(ocr error) {e}"
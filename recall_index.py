@@ -0,0 +1,195 @@
+# recall_index.py - incremental fuzzy recall over remembered facts (token + trigram inverted index, optional NumPy)
+import re, zlib, math, threading
+from collections import Counter, defaultdict
+
+np = None                   # NumPy, imported when the first index is built (optional)
+_np_checked = False
+
+def _load_numpy():
+    global np, _np_checked
+    if not _np_checked:
+        _np_checked = True
+        try:
+            import numpy
+            np = numpy
+        except Exception:
+            np = None
+
+STOPWORDS = {"a", "an", "the", "my", "your", "our", "of", "for", "to", "in", "on", "at", "is", "was",
+             "about", "what", "did", "i", "say", "me", "it", "and", "or"}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# score = WORD_W * IDF word overlap + GRAM_W * trigram Jaccard + VEC_W * hashed-trigram cosine, in both search paths
+WORD_W, GRAM_W, VEC_W = 0.5, 0.3, 0.2
+
+def _tokens(text: str):
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+def _trigrams(text: str):
+    s = f" {' '.join(_WORD_RE.findall(text.lower()))} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _hashed(grams, dim: int) -> dict:
+    """Trigrams hashed into dim buckets, L2-normalized, as {bucket: weight}."""
+    v = Counter(zlib.crc32(g.encode("utf-8")) % dim for g in grams)
+    n = math.sqrt(sum(x * x for x in v.values()))
+    return {b: x / n for b, x in v.items()} if n else {}
+
+class RecallIndex:
+    """
+    Every fact key gets an id. Word tokens of the key (and, at half weight,
+    of the value) and character trigrams of the key go into inverted
+    indexes, so a query only touches facts sharing a word or trigram with
+    it. Candidates are scored by IDF-weighted word overlap plus trigram
+    overlap and the cosine of hashed trigram vectors; with NumPy the
+    posting lists are scored as whole arrays, without it per candidate.
+    Re-adding a key replaces its old entry.
+    """
+    def __init__(self, dim: int = 64):
+        _load_numpy()
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.keys, self.values, self.alive = [], [], []
+        self._ids = {}                          # key -> current id
+        self._tok = defaultdict(list)           # token -> [(id, weight)]
+        self._gram = defaultdict(list)          # trigram -> [id]
+        self._ngrams = []                       # trigram count per id
+        self._sparse = []                       # hashed trigram vector per id (without NumPy)
+        self._arrays = {}                       # posting-list ndarray cache, dropped when the list grows
+        self.live = 0
+        self.vectorized = np is not None        # fixed per index: the arrays exist only if NumPy did
+        if self.vectorized:
+            self._vecs = np.zeros((1024, dim), dtype=np.float32)
+            self._alive_arr = np.zeros(1024, dtype=bool)
+            self._ngram_arr = np.ones(1024, dtype=np.float32)
+
+    def _vector(self, grams):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for b, x in _hashed(grams, self.dim).items():
+            v[b] = x
+        return v
+
+    def _grow(self, i: int):
+        if i >= len(self._alive_arr):
+            self._vecs = np.concatenate([self._vecs, np.zeros_like(self._vecs)])
+            self._alive_arr = np.concatenate([self._alive_arr, np.zeros_like(self._alive_arr)])
+            self._ngram_arr = np.concatenate([self._ngram_arr, np.ones_like(self._ngram_arr)])
+
+    def add(self, key: str, value: str = ""):
+        key = key.lower().strip()
+        with self._lock:
+            old = self._ids.get(key)
+            if old is not None:
+                self.alive[old] = False
+                self.live -= 1
+                if self.vectorized:
+                    self._alive_arr[old] = False
+            i = len(self.keys)
+            self.keys.append(key)
+            self.values.append(value)
+            self.alive.append(True)
+            self._ids[key] = i
+            self.live += 1
+            key_toks = set(_tokens(key))
+            for t in key_toks:
+                self._tok[t].append((i, 1.0))
+                self._arrays.pop(("t", t), None)
+            for t in set(_tokens(value)) - key_toks:
+                self._tok[t].append((i, 0.5))
+                self._arrays.pop(("t", t), None)
+            grams = _trigrams(key)
+            self._ngrams.append(len(grams))
+            for g in grams:
+                self._gram[g].append(i)
+                self._arrays.pop(("g", g), None)
+            if self.vectorized:
+                self._grow(i)
+                self._vecs[i] = self._vector(grams)
+                self._alive_arr[i] = True
+                self._ngram_arr[i] = len(grams)
+            else:
+                self._sparse.append(_hashed(grams, self.dim))
+
+    def __len__(self):
+        return self.live
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0):
+        """Top-k [(key, value, score)] with score in 0..1, best first."""
+        q_toks = set(_tokens(query))
+        q_grams = _trigrams(query)
+        with self._lock:
+            if not self.keys:
+                return []
+            if self.vectorized:
+                best = self._search_np(q_toks, q_grams, k)
+            else:
+                best = self._search_py(q_toks, q_grams, k)
+            return [(self.keys[i], self.values[i], round(sc, 4)) for i, sc in best if sc >= min_score]
+
+    def _common_limit(self) -> int:
+        # trigrams present in over 20% of keys carry little signal and cost the most
+        return max(50, len(self.keys) // 5)
+
+    def _search_py(self, q_toks, q_grams, k):
+        n = len(self.keys)
+        scores, total_idf = defaultdict(float), 0.0
+        for t in q_toks:
+            post = self._tok.get(t, ())
+            idf = math.log(1 + n / (1 + len(post)))
+            total_idf += idf
+            for i, w in post:
+                scores[i] += idf * w
+        combined = {i: WORD_W * sc / total_idf for i, sc in scores.items()} if total_idf else {}
+        limit = self._common_limit()
+        counts = Counter()
+        for g in q_grams:
+            ids = self._gram.get(g, ())
+            if len(ids) <= limit:
+                counts.update(ids)
+        for i, c in counts.items():
+            combined[i] = combined.get(i, 0.0) + GRAM_W * c / (len(q_grams) + self._ngrams[i] - c)
+        ids = [i for i in combined if self.alive[i]]
+        qv = _hashed(q_grams, self.dim)
+        for i in ids:
+            combined[i] += VEC_W * sum(qv.get(b, 0.0) * x for b, x in self._sparse[i].items())
+        ids.sort(key=combined.__getitem__, reverse=True)
+        return [(i, combined[i]) for i in ids[:k]]
+
+    def _posting(self, kind: str, term: str):
+        arr = self._arrays.get((kind, term))
+        if arr is None:
+            if kind == "t":
+                post = self._tok[term]
+                arr = (np.fromiter((i for i, _ in post), dtype=np.int64, count=len(post)),
+                       np.fromiter((w for _, w in post), dtype=np.float32, count=len(post)))
+            else:
+                arr = np.asarray(self._gram[term], dtype=np.int64)
+            self._arrays[(kind, term)] = arr
+        return arr
+
+    def _search_np(self, q_toks, q_grams, k):
+        n = len(self.keys)
+        score = np.zeros(n, dtype=np.float32)
+        total_idf = 0.0
+        for t in q_toks:
+            if t not in self._tok:
+                total_idf += math.log(1 + n)
+                continue
+            ids, w = self._posting("t", t)
+            idf = math.log(1 + n / (1 + len(ids)))
+            total_idf += idf
+            score += np.bincount(ids, weights=w * idf, minlength=n)[:n].astype(np.float32)
+        if total_idf:
+            score *= WORD_W / total_idf
+        limit = self._common_limit()
+        grams = [self._posting("g", g) for g in q_grams if 0 < len(self._gram.get(g, ())) <= limit]
+        if grams:
+            shared = np.bincount(np.concatenate(grams), minlength=n)[:n].astype(np.float32)
+            score += GRAM_W * shared / (len(q_grams) + self._ngram_arr[:n] - shared)
+        score[~self._alive_arr[:n]] = 0.0
+        cand = np.flatnonzero(score)
+        if not len(cand):
+            return []
+        score = score[cand] + VEC_W * (self._vecs[cand] @ self._vector(q_grams))
+        top = np.argpartition(-score, min(k, len(cand)) - 1)[:k] if len(cand) > k else np.arange(len(cand))
+        top = top[np.argsort(-score[top])]
+        return [(int(cand[j]), float(score[j])) for j in top]
@@ -0,0 +1,291 @@
+# server.py - headless multi-session HTTP server over handle_command (asyncio; replies stream as NDJSON)
+import sys, json, time, asyncio, argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from config import (SERVER_HOST, SERVER_PORT, SERVER_TOKEN, SERVER_MAX_CONCURRENCY, SERVER_MAX_QUEUE,
+                    SERVER_SESSION_QUEUE, SERVER_FAST_WORKERS, SERVER_LLM_WORKERS, SERVER_OCR_WORKERS,
+                    SERVER_SESSION_TTL, SERVER_MAX_BODY)
+import namespace
+from agents import route, handle_command_stream
+from spellfix import maybe_fix_query
+from tracing import record, summary
+
+# API
+#   POST   /v1/sessions/<id>/command  {"text": "..."}  -> chunked NDJSON: {"delta": "..."} ... {"done": true, "stats": {...}}
+#                                      ?stream=0         -> {"reply": "...", "stats": {...}}
+#   DELETE /v1/sessions/<id>                            -> releases the session's open stores (data stays on disk)
+#   GET    /v1/health, /v1/stats
+# Each session id is a namespace (see namespace.py): its own facts, history,
+# captures, OCR index and chat context. Commands of one session run in order.
+
+_STATUS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable"}
+OCR_INTENTS = {"capture", "read_text", "describe", "find_text"}
+_END = object()
+
+class _Session:
+    __slots__ = ("lock", "pending", "last_used")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.last_used = time.monotonic()
+
+class LyraServer:
+    """
+    Blocking work never runs on the event loop: each command is iterated on
+    one of three executors picked by its route (quick commands, LLM Q&A,
+    capture/OCR), so a slow generation can't hold up another session's
+    "remember". At most max_concurrency commands run at once; up to
+    max_queue more wait, and beyond that requests get 503 + Retry-After.
+    Streamed fragments are written with drain(), so a slow client pauses
+    its own generator instead of buffering.
+    """
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, token: str = SERVER_TOKEN,
+                 max_concurrency: int = SERVER_MAX_CONCURRENCY, max_queue: int = SERVER_MAX_QUEUE,
+                 session_queue: int = SERVER_SESSION_QUEUE, session_ttl: float = SERVER_SESSION_TTL):
+        self.host, self.port, self.token = host, port, token
+        self.max_queue = max_queue
+        self.session_queue = session_queue
+        self.session_ttl = session_ttl
+        self._max_concurrency = max_concurrency
+        self._slots = None
+        self._waiting = 0
+        self._running = 0
+        self._sessions = {}
+        self._pools = {"fast": ThreadPoolExecutor(SERVER_FAST_WORKERS, thread_name_prefix="srv-fast"),
+                       "llm": ThreadPoolExecutor(SERVER_LLM_WORKERS, thread_name_prefix="srv-llm"),
+                       "ocr": ThreadPoolExecutor(SERVER_OCR_WORKERS, thread_name_prefix="srv-ocr")}
+        self._server = self._janitor_task = None
+        self.counters = {"requests": 0, "commands": 0, "rejected": 0, "disconnects": 0, "errors": 0}
+
+    # ---- lifecycle ----
+    async def start(self):
+        self._slots = asyncio.Semaphore(self._max_concurrency)
+        self._server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._janitor_task = asyncio.get_running_loop().create_task(self._janitor())
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _janitor(self):
+        """Releases stores of sessions idle longer than session_ttl."""
+        while True:
+            await asyncio.sleep(min(60.0, self.session_ttl))
+            now = time.monotonic()
+            for sid, s in list(self._sessions.items()):
+                if not s.pending and not s.lock.locked() and now - s.last_used > self.session_ttl:
+                    del self._sessions[sid]
+                    await asyncio.get_running_loop().run_in_executor(self._pools["fast"], namespace.drop, sid)
+
+    # ---- HTTP ----
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), 30)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._send_json(writer, 400, {"error": "bad request line"}, close=True)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > SERVER_MAX_BODY:
+                    await self._send_json(writer, 413, {"error": "body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.counters["requests"] += 1
+                await self._dispatch(method, target, headers, body, writer)
+                if not keep:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body, writer):
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            return await self._send_json(writer, 401, {"error": "missing or wrong token"})
+        url = urlparse(target)
+        path = url.path.rstrip("/").split("/")[1:]          # ["v1", "sessions", "<id>", "command"]
+        if path == ["v1", "health"]:
+            return await self._send_json(writer, 200, {"ok": True, "sessions": len(self._sessions)})
+        if path == ["v1", "stats"]:
+            return await self._send_json(writer, 200, self.stats())
+        if len(path) < 3 or path[:2] != ["v1", "sessions"] or not namespace.valid_name(path[2]):
+            return await self._send_json(writer, 404, {"error": "not found"})
+        sid = path[2]
+        if len(path) == 3 and method == "DELETE":
+            s = self._sessions.pop(sid, None)
+            if s is not None:
+                async with s.lock:
+                    await asyncio.get_running_loop().run_in_executor(self._pools["fast"], namespace.drop, sid)
+            return await self._send_json(writer, 200, {"ok": True})
+        if len(path) != 4 or path[3] != "command":
+            return await self._send_json(writer, 404, {"error": "not found"})
+        if method != "POST":
+            return await self._send_json(writer, 405, {"error": "use POST"})
+        try:
+            text = str(json.loads(body or b"{}").get("text", "")).strip()
+        except (ValueError, AttributeError):
+            text = ""
+        if not text:
+            return await self._send_json(writer, 400, {"error": 'expected {"text": "..."}'})
+        stream = parse_qs(url.query).get("stream", ["1"])[0] != "0"
+        await self._command(sid, text, stream, writer)
+
+    async def _command(self, sid: str, text: str, stream: bool, writer):
+        s = self._sessions.get(sid)
+        if s is None:
+            s = self._sessions[sid] = _Session()
+        if s.pending >= self.session_queue:
+            self.counters["rejected"] += 1
+            return await self._send_json(writer, 429, {"error": "too many commands queued for this session"},
+                                         extra={"Retry-After": "1"})
+        if self._waiting >= self.max_queue:
+            self.counters["rejected"] += 1
+            return await self._send_json(writer, 503, {"error": "server busy"}, extra={"Retry-After": "1"})
+        t0 = time.perf_counter()
+        s.pending += 1
+        self._waiting += 1
+        queued = True
+        try:
+            async with s.lock, self._slots:
+                queued = False
+                self._waiting -= 1
+                s.pending -= 1
+                record("server.queue", time.perf_counter() - t0)
+                self._running += 1
+                try:
+                    await self._run(sid, text, stream, writer)
+                finally:
+                    self._running -= 1
+        finally:
+            if queued:                                  # cancelled while waiting
+                self._waiting -= 1
+                s.pending -= 1
+            s.last_used = time.monotonic()
+            record("server.command", time.perf_counter() - t0)
+
+    def _pool_for(self, text: str):
+        """Executor for text, classified as handle_command will see it (after the spell-fix)."""
+        intent, _ = route(maybe_fix_query(text))
+        if intent is None:
+            return self._pools["llm"]
+        return self._pools["ocr"] if intent.name in OCR_INTENTS else self._pools["fast"]
+
+    async def _run(self, sid: str, text: str, stream: bool, writer):
+        loop = asyncio.get_running_loop()
+        ctx = namespace.bound_context(sid)
+        pool = await loop.run_in_executor(self._pools["fast"], ctx.run, self._pool_for, text)
+        stats = {}
+        gen = ctx.run(handle_command_stream, text, stats)
+        self.counters["commands"] += 1
+        parts, started = [], False
+        try:
+            while True:
+                piece = await loop.run_in_executor(pool, ctx.run, next, gen, _END)
+                if piece is _END:
+                    break
+                if not stream:
+                    parts.append(piece)
+                    continue
+                if not started:
+                    writer.write(self._head(200, "application/x-ndjson", chunked=True))
+                    started = True
+                self._chunk(writer, {"delta": piece})
+                await writer.drain()
+        except ConnectionError:
+            self.counters["disconnects"] += 1
+            await loop.run_in_executor(pool, ctx.run, gen.close)    # stops the LLM/web workers
+            raise
+        except Exception as e:
+            self.counters["errors"] += 1
+            await loop.run_in_executor(pool, ctx.run, gen.close)
+            if started:
+                self._chunk(writer, {"error": str(e)})
+                writer.write(b"0\r\n\r\n")
+                return await writer.drain()
+            return await self._send_json(writer, 500, {"error": str(e)})
+        stats = {k: v for k, v in stats.items() if isinstance(v, (int, float, str)) or v is None}
+        if not stream:
+            return await self._send_json(writer, 200, {"reply": "".join(parts), "stats": stats})
+        if not started:
+            writer.write(self._head(200, "application/x-ndjson", chunked=True))
+        self._chunk(writer, {"done": True, "stats": stats})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: int, ctype: str, length: int | None = None, chunked: bool = False, extra=None) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_STATUS.get(status, 'Error')}", f"Content-Type: {ctype}"]
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        else:
+            lines.append(f"Content-Length: {length or 0}")
+        lines += [f"{k}: {v}" for k, v in (extra or {}).items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    @staticmethod
+    def _chunk(writer, obj: dict):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    async def _send_json(self, writer, status: int, obj: dict, extra=None, close: bool = False):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        extra = dict(extra or {})
+        if close:
+            extra["Connection"] = "close"
+        writer.write(self._head(status, "application/json", len(body), extra=extra) + body)
+        await writer.drain()
+
+    def stats(self) -> dict:
+        """Counters, queue state and the per-stage tracing summary (seconds)."""
+        from llm_adapter import client_stats
+        return {**self.counters, "sessions": len(self._sessions), "waiting": self._waiting,
+                "running": self._running, "llm": client_stats(), "stages": summary()}
+
+def serve(argv=None):
+    ap = argparse.ArgumentParser(description="Headless multi-session Lyra server.")
+    ap.add_argument("--host", default=SERVER_HOST)
+    ap.add_argument("--port", type=int, default=SERVER_PORT)
+    args = ap.parse_args(argv)
+
+    async def run():
+        srv = await LyraServer(args.host, args.port).start()
+        print(f"Lyra server on http://{srv.host}:{srv.port}  (POST /v1/sessions/<id>/command)", flush=True)
+        try:
+            await srv.serve_forever()
+        finally:
+            await srv.close()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    serve(sys.argv[1:])
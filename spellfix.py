@@ -1,30 +1,214 @@
-# spellfix.py - safe fuzzy command suggestion using rapidfuzz
-try:
-    from rapidfuzz import process as rf_process
-except Exception:
-    rf_process = None
+# spellfix.py - indexed command-prefix spell correction (BK-tree over a growable vocabulary)
+import threading
+
+_lev = None                 # rapidfuzz's Levenshtein, imported on the first distance computed
+_lev_checked = False
 
 COMMON_COMMANDS = [
     "remember", "what did i say about", "capture", "read text", "ocr", "describe",
-    "describe image", "history", "help", "exit", "quit"
+    "describe image", "history", "find text", "help", "exit", "quit"
 ]
+# commands followed by free-form arguments; the rest only match as the whole input
+COMMANDS_WITH_ARGS = {"remember", "what did i say about", "history", "find text"}
+# never the target of a correction: a typo must not end the session or wipe the conversation
+NOT_CORRECTABLE = {"exit", "quit"}
+
+MAX_FIRST_TOKEN_DIST = 2
+MIN_BARE_COMMAND_CHARS = 6      # commands without arguments: only 1-edit typos of inputs at least this long
+
+def _distance(a: str, b: str, cutoff: int) -> int:
+    """Levenshtein distance, or cutoff + 1 once it's known to exceed cutoff."""
+    global _lev, _lev_checked
+    if abs(len(a) - len(b)) > cutoff:
+        return cutoff + 1
+    if not _lev_checked:
+        _lev_checked = True
+        try:
+            from rapidfuzz.distance import Levenshtein as _lev
+        except Exception:
+            _lev = None
+    if _lev is not None:
+        return _lev.distance(a, b, score_cutoff=cutoff)
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > cutoff:
+            return cutoff + 1
+        prev = cur
+    return prev[-1] if prev[-1] <= cutoff else cutoff + 1
+
+def _allowed(n: int) -> int:
+    # typo budget grows with the length of what's being corrected
+    return 0 if n <= 3 else 1 if n <= 5 else 2 if n <= 12 else 3
+
+class BKTree:
+    """
+    Metric tree over words; lookups only visit subtrees that can be within
+    max_dist. Not thread-safe: _Vocabulary serializes add() and search().
+    """
+    def __init__(self):
+        self.root = None            # [word, {dist: child}]
+        self.size = 0
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = [word, {}]
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            d = _distance(word, node[0], 1 << 30)
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_dist: int):
+        """[(distance, word)] sorted by distance."""
+        out, stack = [], [self.root] if self.root else []
+        while stack:
+            w, children = stack.pop()
+            d = _distance(word, w, max_dist + 64)
+            if d <= max_dist:
+                out.append((d, w))
+            for k, child in children.items():
+                if d - max_dist <= k <= d + max_dist:
+                    stack.append(child)
+        out.sort()
+        return out
+
+class _Vocabulary:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tree = BKTree()
+        self.kinds = {}             # word -> set of kinds ("command", "fact", "capture", ...)
+        self.commands = {}          # command phrase -> takes args
+        self.fixed = set()          # command phrases that are never suggested as corrections
+        self.by_first = {}          # first word of a command -> [phrase, ...]
+        self.sources = {}           # kind -> callable returning words, loaded on first use
+        self.unindexed = []         # known words not yet in the tree (indexed on the next lookup)
+
+    def add_words(self, words, kind: str):
+        with self._lock:
+            for w in words:
+                w = w.lower().strip()
+                if not w:
+                    continue
+                if w not in self.kinds:
+                    self.unindexed.append(w)
+                    self.kinds[w] = set()
+                self.kinds[w].add(kind)
+
+    def add_command(self, phrase: str, takes_args: bool, correctable: bool = True):
+        phrase = " ".join(phrase.lower().split())
+        first = phrase.split(" ", 1)[0]
+        with self._lock:
+            self.commands[phrase] = takes_args
+            if correctable:
+                self.fixed.discard(phrase)
+            else:
+                self.fixed.add(phrase)
+            bucket = self.by_first.setdefault(first, [])
+            if phrase not in bucket:
+                bucket.append(phrase)
+        self.add_words([first], "command")
+
+    def prepare(self):
+        """Loads pending vocabulary sources and indexes new words; call before searching."""
+        if self.sources:
+            self.load_sources()
+        if self.unindexed:
+            with self._lock:
+                pending, self.unindexed = self.unindexed, []
+                for w in pending:
+                    self.tree.add(w)
+
+    def search(self, word: str, max_dist: int):
+        with self._lock:            # prepare() may be growing the tree on another thread
+            return self.tree.search(word, max_dist)
+
+    def load_sources(self):
+        with self._lock:
+            pending, self.sources = self.sources, {}
+        for kind, fn in pending.items():
+            try:
+                self.add_words((w for term in fn() for w in str(term).split()), kind)
+            except Exception:
+                pass
+
+_vocab = _Vocabulary()
+for _c in COMMON_COMMANDS:
+    _vocab.add_command(_c, _c in COMMANDS_WITH_ARGS, _c not in NOT_CORRECTABLE)
+
+def add_command(phrase: str, takes_args: bool = False, correctable: bool = True):
+    """Makes a (new) command phrase known; correctable=False keeps typos from turning into it."""
+    _vocab.add_command(phrase, takes_args, correctable)
+
+def add_vocabulary(terms, kind: str = "user"):
+    """Adds known words (fact keys, capture names, ...) so they're never 'corrected'."""
+    _vocab.add_words((w for term in terms for w in str(term).split()), kind)
+
+def add_vocabulary_source(kind: str, fn):
+    """fn() -> iterable of terms, read lazily on the next lookup."""
+    with _vocab._lock:
+        _vocab.sources[kind] = fn
+
+def suggest_word(word: str, max_dist: int | None = None, kind: str | None = None):
+    """Closest known vocabulary words as [(distance, word)]."""
+    _vocab.prepare()
+    word = word.lower()
+    max_dist = _allowed(len(word)) if max_dist is None else max_dist
+    hits = _vocab.search(word, max_dist)
+    return [(d, w) for d, w in hits if kind is None or kind in _vocab.kinds.get(w, ())]
 
 def suggest_command(user_text: str):
     """
-    Returns a suggested command string if there's a high-confidence match,
-    otherwise returns None. Handles the case where rapidfuzz isn't available.
+    Returns user_text with a misspelled command prefix corrected (arguments
+    kept as typed), or None if there's no confident correction.
+    Free-form text exits early: the first word must be within a couple of
+    edits of some command's first word, and known words never count as typos.
+    Commands without arguments need a single typo in a longer input ("state"
+    stays "state"), and non-correctable ones (reset, exit) are never suggested.
     """
-    if not rf_process or not user_text:
+    if not user_text:
         return None
-    result = rf_process.extractOne(user_text.lower(), COMMON_COMMANDS, score_cutoff=80)
-    if not result:
+    words = user_text.split()
+    low = [w.lower() for w in words]
+    first = low[0]
+    if len(first) > 24:
         return None
-    # result can be (choice, score, index)
-    try:
-        choice = result[0]
-        return choice
-    except Exception:
+    if first in _vocab.by_first:
+        # exact first word: only multi-word commands can still be misspelled
+        if " ".join(low) in _vocab.commands:
+            return None
+    else:
+        if _vocab.sources:
+            _vocab.load_sources()
+        if first in _vocab.kinds:
+            return None
+    _vocab.prepare()
+    best = None
+    for _, head in _vocab.search(first, MAX_FIRST_TOKEN_DIST):
+        for phrase in _vocab.by_first.get(head, ()):
+            n = phrase.count(" ") + 1
+            takes_args = _vocab.commands[phrase]
+            if phrase in _vocab.fixed or len(low) < n or (len(low) > n and not takes_args):
+                continue
+            typed = " ".join(low[:n])
+            cutoff = _allowed(len(phrase)) if takes_args else (1 if len(typed) >= MIN_BARE_COMMAND_CHARS else 0)
+            d = _distance(typed, phrase, cutoff)
+            if d <= cutoff and d > 0 and (best is None or d < best[0]):
+                best = (d, phrase, n)
+    if best is None:
         return None
+    _, phrase, n = best
+    return " ".join([phrase] + words[n:])
 
 def maybe_fix_query(user_text: str) -> str:
     suggestion = suggest_command(user_text)
@@ -0,0 +1,47 @@
+# tests/conftest.py - runs the suite against a throwaway data dir, with no model warm-up and no real audio
+import os, sys, tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.py reads these at import time, so they're set before any test imports the repo
+_tmp = tempfile.mkdtemp(prefix="lyra-tests-")
+os.environ.setdefault("LYRA_DATA_DIR", os.path.join(_tmp, "data"))
+os.environ.setdefault("LYRA_CAPTURES_DIR", os.path.join(_tmp, "captures"))
+os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:9")     # nothing listens there: the LLM is "offline"
+os.environ.setdefault("OLLAMA_WARMUP", "0")
+os.environ.setdefault("LLM_CACHE", "0")
+os.environ.setdefault("TTS_MODE", "fake")
+os.environ.setdefault("TTS_CACHE", "0")
+os.environ.setdefault("STARTUP_WARM", "0")
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    """fake_ollama(**kw) starts a bench.FakeOllama and points llm_adapter at it; it's stopped after the test."""
+    import llm_adapter
+    from bench import FakeOllama
+    started = []
+    def start(**kw):
+        fake = FakeOllama(**kw).start()
+        started.append(fake)
+        monkeypatch.setattr(llm_adapter, "OLLAMA_HOST", fake.url)
+        return fake
+    yield start
+    for fake in started:
+        fake.stop()
+
+@pytest.fixture
+def fake_search(monkeypatch):
+    """fake_search(**kw) starts a bench.FakeSearch and points web_search at it; it's stopped after the test."""
+    import web_search
+    from bench import FakeSearch
+    started = []
+    def start(**kw):
+        fake = FakeSearch(**kw).start()
+        started.append(fake)
+        monkeypatch.setattr(web_search, "SEARCH_URL", f"{fake.url}/html/")
+        return fake
+    yield start
+    for fake in started:
+        fake.stop()
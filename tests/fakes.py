@@ -0,0 +1,26 @@
+# tests/fakes.py - a throwaway local HTTP server for test-only stand-ins (pages, slow endpoints)
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class Handler(BaseHTTPRequestHandler):
+    """Keep-alive request handler; self.owner is whatever serve() was given."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status: int, body: bytes, ctype: str):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(handler, owner):
+    """Starts handler on a free localhost port; returns (server, base url). Call server.shutdown() when done."""
+    handler = type(handler.__name__, (handler,), {"owner": owner})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, addr: None     # clients hang up on cancelled requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,80 @@
+# tests/test_camera.py - CameraService ring buffer, warm-up, idle release and failure, with a fake video source
+import time
+import numpy as np
+from ocr_tools import CameraService, sharpness
+
+def _frame(contrast: int, seed: int):
+    """Random black/white edges scaled to contrast around mid-gray: sharpness grows with contrast."""
+    rnd = np.random.default_rng(seed)
+    return (128 - contrast // 2 + rnd.integers(0, 2, (120, 160, 3)) * contrast).astype(np.uint8)
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: plays frames, then repeats the last one like a live camera."""
+    def __init__(self, frames, opened=True):
+        self.frames, self.opened = frames, opened
+        self.pos = self.reads = 0
+        self.released = False
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        self.reads += 1
+        self.pos += 1
+        return True, self.frames[min(self.pos, len(self.frames)) - 1]
+
+    def set(self, prop, value):
+        self.pos = int(value)
+        return True
+
+    def release(self):
+        self.released = True
+
+class Opener:
+    def __init__(self, frames, opened=True):
+        self.frames, self.opened, self.caps = frames, opened, []
+
+    def __call__(self, source):
+        self.caps.append(FakeCapture(self.frames, self.opened))
+        return self.caps[-1]
+
+def test_best_frame_is_sharpest_and_skips_warmup():
+    warmup = [_frame(250, 100 + i) for i in range(2)]      # the sharpest, but still adjusting exposure
+    frames = warmup + [_frame(4, i) for i in range(4)] + [_frame(120, 7)] + [_frame(4, 10 + i) for i in range(3)]
+    opener = Opener(frames)
+    cam = CameraService(source="0", buffer_frames=16, warmup_frames=2, idle_timeout=5, fps=50, opener=opener)
+    try:
+        cam.start()
+        deadline = time.monotonic() + 2
+        while (not opener.caps or opener.caps[0].reads <= len(frames)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        best = cam.best_frame(timeout=2)
+        assert best is not None
+        assert np.array_equal(best, frames[6])
+        assert best is not frames[6]            # a copy: callers may draw on it
+        assert sharpness(best) > sharpness(frames[2])
+        assert len(opener.caps) == 1
+    finally:
+        cam.stop()
+    assert opener.caps[0].released
+
+def test_device_is_released_when_idle_and_reopened():
+    opener = Opener([_frame(60, i) for i in range(5)])
+    cam = CameraService(source="0", buffer_frames=4, warmup_frames=0, idle_timeout=0.3, fps=50, opener=opener)
+    assert cam.best_frame(timeout=2) is not None
+    assert cam.running
+    time.sleep(0.8)
+    assert not cam.running and opener.caps[0].released
+    assert cam.best_frame(timeout=2) is not None            # next capture reopens the device
+    assert len(opener.caps) == 2
+    cam.stop()
+
+def test_unopenable_device_fails_fast():
+    opener = Opener([], opened=False)
+    cam = CameraService(source="0", warmup_frames=0, idle_timeout=5, fps=30, opener=opener)
+    t0 = time.perf_counter()
+    assert cam.best_frame(timeout=3) is None
+    assert time.perf_counter() - t0 < 1.0
+    assert cam.failed and opener.caps[0].released
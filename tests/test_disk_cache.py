@@ -0,0 +1,74 @@
+# tests/test_disk_cache.py - TTL, LRU eviction, batched hit writes, and the LLM response cache
+import time
+import pytest
+import llm_adapter
+from disk_cache import DiskCache
+
+def _cache(tmp_path, **kw):
+    return DiskCache(str(tmp_path / "cache.db"), **kw)
+
+def test_entries_expire_after_ttl(tmp_path):
+    c = _cache(tmp_path, ttl=0.05)
+    c.put("k", "v")
+    assert c.get("k") == "v"
+    time.sleep(0.1)
+    assert c.get("k") is None
+    assert c.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    c = _cache(tmp_path, max_entries=3, mem_entries=0)
+    for k in "abc":
+        c.put(k, k)
+        time.sleep(0.002)
+    assert c.get("a") == "a"            # a is now newer than b and c
+    c.put("d", "d")
+    assert c.get("b") is None
+    assert [c.get(k) for k in "acd"] == ["a", "c", "d"]
+    assert c.stats()["entries"] == 3
+
+def test_byte_cap_evicts_oldest(tmp_path):
+    c = _cache(tmp_path, max_bytes=10, mem_entries=0)
+    c.put("x", b"1234")
+    time.sleep(0.002)
+    c.put("y", b"5678")
+    time.sleep(0.002)
+    c.get("x")
+    c.put("z", "9abc")
+    assert c.get("y") is None and c.get("x") == b"1234"
+    assert c.stats()["bytes"] <= 10
+
+def test_hits_write_recency_in_batches(tmp_path):
+    c = _cache(tmp_path, touch_batch=4)
+    for k in "abcd":
+        c.put(k, k)
+    updates = []
+    c._db().set_trace_callback(lambda sql: sql.startswith("UPDATE") and updates.append(sql))
+    for k in "abca":
+        assert c.get(k) == k
+    assert updates == []                # three distinct keys touched so far
+    c.get("d")
+    assert len(updates) == 4            # one batch: a row per touched key
+    c.get("b")
+    c.flush()
+    assert len(updates) == 5
+
+@pytest.fixture
+def llm_cache(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    monkeypatch.setattr(llm_adapter, "_cache", cache)
+    monkeypatch.setattr(llm_adapter, "LLM_CACHE_ENABLED", True)
+    return cache
+
+def test_errors_are_never_cached(llm_cache, monkeypatch):
+    monkeypatch.setattr(llm_adapter, "OLLAMA_HOST", "http://127.0.0.1:9")
+    assert llm_adapter.chat("is anyone there", timeout=2).startswith("(LLM offline/error)")
+    assert llm_cache.stats()["entries"] == 0
+
+def test_answers_are_cached_unless_bypassed(llm_cache, fake_ollama):
+    fake = fake_ollama(ttft=0.01, tokens_per_second=1000, reply_tokens=5)
+    first = llm_adapter.chat("name a color")
+    n = fake.requests
+    assert llm_adapter.chat("name a color") == first and fake.requests == n
+    assert llm_adapter.chat("name a color", use_cache=False) == first and fake.requests == n + 1
+    llm_adapter.chat("name a shape", use_cache=False)
+    assert llm_cache.stats()["entries"] == 1
@@ -0,0 +1,62 @@
+# tests/test_hedged_answer.py - LLM-vs-web hedging against local stand-ins for Ollama and the search engine
+import time, threading
+import pytest
+import agents, llm_adapter
+
+@pytest.fixture
+def search(fake_search):
+    return fake_search(serp_latency=0.01, page_latency=0.01)
+
+@pytest.fixture
+def ollama(fake_ollama, monkeypatch):
+    # /api/tags as slow as the old blocking check's timeout
+    fake = fake_ollama(ttft=0.05, tokens_per_second=500, reply_tokens=20, health_latency=1.5)
+    monkeypatch.setitem(llm_adapter._health, "ok", None)       # never checked
+    return fake
+
+def _answer(question, **kw):
+    stats = {}
+    text = "".join(agents._hedged_answer(question, stats, **kw))
+    return text, stats
+
+def test_llm_answers_without_waiting_for_a_health_check(ollama, search):
+    text, stats = _answer("why is the sky blue", delay=3.0, deadline=10)
+    assert stats["winner"] == "llm"
+    assert text.split() == "".join(ollama.reply("why is the sky blue")).split()
+    assert stats["answer_time"] < 1.0
+
+def test_failing_llm_falls_back_to_web(ollama, search):
+    text, stats = _answer("[web] harbor lantern", delay=3.0, deadline=10)
+    assert stats["winner"] == "web"
+    assert search.requests and text        # the page summary, written by the (non-streaming) model call
+    assert stats["answer_time"] < 1.5
+
+def test_known_down_goes_straight_to_web(monkeypatch, search):
+    monkeypatch.setitem(llm_adapter._health, "ok", False)
+    monkeypatch.setitem(llm_adapter._health, "checked", time.monotonic())
+    text, stats = _answer("quartz meadow", delay=3.0, deadline=10)
+    assert stats["winner"] == "web"
+    assert stats["answer_time"] < 1.0
+
+def test_stream_failing_after_the_llm_won_ends_the_answer(monkeypatch):
+    def broken_stream(*a, **kw):
+        yield "The tide turns "
+        raise RuntimeError("connection reset")
+    monkeypatch.setattr(agents, "chat_stream", broken_stream)
+    monkeypatch.setattr(agents, "known_available", lambda *a, **kw: True)
+    out = {}
+    worker = threading.Thread(target=lambda: out.update(zip(("text", "stats"), _answer("tides", delay=3.0, deadline=10))),
+                              daemon=True)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive(), "answer loop hung after the stream failed"
+    assert out["stats"]["winner"] == "llm"
+    assert out["text"] == "The tide turns "
+    assert "connection reset" in out["stats"]["llm_error"]
+
+def test_web_win_makes_the_next_turn_replay_the_transcript(ollama, search):
+    session = agents._sessions.get()
+    session.context, started = [7, 7, 7], session.started
+    text, stats = _answer("[web] copper kettle", delay=3.0, deadline=10)
+    assert stats["winner"] == "web"
+    assert session.context is None and session.started == started      # not a reset: earlier turns still replay
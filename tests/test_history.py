@@ -0,0 +1,75 @@
+# tests/test_history.py - segmented event log: rotation, pruning, tail reads, filters, legacy migration
+import os, json, datetime
+import pytest
+import history
+from history import _EventLog, migrate_legacy_history
+
+T0 = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+def _ev(i, ev_type="chat"):
+    return {"time": (T0 + datetime.timedelta(minutes=i)).isoformat(), "type": ev_type, "detail": f"event {i}"}
+
+@pytest.fixture
+def small(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_SEGMENT_EVENTS", 10)
+    monkeypatch.setattr(history, "HISTORY_MAX_SEGMENTS", 3)
+    monkeypatch.setattr(history, "HISTORY_TAIL_SIZE", 5)
+
+def test_rotation_and_pruning(tmp_path, small):
+    log = _EventLog(str(tmp_path))
+    for i in range(45):
+        log.append(_ev(i))
+    segs = log._segments()
+    assert [os.path.basename(p) for p in segs] == ["events-000003.jsonl", "events-000004.jsonl", "events-000005.jsonl"]
+    assert [len(history._read_segment(p)) for p in segs] == [10, 10, 5]
+    assert [e["detail"] for e in log.query()] == [f"event {i}" for i in range(20, 45)]
+    log.close()
+    again = _EventLog(str(tmp_path))                # reopening continues the newest segment
+    again.append(_ev(45))
+    assert len(again._segments()) == 3 and len(history._read_segment(again._segments()[-1])) == 6
+    again.close()
+
+def test_tail_is_served_from_memory(tmp_path, small, monkeypatch):
+    log = _EventLog(str(tmp_path))
+    for i in range(12):
+        log.append(_ev(i))
+    scans = []
+    real_query = log.query
+    monkeypatch.setattr(log, "query", lambda **kw: scans.append(kw) or real_query(**kw))
+    assert [e["detail"] for e in log.tail(3)] == ["event 9", "event 10", "event 11"]
+    assert not scans
+    assert [e["detail"] for e in log.tail(8)] == [f"event {i}" for i in range(4, 12)]
+    assert scans == [{"limit": 8}]
+    log.close()
+
+def test_find_filters(tmp_path, small):
+    log = _EventLog(str(tmp_path))
+    for i in range(30):
+        log.append(_ev(i, "chat" if i % 3 else "capture"))
+    caps = log.query(ev_type="capture")
+    assert [e["detail"] for e in caps] == [f"event {i}" for i in range(0, 30, 3)]
+    both = log.query(ev_type=["chat", "capture"], since=T0 + datetime.timedelta(minutes=25))
+    assert [e["detail"] for e in both] == [f"event {i}" for i in range(25, 30)]
+    window = log.query(since=(T0 + datetime.timedelta(minutes=5)).isoformat(),
+                       until=(T0 + datetime.timedelta(minutes=7)).replace(tzinfo=None))     # naive = UTC
+    assert [e["detail"] for e in window] == ["event 5", "event 6", "event 7"]
+    assert [e["detail"] for e in log.query(ev_type="chat", limit=2)] == ["event 28", "event 29"]
+    log.close()
+
+def test_migrate_legacy_history(tmp_path, small):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps({"events": [_ev(i) for i in range(23)]}), encoding="utf-8")
+    directory = str(tmp_path / "history")
+    log = _EventLog(directory, legacy_file=str(legacy))
+    assert [e["detail"] for e in log.tail(2)] == ["event 21", "event 22"]
+    assert not legacy.exists() and (tmp_path / "history.json.migrated").exists()
+    assert len(log._segments()) == 3
+    log.append(_ev(23))
+    assert len(log.query()) == 24
+    log.close()
+    assert migrate_legacy_history(str(legacy), directory) == 0          # only once
+
+def test_history_command_with_huge_range():
+    from agents import handle_command
+    reply = handle_command("history last 99999999 days")
+    assert isinstance(reply, str) and reply
@@ -0,0 +1,60 @@
+# tests/test_html_extract.py - visible-text extraction on both parser backends
+import threading
+import pytest
+from html_extract import extract_text
+
+def _backends():
+    out = ["html.parser"]
+    try:
+        import lxml.html  # noqa: F401
+        out.append("lxml")
+    except ImportError:
+        pass
+    return out
+
+@pytest.fixture(params=_backends())
+def backend(request):
+    return request.param
+
+def _chunks(html: str, size: int = 7):
+    data = html.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]      # tags split across chunks
+
+def test_body_text_without_scripts_or_chrome(backend):
+    html = ("<html><head><title>Page</title><style>p{}</style></head><body><nav>Home | About</nav>"
+            "<article><header><h1>Headline</h1></header><p>First &amp; second.</p><script>var x=1</script>"
+            "<p>Café au lait.</p></article><footer>(c) 2026</footer></body></html>")
+    assert extract_text(_chunks(html), backend=backend) == "Headline First & second. Café au lait."
+
+def test_missing_head_end_tag_keeps_body(backend):
+    html = "<html><head><title>Page</title><meta charset='utf-8'><body><p>The body text.</p></body></html>"
+    assert extract_text(_chunks(html), backend=backend) == "The body text."
+
+def test_no_body_tag_either(backend):
+    html = "<head><title>Page</title><link rel=stylesheet href=a.css><p>Implied body.</p>"
+    assert extract_text(_chunks(html), backend=backend) == "Implied body."
+
+def test_limits(backend):
+    html = "<body>" + "<p>word word word word</p>" * 2000 + "</body>"
+    assert len(extract_text(_chunks(html, 4096), limit=100, backend=backend)) == 100
+    short = extract_text(_chunks(html, 4096), max_bytes=200, backend=backend)
+    assert 0 < len(short) < 200
+
+def test_cancel_returns_nothing(backend):
+    cancel = threading.Event()
+    cancel.set()
+    assert extract_text(_chunks("<p>text</p>"), backend=backend, cancel=cancel) == ""
+
+def test_text_keeps_document_order(backend):
+    html = "<body><p>one<b>two</b>three<i>four<u>five</u></i>six</p>seven<div>eight</div></body>"
+    assert extract_text(_chunks(html), backend=backend) == "one two three four five six seven eight"
+
+def test_stops_reading_once_the_limit_is_met(backend):
+    chunks = _chunks("<body>" + "<p>word word word word</p>" * 20000 + "</body>", 4096)
+    read = []
+    def stream():
+        for c in chunks:
+            read.append(c)
+            yield c
+    assert len(extract_text(stream(), limit=100, backend=backend)) == 100
+    assert len(read) <= 2
@@ -0,0 +1,96 @@
+# tests/test_llm_adapter.py - Ollama client against a local stand-in server
+import time, threading
+import pytest
+import llm_adapter
+
+@pytest.fixture
+def slow_ollama(fake_ollama):
+    return fake_ollama(ttft=0.05, tokens_per_second=0.5, reply_tokens=5)
+
+def test_cancel_aborts_a_blocked_read_and_frees_the_slot(slow_ollama):
+    cancel = threading.Event()
+    stream = llm_adapter.chat_stream("tell me a story", use_cache=False, cancel=cancel)
+    first = next(stream)
+    assert first and not first.startswith("(LLM")
+    threading.Timer(0.1, cancel.set).start()
+    t0 = time.monotonic()
+    rest = list(stream)                 # the next token is ~2 s away
+    assert time.monotonic() - t0 < 1.0
+    assert rest == []                   # no "(LLM offline/error)" for a cancelled stream
+    assert llm_adapter.client_stats()["in_flight"] == 0
+
+class _StubHTTP:
+    """Stands in for the pooled requests.Session: records payloads, answers with a growing context."""
+    def __init__(self):
+        self.payloads = []
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.payloads.append(json)
+        n = len(self.payloads)
+        body = {"response": f"answer {n}", "done": True, "context": list(range(n * 10)),
+                "prompt_eval_count": 5, "eval_count": 3}
+        return type("R", (), {"raise_for_status": lambda self: None, "json": lambda self: body})()
+
+@pytest.fixture
+def http(monkeypatch):
+    stub = _StubHTTP()
+    monkeypatch.setattr(llm_adapter, "_get_session", lambda: stub)
+    return stub
+
+def test_session_carries_context_between_turns(http):
+    s = llm_adapter.ChatSession(system="be brief")
+    assert llm_adapter.chat("first question", session=s) == "answer 1"
+    assert http.payloads[0]["system"] == "be brief" and "context" not in http.payloads[0]
+    llm_adapter.chat("second question", session=s)
+    second = http.payloads[1]
+    assert second["context"] == list(range(10))
+    assert second["prompt"] == "second question" and "system" not in second
+    assert s.turns == 2 and s.last_eval == {"prompt_eval_count": 5, "eval_count": 3}
+
+def test_context_past_max_tokens_is_dropped(http):
+    s = llm_adapter.ChatSession(max_tokens=15)
+    llm_adapter.chat("one", session=s)
+    llm_adapter.chat("two", session=s)          # returns a 20-token context
+    assert s.context is None
+    llm_adapter.chat("three", session=s)
+    assert "context" not in http.payloads[2]
+
+def test_reset_starts_over_and_hides_older_turns(http):
+    seen_since = []
+    def window(budget, since):
+        seen_since.append(since)
+        return [("old question", "old answer")]
+    s = llm_adapter.ChatSession(window=window)
+    llm_adapter.chat("one", session=s)
+    s.reset()
+    assert s.context is None and s.turns == 0
+    llm_adapter.chat("two", session=s)
+    assert "context" not in http.payloads[1]
+    assert seen_since[-1] == s.started          # replay never reaches back past the reset
+
+def test_idle_session_forgets_its_context(http):
+    s = llm_adapter.ChatSession(idle_ttl=0.05)
+    llm_adapter.chat("one", session=s)
+    time.sleep(0.1)
+    llm_adapter.chat("two", session=s)
+    assert "context" not in http.payloads[1]
+    assert s.turns == 1                         # counting restarted with the idle reset
+
+def test_replayed_transcript_keeps_the_newest_turns_within_budget(http):
+    turns = [(f"question {i} " + "x" * 40, f"reply {i} " + "y" * 40) for i in range(30)]
+    s = llm_adapter.ChatSession(window=lambda budget, since: turns, window_tokens=100)
+    llm_adapter.chat("latest", session=s)
+    prompt = http.payloads[0]["prompt"]
+    assert prompt.startswith("Earlier in this conversation:\n") and prompt.endswith("latest")
+    kept = [i for i in range(30) if f"question {i} " in prompt]
+    assert kept and kept == list(range(30 - len(kept), 30))     # a suffix of the history
+    assert llm_adapter._estimate_tokens(prompt) <= 100 + 10
+
+def test_recent_turns_reads_a_budgeted_tail_of_the_history():
+    import agents, namespace
+    with namespace.use("recent_turns"):
+        for i in range(10):
+            agents._log_turn(f"q{i}", f"a{i}")
+        assert agents._recent_turns(64, None) == [("q8", "a8"), ("q9", "a9")]      # 64 tokens -> 4 events
+        assert len(agents._recent_turns(16 * 40, None)) == 10
+    namespace.drop("recent_turns")
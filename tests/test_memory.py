@@ -0,0 +1,22 @@
+# tests/test_memory.py - fact store cache: bounded misses, writes visible after a cached miss
+from memory import _FactStore, MAX_CACHED_MISSES
+
+def test_misses_are_bounded_and_forgotten_on_write(tmp_path):
+    store = _FactStore(str(tmp_path / "memory.db"))
+    for i in range(MAX_CACHED_MISSES * 3):
+        assert store.get_fact(f"nothing {i}") is None
+    assert len(store._misses) == MAX_CACHED_MISSES
+    assert store.get_fact("wifi") is None
+    store.put_facts([("wifi", "hunter2", "2026-01-01T00:00:00+00:00")])
+    assert store.get_fact("wifi")["value"] == "hunter2"
+    assert "wifi" not in store._misses
+    store.close()
+
+def test_hit_survives_reopen(tmp_path):
+    path = str(tmp_path / "memory.db")
+    store = _FactStore(path)
+    store.put_facts([("door code", "1234", "2026-01-01T00:00:00+00:00")])
+    store.close()
+    again = _FactStore(path)
+    assert again.get_fact("door code") == {"value": "1234", "time": "2026-01-01T00:00:00+00:00"}
+    again.close()
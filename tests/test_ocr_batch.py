@@ -0,0 +1,52 @@
+# tests/test_ocr_batch.py - batch OCR with a stand-in worker (no tesseract): resume, retry, JSONL, index
+import os, json
+import agents, ocr_batch
+
+def fake_ocr(path, lang, psm, pipeline):
+    """Module level so the process pool can pickle it: the "image" is a text file, FAIL makes it an error."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith("FAIL"):
+        return {"path": path, "error": "unreadable image", "seconds": 0.0}
+    return {"path": path, "text": text, "conf": 90.0, "regions": 1, "seconds": 0.0}
+
+def _run(folder, out, **kw):
+    return list(ocr_batch.batch_ocr(os.path.join(folder, "*"), out_path=str(out), workers=2,
+                                    worker_fn=fake_ocr, **kw))
+
+def _write(folder, name, text):
+    with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+        f.write(text)
+
+def test_jsonl_rows_resume_and_retry(tmp_path):
+    shots, out = tmp_path / "shots", tmp_path / "ocr.jsonl"
+    shots.mkdir()
+    _write(shots, "a.png", "invoice from the copperfield bakery")
+    _write(shots, "b.png", "parking permit zone seven")
+    _write(shots, "c.png", "FAIL")
+    _write(shots, "notes.txt", "not an image")
+
+    first = _run(shots, out)
+    assert sorted(os.path.basename(r["path"]) for r in first) == ["a.png", "b.png", "c.png"]
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert {os.path.basename(r["path"]): ("error" in r) for r in rows} == {"a.png": False, "b.png": False, "c.png": True}
+
+    # nothing changed: indexed files are skipped, the failed one is tried again
+    again = _run(shots, out)
+    assert [os.path.basename(r["path"]) for r in again] == ["c.png"]
+
+    _write(shots, "c.png", "library card renewal")
+    retried = _run(shots, out)
+    assert [(os.path.basename(r["path"]), "error" in r) for r in retried] == [("c.png", False)]
+    assert _run(shots, out) == []
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 5     # appended, never rewritten
+
+    assert len(_run(shots, out, resume=False)) == 3
+
+def test_find_text_hits_batch_results(tmp_path):
+    shots = tmp_path / "shots"
+    shots.mkdir()
+    _write(shots, "receipt.png", "one loaf of marzipan bread")
+    _run(shots, tmp_path / "ocr.jsonl")
+    reply = agents.handle_command("find text marzipan")
+    assert "receipt.png" in reply and "marzipan" in reply
@@ -0,0 +1,32 @@
+# tests/test_ocr_cache.py - concurrent OCR of one image runs once, is cached, and leaves no per-image state behind
+import time, threading
+import numpy as np
+from PIL import Image
+import ocr_tools
+
+def test_concurrent_ocr_runs_once_and_cleans_up(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_tesseract(path, lang, psm, pipeline="single"):
+        calls.append(path)
+        time.sleep(0.2)
+        return "hello world"
+
+    monkeypatch.setattr(ocr_tools, "_run_tesseract", fake_tesseract)
+    paths = []
+    for i in range(3):
+        p = str(tmp_path / f"img{i}.png")
+        Image.fromarray(np.full((20, 20), i * 50, np.uint8)).save(p)
+        paths.append(p)
+    results = []
+    threads = [threading.Thread(target=lambda p=p: results.append(ocr_tools.ocr_image(p, pipeline="single")))
+               for p in paths for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["hello world"] * 12
+    assert sorted(calls) == sorted(paths)           # one tesseract run per image
+    assert ocr_tools._ocr_inflight == {}
+    assert ocr_tools.ocr_image(paths[0], pipeline="single") == "hello world"
+    assert len(calls) == 3
@@ -0,0 +1,41 @@
+# tests/test_recall_index.py - fuzzy fact recall scores the same with and without NumPy
+import pytest
+import recall_index
+from recall_index import RecallIndex
+
+FACTS = [("wifi password", "hunter2"), ("door code", "1234"), ("mom's birthday", "march 3"),
+         ("car parking spot", "level 2 row f"), ("wifi name", "lyra-home"), ("dentist phone", "555 0199"),
+         ("passport number", "x1234567"), ("gym locker", "combination 12 34 56")]
+QUERIES = ["wifi", "the wi-fi password", "dor code", "birthday of mom", "where did i park", "passport", "zebra"]
+
+def _build():
+    idx = RecallIndex()
+    for k, v in FACTS:
+        idx.add(k, v)
+    return idx
+
+@pytest.fixture
+def both(monkeypatch):
+    pytest.importorskip("numpy")
+    fast = _build()
+    with monkeypatch.context() as m:
+        m.setattr(recall_index, "np", None)
+        slow = _build()
+    assert fast.vectorized and not slow.vectorized
+    return fast, slow
+
+def test_numpy_and_pure_python_agree(both):
+    fast, slow = both
+    for q in QUERIES:
+        a, b = fast.search(q, k=len(FACTS)), slow.search(q, k=len(FACTS))
+        assert [k for k, _, _ in a] == [k for k, _, _ in b], q
+        for (_, _, sa), (_, _, sb) in zip(a, b):
+            assert sa == pytest.approx(sb, abs=1e-3), q
+
+def test_best_match_and_replacement(both):
+    for idx in both:
+        assert idx.search("dor code", k=1)[0][:2] == ("door code", "1234")
+        assert idx.search("zebra", min_score=0.2) == []
+        idx.add("door code", "9876")
+        assert len(idx) == len(FACTS)
+        assert idx.search("door code", k=1)[0][1] == "9876"
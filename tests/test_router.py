@@ -0,0 +1,50 @@
+# tests/test_router.py - the command registry: exact, prefix and pattern dispatch
+import pytest
+import agents
+from agents import route, register_command, unregister_command
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registrations made in a test are undone afterwards."""
+    for name in ("_intents", "_exact_routes", "_prefix_routes", "_pattern_routes"):
+        saved = getattr(agents, name)
+        copy = {k: list(v) if isinstance(v, list) else v for k, v in saved.items()} if isinstance(saved, dict) else list(saved)
+        monkeypatch.setattr(agents, name, copy)
+
+def _name(text):
+    intent, _ = route(text)
+    return intent.name if intent else None
+
+def test_builtin_dispatch(registry):
+    assert _name("read text") == "read_text"
+    assert _name("READ TEXT") == "read_text"
+    intent, m = route("remember wifi password as hunter2")
+    assert intent.name == "remember" and m.groups() == ("wifi password", "hunter2")
+    assert _name("history last 3 days") == "history"
+    assert _name("why is the sky blue") is None
+    assert route("") == (None, None)
+
+def test_prefix_bucket_splits_on_any_whitespace(registry):
+    intent, m = route("remember\twifi as x")
+    assert intent.name == "remember" and m.groups() == ("wifi", "x")
+
+def test_patterns_without_prefix_and_registration_order(registry):
+    register_command("weather", lambda t, m: "sunny", pattern=r"^(?:weather|forecast)\b(.*)$")
+    register_command("forecast", lambda t, m: "rain", pattern=r"^forecast\b(.*)$")
+    assert _name("forecast tomorrow") == "weather"          # first registered wins
+    register_command("tide", lambda t, m: "low", pattern=r"^tide (\w+)$", prefix="tide")
+    register_command("tide_all", lambda t, m: "all", pattern=r"^tide.*$", prefix="tide")
+    assert _name("tide today") == "tide" and _name("tide") == "tide_all"
+
+def test_reregister_replaces_and_unregister_removes(registry):
+    register_command("ping", lambda t, m: "pong", exact=("ping",), correctable=False)
+    assert agents._handle_builtin("ping") == "pong"
+    register_command("ping", lambda t, m: "PONG", exact=("ping",), correctable=False)
+    assert agents._handle_builtin("ping") == "PONG"
+    register_command("echo", lambda t, m: m.group(1), pattern=r"^echo (.+)$", prefix="echo")
+    assert agents._handle_builtin("echo hi there") == "hi there"
+    unregister_command("ping")
+    unregister_command("echo")
+    assert route("ping") == (None, None) and route("echo hi") == (None, None)
+    assert "echo" not in agents._prefix_routes or agents._prefix_routes["echo"] == []
+    unregister_command("never registered")
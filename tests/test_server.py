@@ -0,0 +1,135 @@
+# tests/test_server.py - LyraServer on an ephemeral port: sessions, streaming, backpressure, cleanup
+import json, time, asyncio, threading, http.client
+import pytest
+import server, memory
+
+class _Running:
+    """A LyraServer on 127.0.0.1:<free port>, its event loop on a background thread."""
+    def __init__(self, **kw):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.srv = self.loop.run_until_complete(server.LyraServer("127.0.0.1", 0, token="", **kw).start())
+            ready.set()
+            self.loop.run_forever()
+        threading.Thread(target=run, daemon=True).start()
+        assert ready.wait(5)
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.srv.port, timeout=10)
+        conn.request(method, path, body=json.dumps(body) if body is not None else None)
+        r = conn.getresponse()
+        return r.status, r.getheader("Transfer-Encoding"), r.read().decode()
+
+    def command(self, sid, text, stream=True):
+        path = f"/v1/sessions/{sid}/command" + ("" if stream else "?stream=0")
+        status, te, body = self.request("POST", path, {"text": text})
+        if status == 200 and stream:
+            return status, te, [json.loads(line) for line in body.splitlines()]
+        return status, te, json.loads(body)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.srv.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+def _until(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def gate(monkeypatch):
+    """'block' commands wait for the gate, 'count N' streams N pieces; the rest run for real."""
+    gate = threading.Event()
+    real = server.handle_command_stream
+    def fake(text, stats=None):
+        if text == "block":
+            gate.wait(10)
+            yield "unblocked"
+        elif text.startswith("count "):
+            for i in range(int(text.split()[1])):
+                yield f"{i} "
+        else:
+            yield from real(text, stats)
+    monkeypatch.setattr(server, "handle_command_stream", fake)
+    yield gate
+    gate.set()
+
+@pytest.fixture
+def srv(gate):
+    running = _Running(max_concurrency=1, max_queue=1, session_queue=1)
+    yield running
+    gate.set()
+    running.stop()
+
+def test_sessions_are_isolated(srv):
+    assert srv.command("alice", "remember locker code as 4312", stream=False)[0] == 200
+    assert srv.command("bob", "remember locker code as 9876", stream=False)[0] == 200
+    assert "4312" in srv.command("alice", "what did i say about locker code", stream=False)[2]["reply"]
+    bob = srv.command("bob", "what did i say about locker code", stream=False)[2]["reply"]
+    assert "9876" in bob and "4312" not in bob
+
+def test_streams_chunks_unless_stream_is_off(srv):
+    status, te, lines = srv.command("s1", "count 3")
+    assert status == 200 and te == "chunked"
+    assert [l["delta"] for l in lines[:-1]] == ["0 ", "1 ", "2 "]
+    assert lines[-1]["done"] is True
+    status, te, reply = srv.command("s1", "count 3", stream=False)
+    assert status == 200 and te is None
+    assert reply["reply"] == "0 1 2 "
+
+def _in_background(fn, *args):
+    out = {}
+    t = threading.Thread(target=lambda: out.setdefault("r", fn(*args)), daemon=True)
+    t.start()
+    return t, out
+
+def test_429_while_a_session_already_has_a_command_queued(srv, gate):
+    first, _ = _in_background(srv.command, "busy", "block")
+    _until(lambda: srv.srv._running == 1)
+    second, out = _in_background(srv.command, "busy", "count 1")
+    _until(lambda: srv.srv._sessions["busy"].pending == 1)
+    status, _, body = srv.command("busy", "count 1")
+    assert status == 429 and "queued" in body["error"]
+    gate.set()
+    first.join(5), second.join(5)
+    assert out["r"][0] == 200
+    assert srv.srv.counters["rejected"] == 1
+
+def test_503_when_the_server_queue_is_full(srv, gate):
+    first, _ = _in_background(srv.command, "one", "block")
+    _until(lambda: srv.srv._running == 1)
+    second, out = _in_background(srv.command, "two", "count 1")
+    _until(lambda: srv.srv._waiting == 1)
+    status, _, body = srv.command("three", "count 1")
+    assert status == 503 and body["error"] == "server busy"
+    gate.set()
+    first.join(5), second.join(5)
+    assert out["r"][0] == 200
+
+def test_delete_drops_the_namespace(srv):
+    srv.command("gone", "remember door as blue", stream=False)
+    assert memory._stores.peek("gone") is not None
+    assert srv.request("DELETE", "/v1/sessions/gone")[0] == 200
+    assert memory._stores.peek("gone") is None
+    assert json.loads(srv.request("GET", "/v1/health")[2])["sessions"] == 0
+    # the data stays on disk: a new command reopens it
+    assert "blue" in srv.command("gone", "what did i say about door", stream=False)[2]["reply"]
+
+def test_janitor_drops_idle_sessions(gate):
+    running = _Running(session_ttl=0.2)
+    try:
+        running.command("idle", "remember hat as red", stream=False)
+        assert memory._stores.peek("idle") is not None
+        _until(lambda: memory._stores.peek("idle") is None)
+        assert "idle" not in running.srv._sessions
+    finally:
+        running.stop()
+
+def test_pool_is_picked_after_the_spell_fix(srv):
+    pools = srv.srv._pools
+    assert srv.srv._pool_for("captur") is pools["ocr"]
+    assert srv.srv._pool_for("remember wifi as x") is pools["fast"]
+    assert srv.srv._pool_for("why is the sky blue") is pools["llm"]
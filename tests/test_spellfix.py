@@ -0,0 +1,47 @@
+# tests/test_spellfix.py - command typo correction and concurrent vocabulary growth
+import threading
+import pytest
+import agents                   # registers the assistant's commands with the spell-fixer
+from spellfix import maybe_fix_query, add_vocabulary, suggest_word
+
+@pytest.mark.parametrize("typed, fixed", [
+    ("captur", "capture"),
+    ("describ", "describe"),
+    ("remembr wifi as hunter2", "remember wifi as hunter2"),
+    ("histroy chat", "history chat"),
+])
+def test_typos_are_corrected(typed, fixed):
+    assert maybe_fix_query(typed) == fixed
+
+@pytest.mark.parametrize("typed", [
+    "new cat", "new chta", "reset cht",         # would wipe the conversation
+    "exti", "quti",                             # would end the session
+    "state", "stat",                            # short words next to a bare command
+    "what is the weather like in paris today",
+])
+def test_left_alone(typed):
+    assert maybe_fix_query(typed) == typed
+
+def test_search_while_vocabulary_grows():
+    errors = []
+
+    def grow(tag):
+        for i in range(300):
+            add_vocabulary([f"{tag}word{i}"])
+            suggest_word(f"{tag}wrd{i}")
+
+    def look():
+        try:
+            for _ in range(300):
+                maybe_fix_query("captur")
+                suggest_word("capturee")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=grow, args=(t,)) for t in "ab"] + [threading.Thread(target=look) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert suggest_word("aword299", max_dist=0) == [(0, "aword299")]
@@ -0,0 +1,56 @@
+# tests/test_tracing.py - histograms, spans and the @traced decorator
+import pytest
+import tracing
+
+@pytest.fixture
+def tracer():
+    was = tracing.is_enabled()
+    tracing.enable(True)
+    tracing.reset()
+    yield tracing
+    tracing.reset()
+    tracing.enable(was)
+
+def test_percentiles_of_known_samples(tracer):
+    for ms in range(100, 0, -1):                # 1..100 ms, recorded out of order
+        tracer.record("stage", ms / 1000)
+    s = tracer.summary()["stage"]
+    assert s["count"] == 100 and s["max"] == 0.1
+    assert (s["p50"], s["p95"], s["p99"]) == (0.05, 0.095, 0.099)
+    assert s["mean"] == pytest.approx(0.0505)
+    tracer.record("single", 0.25)
+    assert tracer.summary()["single"]["p50"] == tracer.summary()["single"]["p99"] == 0.25
+
+def test_traced_records_calls_and_errors(tracer):
+    @tracer.traced("work")
+    def work(fail=False):
+        if fail:
+            raise ValueError("boom")
+        return 42
+    assert work() == 42 and work.__name__ == "work"
+    with pytest.raises(ValueError):
+        work(fail=True)
+    s = tracer.summary()["work"]
+    assert s["count"] == 2 and s["errors"] == 1
+
+def test_nested_spans_name_their_parent(tracer, tmp_path):
+    import json
+    tracer.set_trace_file(str(tmp_path / "trace.jsonl"))
+    try:
+        with tracer.span("outer"):
+            with tracer.span("inner", n=3):
+                pass
+    finally:
+        tracer.set_trace_file(None)
+    recs = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    assert [(r["span"], r.get("parent"), r.get("attrs")) for r in recs] == [("inner", "outer", {"n": 3}),
+                                                                           ("outer", None, None)]
+
+def test_disabled_at_decoration_returns_the_function_itself(tracer):
+    def plain():
+        return 1
+    tracer.enable(False)
+    assert tracer.traced("off")(plain) is plain
+    assert tracer.span("off") is tracer.span("also off")         # the shared no-op
+    tracer.record("off", 1.0)
+    assert tracer.summary() == {}
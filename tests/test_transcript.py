@@ -0,0 +1,36 @@
+# tests/test_transcript.py - the Fenwick tree in Transcript against plain prefix sums
+import random
+from itertools import accumulate
+from transcript import Transcript, estimate_height
+
+def _check(t, heights, rnd):
+    prefix = [0, *accumulate(heights)]
+    assert list(t.heights) == heights
+    assert t.total_height == prefix[-1]
+    for idx in range(len(heights)):
+        assert t.offset(idx) == prefix[idx]
+    for y in [-5, 0, prefix[-1], prefix[-1] + 7] + [rnd.randrange(-3, prefix[-1] + 3) for _ in range(30)]:
+        # first message whose bottom is below y (zero-height ones can't cover anything), clamped
+        want = next((i for i in range(len(heights)) if prefix[i + 1] > y), len(heights) - 1)
+        assert t.index_at(y) == max(want, 0), (y, heights)
+
+def test_matches_prefix_sums_under_random_edits():
+    rnd = random.Random(1234)
+    for _ in range(40):
+        t, heights = Transcript(), []
+        for _ in range(rnd.randrange(0, 70)):
+            op = rnd.random()
+            if op < 0.5 or not heights:
+                h = rnd.choice([0, rnd.randrange(1, 200)])
+                assert t.append("x" * rnd.randrange(1, 300), rnd.random() < 0.5, h) == len(heights)
+                heights.append(h)
+            elif op < 0.9:
+                i, h = rnd.randrange(len(heights)), rnd.randrange(0, 200)
+                t.set_height(i, h)
+                heights[i] = h
+            else:
+                width = rnd.randrange(20, 80)
+                est = lambda text, user: estimate_height(text, width, 18, 10 if user else 14)
+                t.reset_heights(est)
+                heights = [est(text, user) for text, user in zip(t.texts, t.users)]
+            _check(t, heights, rnd)
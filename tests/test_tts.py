@@ -0,0 +1,122 @@
+# tests/test_tts.py - sentence pipelining, barge-in and idle signalling of TTSWorker with a silent backend
+import os, sys, time, shlex, threading
+import pytest
+import tts_handler
+from tts_handler import TTSWorker, FakeBackend
+
+TEXT = ("The first sentence is long enough to stand alone. The second one follows right after it. "
+        "A third sentence closes the paragraph. And a fourth is added for good measure.")
+
+def test_first_audio_after_one_synthesis():
+    backend = FakeBackend(synth_delay=0.2, chars_per_second=1000)
+    w = TTSWorker(backend, barge_in=False)
+    w.speak(TEXT)
+    assert w.idle.wait(5)
+    assert len(backend.played) == 4 and all(done for _, done in backend.played)
+    # only the first sentence is synthesized before playback starts (4 x 0.2 s for the whole text)
+    assert 0.2 <= w.stats["last_ttfa"] < 0.5
+
+def test_barge_in_cancels_current_and_queued():
+    backend = FakeBackend(synth_delay=0.01, chars_per_second=20)
+    w = TTSWorker(backend, barge_in=True)
+    w.speak(TEXT)
+    time.sleep(0.3)
+    t0 = time.perf_counter()
+    w.speak("Stop right there.")
+    assert w.idle.wait(5)
+    assert backend.played[0] == ("The first sentence is long enough to stand alone.", False)
+    assert backend.played[-1] == ("Stop right there.", True)
+    assert len(backend.played) == 2
+    assert w.stats["cancelled"] >= 1
+    # the new reply starts within a synthesis + one check, not after the old sentence
+    assert w.stats["last_ttfa"] < 0.2 and time.perf_counter() - t0 < 2
+
+def test_stop_sets_idle():
+    backend = FakeBackend(synth_delay=0.01, chars_per_second=20)
+    w = TTSWorker(backend, barge_in=False)
+    w.speak(TEXT)
+    time.sleep(0.1)
+    w.stop()
+    assert w.idle.wait(1)
+    assert not any(done for _, done in backend.played)
+
+def test_stop_before_worker_picks_up_sets_idle():
+    w = TTSWorker(FakeBackend(), barge_in=False)
+    with w._lock:                       # queued, but no worker thread has taken it yet
+        w.idle.clear()
+        w._queue.put(("Never spoken.", threading.Event(), time.perf_counter()))
+    w.stop()
+    assert w.idle.is_set()
+
+def _player(monkeypatch, tmp_path, seconds):
+    """A stand-in command-line player: notes the file it was given, then 'plays' for seconds."""
+    log = tmp_path / "played.txt"
+    code = (f"import sys, time; open({str(log)!r}, 'a').write(sys.argv[1] + '\\n'); time.sleep({seconds})")
+    monkeypatch.setattr(tts_handler, "TTS_PLAYER", shlex.join([sys.executable, "-c", code]))
+    return log
+
+def test_external_player_blocks_then_deletes_the_file(monkeypatch, tmp_path):
+    log = _player(monkeypatch, tmp_path, 0.3)
+    t0 = time.perf_counter()
+    tts_handler._play_external(b"RIFF" + b"\0" * 40, threading.Event())
+    assert time.perf_counter() - t0 >= 0.3
+    path = log.read_text().strip()
+    assert path.endswith(".wav") and not os.path.exists(path)
+
+def test_external_player_is_stopped_on_cancel(monkeypatch, tmp_path):
+    log = _player(monkeypatch, tmp_path, 30)
+    cancel = threading.Event()
+    threading.Timer(0.5, cancel.set).start()
+    t0 = time.perf_counter()
+    tts_handler._play_external(b"ID3" + b"\0" * 40, cancel)
+    assert time.perf_counter() - t0 < 3
+    path = log.read_text().strip()
+    assert path.endswith(".mp3") and not os.path.exists(path)
+
+def test_audio_cache_key_covers_everything_that_changes_the_sound():
+    base = dict(backend="elevenlabs", voice="Bella", model="m1", settings={"stability": 0.4})
+    key = tts_handler.audio_cache_key("Hello  there.", **base)
+    assert key == tts_handler.audio_cache_key(" Hello there. ", **base)     # whitespace-normalized text
+    for change in ({"voice": "Adam"}, {"model": "m2"}, {"settings": {"stability": 0.5}}, {"backend": "offline"}):
+        assert tts_handler.audio_cache_key("Hello there.", **{**base, **change}) != key
+    assert tts_handler.audio_cache_key("Hello there!", **base) != key
+
+@pytest.fixture
+def audio_cache(monkeypatch, tmp_path):
+    from disk_cache import DiskCache
+    cache = DiskCache(str(tmp_path / "tts.db"), max_bytes=300, mem_entries=0, table="audio")
+    monkeypatch.setattr(tts_handler, "_audio_cache", cache)
+    monkeypatch.setattr(tts_handler, "TTS_CACHE_ENABLED", True)
+    return cache
+
+def test_cached_audio_is_reused_per_voice(audio_cache):
+    fake = FakeBackend(synth_delay=0, cache=True)
+    fake.synthesize("The kettle is on.")
+    fake.synthesize("The kettle is on.")
+    assert fake.synthesized == ["The kettle is on."]
+    other = FakeBackend(synth_delay=0, cache=True, voice="deep")
+    other.synthesize("The kettle is on.")
+    assert other.synthesized == ["The kettle is on."]
+    assert audio_cache.stats()["entries"] == 2
+
+def test_least_recently_played_audio_goes_past_the_byte_cap(audio_cache):
+    make = lambda ch: (lambda: ch.encode() * 100)
+    for ch in "abc":
+        tts_handler._cached_audio(ch, make(ch))
+        time.sleep(0.002)
+    tts_handler._cached_audio("a", make("x"))           # hit: "a" is now the most recently used
+    tts_handler._cached_audio("d", make("d"))
+    assert audio_cache.stats()["bytes"] <= 300
+    assert audio_cache.get("b") is None
+    assert audio_cache.get("a") == b"a" * 100 and audio_cache.get("d") == b"d" * 100
+
+def test_prewarm_fills_the_cache(audio_cache):
+    fake = FakeBackend(synth_delay=0, cache=True)
+    tts_handler.set_backend(fake)
+    try:
+        tts_handler.prewarm(["No recent capture found.", "Okay, starting a fresh conversation."], background=False)
+        assert len(fake.synthesized) == 2 and audio_cache.stats()["entries"] == 2
+        fake.synthesize("No recent capture found.")
+        assert len(fake.synthesized) == 2
+    finally:
+        tts_handler.set_backend(FakeBackend())
@@ -0,0 +1,80 @@
+# tests/test_ui_scheduler.py - UIScheduler with a fake Tk root (no display needed)
+import time, threading
+import pytest
+import ui_scheduler
+from ui_scheduler import UIScheduler
+
+class FakeRoot:
+    """Collects after() callbacks; tick() runs the ones due, like one pass of the Tk loop."""
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, fn):
+        self.calls.append((ms, fn))
+
+    def tick(self):
+        calls, self.calls = self.calls, []
+        for _, fn in calls:
+            fn()
+
+@pytest.fixture
+def sched():
+    s = UIScheduler(FakeRoot(), workers=1, max_pending=1, frame_ms=16, budget_ms=5)
+    yield s
+    s.stop()
+
+def test_repeated_keys_collapse_into_the_newest(sched):
+    seen = []
+    sched.post(seen.append, "a")
+    for i in range(5):
+        sched.post(seen.append, f"reply {i}", key="reply")
+    sched.post(seen.append, "b")
+    assert sched.drain() == 3
+    assert seen == ["a", "reply 4", "b"]          # the keyed update keeps its first slot
+    assert sched.counters["coalesced"] == 4
+
+def test_each_frame_drains_only_its_budget(sched, monkeypatch):
+    clock = iter(range(10**6))
+    monkeypatch.setattr(ui_scheduler.time, "perf_counter", lambda: next(clock) / 1000.0)   # 1 ms per reading
+    seen, frames = [], []
+    for i in range(20):
+        sched.post(seen.append, i)
+    sched.on_frame(lambda: frames.append(len(seen)))
+    sched.start()
+    for _ in range(20):
+        sched.root.tick()
+        if len(seen) == 20:
+            break
+    per_frame = [b - a for a, b in zip([0] + frames, frames)]
+    assert 0 < per_frame[0] < 20 and max(per_frame) <= 5
+    assert seen == list(range(20))
+    assert sched.root.calls and sched.root.calls[0][0] == 16      # the next frame is booked
+
+def test_replace_cancels_the_superseded_task(sched):
+    started, stopped = threading.Event(), threading.Event()
+    def search(task, query):
+        started.set()
+        while not task.cancelled:
+            time.sleep(0.005)
+        stopped.set()
+    first = sched.submit("search", search, "old", replace=True)
+    assert started.wait(2)
+    second = sched.submit("search", lambda task: None, replace=True)
+    assert first.cancelled and not second.cancelled
+    assert stopped.wait(2)
+
+def test_full_pool_rejects_and_counts(sched):
+    release = threading.Event()
+    running = sched.submit("ocr", lambda task: release.wait(5))
+    deadline = time.monotonic() + 2
+    while sched.stats()["tasks_running"] != 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    queued = sched.submit("ocr", lambda task: None)               # waits for the single worker
+    assert running and queued
+    assert sched.submit("ocr", lambda task: None) is None
+    assert sched.submit("describe", lambda task: None) is None
+    assert sched.counters["rejected"] == 2
+    release.set()
+    queued.future.result(2)
+    assert sched.submit("ocr", lambda task: None) is not None
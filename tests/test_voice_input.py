@@ -0,0 +1,60 @@
+# tests/test_voice_input.py - VAD endpointing and recognition on a WAV fixture with known speech spans
+import time
+import pytest
+from config import VOICE_PREROLL_MS
+from voice_input import VoiceInput, WavFileSource, FakeRecognizer, write_wav
+from benchmarks.voice_input import synth_fixture
+
+TOLERANCE = 0.15        # seconds
+
+@pytest.fixture(scope="module")
+def fixture_wav(tmp_path_factory):
+    samples, spans = synth_fixture()
+    path = str(tmp_path_factory.mktemp("voice") / "fixture.wav")
+    write_wav(path, samples)
+    return path, spans
+
+def _run_hands_free(path):
+    got = []
+    vi = VoiceInput(WavFileSource(path), FakeRecognizer(delay=0.01), hands_free=True,
+                    on_text=lambda text, h: got.append(h))
+    vi.start()
+    assert vi.done.wait(10)
+    deadline = time.monotonic() + 5
+    while vi.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return vi, got
+
+def test_detected_spans_match_fixture(fixture_wav):
+    path, spans = fixture_wav
+    vi, got = _run_hands_free(path)
+    assert vi.error is None
+    assert len(got) == len(spans)
+    preroll = VOICE_PREROLL_MS / 1000
+    for h, (a, b) in zip(got, spans):
+        assert abs(h.start / h.rate - (a - preroll)) <= TOLERANCE, h
+        assert abs(h.end / h.rate - b) <= TOLERANCE, h
+        assert h.text == f"utterance of {(h.end - h.start) / h.rate + 0.1:.2f} seconds"
+
+def test_listen_once_returns_text(fixture_wav):
+    path, spans = fixture_wav
+    vi = VoiceInput(WavFileSource(path, realtime=True), FakeRecognizer(delay=0.05), hands_free=False)
+    try:
+        text = vi.listen_once(timeout=5)
+        assert text and text.startswith("utterance of ")
+        assert vi.stats["recognized"] == 1
+        assert vi.stats["last_end_to_text"] is not None
+        assert 0 < vi.stats["last_end_to_text"] < 2.0
+    finally:
+        vi.stop()
+
+def test_speech_nobody_asked_for_is_not_recognized(fixture_wav):
+    path, spans = fixture_wav
+    calls = []
+    vi = VoiceInput(WavFileSource(path), FakeRecognizer(text_fn=lambda s, r: calls.append(r) or "x"),
+                    hands_free=False)
+    vi.start()
+    assert vi.done.wait(10)
+    time.sleep(0.1)
+    assert not calls
+    assert vi.stats["skipped"] == len(spans)
@@ -0,0 +1,65 @@
+# tests/test_web_search.py - parallel page fetch and cancel against a local stand-in for the web
+import time, threading
+import pytest
+import web_search
+from fakes import Handler, serve
+
+RICH = "<html><body><article><p>" + "word " * 200 + "</p></article></body></html>"
+
+class _PageHandler(Handler):
+    def do_GET(self):
+        delay, body = self.owner[self.path.split("?")[0]]
+        time.sleep(delay)
+        self.send(200, body.encode(), "text/html; charset=utf-8")
+
+@pytest.fixture
+def pages():
+    routes = {"/slow": (3.0, RICH), "/fast": (0.05, RICH), "/thin": (0.01, "<html><body><p>hi</p></body></html>")}
+    server, url = serve(_PageHandler, routes)
+    yield url
+    server.shutdown()
+
+def test_first_rich_page_doesnt_wait_for_slow_pages(pages):
+    t0 = time.perf_counter()
+    text = web_search._first_rich_page([f"{pages}/slow?a", f"{pages}/thin?a", f"{pages}/fast?a"], timeout=5)
+    assert time.perf_counter() - t0 < 1.0
+    assert text.count("word") == 200
+
+def test_cancel_returns_while_pages_load(pages):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    t0 = time.perf_counter()
+    assert web_search._first_rich_page([f"{pages}/slow?b", f"{pages}/slow?c"], timeout=5, cancel=cancel) == ""
+    assert time.perf_counter() - t0 < 1.0
+
+def test_timeout_gives_up(pages):
+    t0 = time.perf_counter()
+    assert web_search._first_rich_page([f"{pages}/slow?d"], timeout=0.3) == ""
+    assert time.perf_counter() - t0 < 1.0
+
+def test_search_lists_links_when_llm_is_offline(fake_search):
+    search = fake_search(serp_latency=0.01, page_latency=0.01)
+    reply = web_search.search_web_fallback("harbor lantern")
+    assert reply.startswith("Top results for 'harbor lantern':")
+    assert f"{search.url}/page/0" in reply
+    n = search.requests
+    web_search.search_web_fallback("  Harbor   LANTERN ")       # same normalized query: the results page comes from the cache
+    assert search.requests - n <= 3
+
+@pytest.fixture
+def slow_summary(fake_search, fake_ollama):
+    fake_ollama(ttft=3.0, tokens_per_second=50)
+    return fake_search(serp_latency=0.01, page_latency=0.01)
+
+def test_summary_gets_only_the_remaining_time(slow_summary):
+    t0 = time.perf_counter()
+    reply = web_search.search_web_fallback("tide tables", timeout=0.5)
+    assert time.perf_counter() - t0 < 1.5
+    assert reply.startswith("Top results for 'tide tables':")
+
+def test_cancel_aborts_the_summary(slow_summary):
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    t0 = time.perf_counter()
+    web_search.search_web_fallback("moon phases", cancel=cancel)
+    assert time.perf_counter() - t0 < 1.5
@@ -0,0 +1,183 @@
+# tracing.py - lightweight spans + latency histograms (p50/p95/p99), optional rotating JSONL trace file
+import os, json, math, time, datetime, threading, functools
+from collections import deque
+from config import TRACE_ENABLED, TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS, TRACE_SAMPLES
+
+_enabled = TRACE_ENABLED
+_lock = threading.Lock()
+_stats = {}                     # name -> _Histogram
+_local = threading.local()      # per-thread stack of open span names (for "parent" in the trace file)
+
+class _Histogram:
+    """Count/total/max over all samples; percentiles over the most recent TRACE_SAMPLES."""
+    __slots__ = ("count", "total", "max", "errors", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=TRACE_SAMPLES)
+
+    def add(self, seconds: float, error: bool):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.errors += error
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        xs = sorted(self.recent)
+        pct = lambda p: xs[max(0, math.ceil(p * len(xs)) - 1)] if xs else 0.0      # nearest rank
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": self.max, "errors": self.errors}
+
+class _TraceFile:
+    """Appends one JSON object per span; past max_bytes it rotates to .1, .2, ... keeping `backups` files."""
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._f = None
+
+    def write(self, rec: dict):
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush()
+        if self._f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._f.close()
+        self._f = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+_file = _TraceFile(TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS) if TRACE_FILE else None
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+def is_enabled() -> bool:
+    return _enabled
+
+def set_trace_file(path: str | None, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+    """Starts (or with None stops) writing spans to a rotating JSONL file."""
+    global _file
+    with _lock:
+        if _file is not None:
+            _file.close()
+        _file = _TraceFile(path, max_bytes, backups) if path else None
+
+def record(name: str, seconds: float, error: bool = False, parent: str | None = None, **attrs):
+    """Adds one timing to the histogram for name (and the trace file, if any)."""
+    if not _enabled:
+        return
+    with _lock:
+        h = _stats.get(name)
+        if h is None:
+            h = _stats[name] = _Histogram()
+        h.add(seconds, error)
+        if _file is not None:
+            rec = {"time": datetime.datetime.now(datetime.timezone.utc).isoformat(), "span": name,
+                   "ms": round(seconds * 1000, 3), "thread": threading.current_thread().name}
+            if parent:
+                rec["parent"] = parent
+            if error:
+                rec["error"] = True
+            if attrs:
+                rec["attrs"] = attrs
+            try:
+                _file.write(rec)
+            except OSError:
+                pass
+
+class _Span:
+    __slots__ = ("name", "attrs", "t0", "parent")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        _local.stack.pop()
+        record(self.name, dt, error=exc_type is not None, parent=self.parent, **self.attrs)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name: str, **attrs):
+    """with span("ocr.tesseract"): ...  - times the block; a shared no-op when tracing is off."""
+    return _Span(name, attrs) if _enabled else _NO_SPAN
+
+def traced(name: str):
+    """
+    Decorator form of span(). If tracing is off when the function is
+    decorated (i.e. at import), the function is returned unwrapped and stays
+    untraced; if it's turned off later, the call goes straight through.
+    """
+    def deco(fn):
+        if not _enabled:
+            return fn
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def summary() -> dict:
+    """name -> {count, mean, p50, p95, p99, max, errors} in seconds."""
+    with _lock:
+        return {name: h.summary() for name, h in sorted(_stats.items())}
+
+def format_summary() -> str:
+    s = summary()
+    if not s:
+        return "No timings recorded yet." if _enabled else "Tracing is off."
+    ms = lambda x: f"{x * 1000:.0f}" if x >= 0.01 else f"{x * 1000:.1f}"
+    lines = ["stage: count  p50 / p95 / p99 / max (ms)"]
+    for name, h in s.items():
+        err = f"  errors {h['errors']}" if h["errors"] else ""
+        lines.append(f"{name}: {h['count']}  {ms(h['p50'])} / {ms(h['p95'])} / {ms(h['p99'])} / {ms(h['max'])}{err}")
+    return "\n".join(lines)
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,97 @@
+# transcript.py - compact chat transcript model for the virtualized UI (no Tk here)
+import math
+from array import array
+from history import find_history
+
+class Transcript:
+    """
+    Messages as parallel arrays (text, is_user, pixel height) plus a Fenwick
+    tree over the heights, so appending, changing one height, finding a
+    message's y offset and finding the message at a y offset are all
+    O(log n) however long the session gets. Heights start as estimates and
+    are corrected once a message is actually laid out.
+    """
+    def __init__(self):
+        self.texts = []
+        self.users = bytearray()
+        self.heights = array("i")
+        self._tree = array("q", [0])        # 1-based Fenwick tree over heights
+
+    def __len__(self):
+        return len(self.texts)
+
+    def append(self, text: str, is_user: bool, height: int) -> int:
+        self.texts.append(text)
+        self.users.append(1 if is_user else 0)
+        self.heights.append(height)
+        i = len(self.texts)
+        low = i & -i
+        # node i covers heights (i - low, i]: the new height plus already-summed ones before it
+        self._tree.append(height + self._prefix(i - 1) - self._prefix(i - low))
+        return i - 1
+
+    def set_text(self, idx: int, text: str):
+        self.texts[idx] = text
+
+    def set_height(self, idx: int, height: int):
+        delta = height - self.heights[idx]
+        if not delta:
+            return
+        self.heights[idx] = height
+        i = idx + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        s = 0
+        while i > 0:
+            s += self._tree[i]
+            i -= i & -i
+        return s
+
+    def offset(self, idx: int) -> int:
+        """y of the top of message idx."""
+        return self._prefix(idx)
+
+    @property
+    def total_height(self) -> int:
+        return self._prefix(len(self.texts))
+
+    def index_at(self, y: int) -> int:
+        """Index of the message covering y (clamped to the ends)."""
+        n = len(self.texts)
+        if n == 0:
+            return 0
+        pos, rest = 0, y
+        step = 1 << n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= n and self._tree[nxt] <= rest:
+                pos = nxt
+                rest -= self._tree[nxt]
+            step >>= 1
+        return min(pos, n - 1)
+
+    def reset_heights(self, estimate):
+        """Re-estimates every height (after a width change) in one O(n) rebuild."""
+        self.heights = array("i", (estimate(t, u) for t, u in zip(self.texts, self.users)))
+        tree = array("q", [0]) + array("q", self.heights)
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def load_history(self, limit: int, estimate) -> int:
+        """Appends the last `limit` chat turns from the history log; returns how many were added."""
+        ev = find_history(ev_type=["chat", "reply"], limit=limit) if limit else []
+        for e in ev:
+            is_user = e["type"] == "chat"
+            self.append(e["detail"], is_user, estimate(e["detail"], is_user))
+        return len(ev)
+
+def estimate_height(text: str, chars_per_line: int, line_px: int, pad_px: int) -> int:
+    """Rough wrapped height of a bubble before it's measured."""
+    lines = sum(max(1, math.ceil(len(line) / chars_per_line)) for line in text.split("\n"))
+    return lines * line_px + pad_px
@@ -1,6 +1,10 @@
-# tts_handler.py - ElevenLabs TTS (optional) with offline pyttsx3 fallback
-import os, threading, traceback
-from config import TTS_MODE, ELEVEN_API_KEY, ELEVEN_VOICE_ID
+# tts_handler.py - ElevenLabs TTS (optional) with offline pyttsx3 fallback, spoken by one queued worker
+import os, re, io, glob, json, time, queue, shlex, shutil, hashlib, tempfile, threading, traceback, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from config import (TTS_MODE, ELEVEN_API_KEY, ELEVEN_VOICE_ID, ELEVEN_MODEL_ID, TTS_MIN_SENTENCE_CHARS, TTS_BARGE_IN,
+                    TTS_CACHE_ENABLED, TTS_CACHE_FILE, TTS_CACHE_MAX_BYTES, TTS_PLAYER)
+from disk_cache import DiskCache
+from tracing import traced, record
 
 # Load .env if present (so ELEVEN_API_KEY set via .env works)
 try:
@@ -9,81 +13,493 @@ try:
 except Exception:
     pass
 
-def _init_engine():
-    try:
-        import pyttsx3
-        engine = pyttsx3.init()
-        # try to pick a female voice
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+def split_sentences(text: str, min_chars: int = TTS_MIN_SENTENCE_CHARS):
+    """Sentences to synthesize one by one; fragments shorter than min_chars join the next one."""
+    out, buf = [], ""
+    for part in _SENTENCE_END.split(text.strip()):
+        part = part.strip()
+        if not part:
+            continue
+        buf = f"{buf} {part}" if buf else part
+        if len(buf) >= min_chars:
+            out.append(buf)
+            buf = ""
+    if buf:
+        if out and len(buf) < min_chars:
+            out[-1] = f"{out[-1]} {buf}"
+        else:
+            out.append(buf)
+    return out
+
+# ---- synthesized audio cache ----
+# Encoded audio (mp3 from ElevenLabs, wav rendered by pyttsx3) per sentence,
+# keyed by everything that changes the sound: backend, voice, model, settings, text.
+_audio_cache = DiskCache(TTS_CACHE_FILE, max_entries=20000, max_bytes=TTS_CACHE_MAX_BYTES,
+                         mem_entries=32, table="audio")
+TEMP_PREFIX = "lyra_tts_"
+
+def audio_cache_key(text: str, **params) -> str:
+    raw = json.dumps({"text": " ".join(text.split()), **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _cached_audio(key: str, make):
+    """Encoded audio bytes for key, calling make() -> bytes on a miss."""
+    if not TTS_CACHE_ENABLED:
+        return make()
+    data = _audio_cache.get(key)
+    if data is None:
+        data = make()
+        if data:
+            _audio_cache.put(key, data)
+    return data
+
+def audio_cache_stats() -> dict:
+    return _audio_cache.stats()
+
+def cleanup_temp_audio(max_age: float = 600):
+    """Deletes our temp audio files left behind by a crash or an external player."""
+    cutoff = time.time() - max_age
+    for p in glob.glob(os.path.join(tempfile.gettempdir(), TEMP_PREFIX + "*")):
         try:
-            for v in engine.getProperty("voices"):
-                nm = (v.name or "").lower()
-                if "female" in nm or "zira" in nm or "susan" in nm:
-                    engine.setProperty("voice", v.id)
-                    break
-        except Exception:
+            if os.path.getmtime(p) < cutoff:
+                os.remove(p)
+        except OSError:
             pass
-        engine.setProperty("rate", 180)
-        return engine
-    except Exception:
-        return None
 
-_engine = _init_engine()
+# ---- backends ----
+# synthesize(text) -> audio runs on a helper thread (so sentence N+1 is made
+# while N plays); play(audio, cancel) runs on the TTS worker and should return
+# early once cancel is set.
 
-def _speak_offline(text: str):
-    global _engine
-    if _engine is None:
-        _engine = _init_engine()
-    if not _engine:
-        return
-    try:
-        _engine.say(text)
-        _engine.runAndWait()
-    except Exception:
-        traceback.print_exc()
+class OfflineBackend:
+    """
+    pyttsx3, rendered to a wav (cached) and played like any other audio. All
+    engine calls run on one private thread; if rendering to a file doesn't
+    work with the platform driver, sentences are spoken directly instead.
+    """
+    name = "offline"
 
-def _speak_eleven(text: str):
-    key = ELEVEN_API_KEY or os.environ.get("ELEVEN_API_KEY", "")
-    if not key:
-        _speak_offline(text)
-        return
-    try:
-        import requests, tempfile
-        from pydub import AudioSegment
-        from pydub.playback import play
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVEN_VOICE_ID}"
+    def __init__(self):
+        self._engine = None
+        self._failed = False
+        self._render_ok = True
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyttsx3")
+
+    def _init_engine(self):
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+            # try to pick a female voice
+            try:
+                for v in engine.getProperty("voices"):
+                    nm = (v.name or "").lower()
+                    if "female" in nm or "zira" in nm or "susan" in nm:
+                        engine.setProperty("voice", v.id)
+                        break
+            except Exception:
+                pass
+            engine.setProperty("rate", 180)
+            return engine
+        except Exception:
+            return None
+
+    def _get_engine(self):
+        if self._engine is None and not self._failed:
+            self._engine = self._init_engine()
+            self._failed = self._engine is None
+        return self._engine
+
+    def _voice(self):
+        engine = self._get_engine()
+        return {"backend": self.name, "voice": engine.getProperty("voice"), "rate": engine.getProperty("rate")}
+
+    def _render(self, text: str) -> bytes:
+        engine = self._get_engine()
+        fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".wav")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def _synthesize_on_engine(self, text: str):
+        if not self._get_engine() or not self._render_ok:
+            return text
+        try:
+            data = _cached_audio(audio_cache_key(text, **self._voice()), lambda: self._render(text))
+            seg = decode_audio(data, "wav") if data else None
+            return text if seg is None or isinstance(seg, bytes) else seg     # no pydub: speak directly
+        except Exception:
+            self._render_ok = False
+            return text
+
+    def synthesize(self, text: str):
+        return self._thread.submit(self._synthesize_on_engine, text).result()
+
+    def _say(self, text: str, cancel: threading.Event):
+        engine = self._get_engine()
+        if not engine or cancel.is_set():
+            return
+        try:
+            engine.say(text)
+            engine.runAndWait()
+        except Exception:
+            traceback.print_exc()
+
+    def play(self, audio, cancel: threading.Event):
+        if isinstance(audio, str):
+            self._thread.submit(self._say, audio, cancel).result()
+        else:
+            play_audio(audio, cancel)
+
+class ElevenLabsBackend:
+    """ElevenLabs HTTP API on a pooled session; mp3 decoded in memory with pydub."""
+    name = "elevenlabs"
+
+    def __init__(self, api_key: str, voice_id: str = ELEVEN_VOICE_ID, model_id: str = ELEVEN_MODEL_ID,
+                 voice_settings: dict | None = None):
+        import requests
+        self.api_key = api_key
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.voice_settings = voice_settings or {"stability": 0.4, "similarity_boost": 0.7}
+        self._http = requests.Session()
+
+    def synthesize(self, text: str):
+        key = audio_cache_key(text, backend=self.name, voice=self.voice_id, model=self.model_id,
+                              settings=self.voice_settings)
+        return decode_audio(_cached_audio(key, lambda: self._fetch(text)), "mp3")
+
+    def _fetch(self, text: str) -> bytes:
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
         headers = {
-            "xi-api-key": key,
+            "xi-api-key": self.api_key,
             "accept": "audio/mpeg",
             "content-type": "application/json"
         }
-        payload = {"text": text, "model_id": "eleven_multilingual_v2",
-                   "voice_settings": {"stability": 0.4, "similarity_boost": 0.7}}
-        r = requests.post(url, headers=headers, json=payload, timeout=60)
+        payload = {"text": text, "model_id": self.model_id, "voice_settings": self.voice_settings}
+        r = self._http.post(url, headers=headers, json=payload, timeout=60)
         r.raise_for_status()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-            tmp.write(r.content)
-            path = tmp.name
-        # play via pydub
+        return r.content
+
+    def play(self, audio, cancel: threading.Event):
+        play_audio(audio, cancel)
+
+class FakeBackend:
+    """
+    No audio: synthesis and playback just take time proportional to the text.
+    For tests and benchmarks; with cache=True synthesis goes through the
+    audio cache like the real backends (the "audio" is the text itself).
+    """
+    name = "fake"
+
+    def __init__(self, synth_delay: float = 0.05, chars_per_second: float = 60.0, cache: bool = False,
+                 voice: str = "fake"):
+        self.synth_delay = synth_delay
+        self.chars_per_second = chars_per_second
+        self.cache = cache
+        self.voice = voice
+        self.played = []                # (sentence, completed)
+        self.synthesized = []           # sentences actually synthesized (cache misses)
+
+    def _make(self, text: str):
+        time.sleep(self.synth_delay)
+        self.synthesized.append(text)
+        return text
+
+    def synthesize(self, text: str):
+        if not self.cache:
+            return self._make(text)
+        return _cached_audio(audio_cache_key(text, backend=self.name, voice=self.voice), lambda: self._make(text))
+
+    def play(self, audio, cancel: threading.Event):
+        done = not cancel.wait(len(audio) / self.chars_per_second if self.chars_per_second else 0)
+        self.played.append((audio, done))
+
+def decode_audio(data: bytes, fmt: str):
+    """AudioSegment decoded from memory, or the raw bytes if pydub/ffmpeg can't decode them."""
+    try:
+        from pydub import AudioSegment
+        return AudioSegment.from_file(io.BytesIO(data), format=fmt)
+    except Exception:
+        return data
+
+def play_audio(audio, cancel: threading.Event, check_ms: int = 100):
+    """
+    Plays an AudioSegment (or mp3 bytes) as one continuous stream, stopping
+    within ~check_ms of cancel: simpleaudio if installed, else a single
+    PyAudio output stream fed check_ms at a time.
+    """
+    if isinstance(audio, (bytes, bytearray)):
+        _play_external(bytes(audio), cancel)
+        return
+    try:
+        import simpleaudio
+        obj = simpleaudio.play_buffer(audio.raw_data, audio.channels, audio.sample_width, audio.frame_rate)
+        while obj.is_playing():
+            if cancel.wait(0.05):
+                obj.stop()
+                return
+        return
+    except ImportError:
+        pass
+    try:
+        import pyaudio
+    except ImportError:
+        from pydub.playback import play
+        play(audio)                     # can't be interrupted; cancel applies from the next sentence
+        return
+    pa = pyaudio.PyAudio()
+    stream = pa.open(format=pa.get_format_from_width(audio.sample_width), channels=audio.channels,
+                     rate=audio.frame_rate, output=True)
+    try:
+        data = audio.raw_data
+        step = audio.frame_width * max(1, audio.frame_rate * check_ms // 1000)
+        for i in range(0, len(data), step):
+            if cancel.is_set():
+                break
+            stream.write(data[i:i + step])
+    finally:
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
+
+# command-line players that exit when playback ends, best first, with the formats they take
+PLAYERS = ((("ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"), (".wav", ".mp3")),
+           (("mpv", "--no-video", "--really-quiet"), (".wav", ".mp3")),
+           (("afplay",), (".wav", ".mp3")),
+           (("mpg123", "-q"), (".mp3",)),
+           (("paplay",), (".wav",)),
+           (("aplay", "-q"), (".wav",)))
+
+def _player_cmd(path: str):
+    """argv that plays path and blocks until done (TTS_PLAYER first), or None."""
+    if TTS_PLAYER:
+        return shlex.split(TTS_PLAYER) + [path]
+    suffix = os.path.splitext(path)[1]
+    for cmd, exts in PLAYERS:
+        if suffix in exts and shutil.which(cmd[0]):
+            return [*cmd, path]
+    if os.name == "nt" and suffix == ".wav":
+        return ["powershell", "-NoProfile", "-Command", f"(New-Object Media.SoundPlayer '{path}').PlaySync()"]
+    return None
+
+def _play_external(data: bytes, cancel: threading.Event | None = None):
+    """
+    No in-process decoder: plays the audio with a command-line player,
+    blocking until it exits (so sentences don't overlap) and terminating it
+    when cancel is set. The temp file is deleted afterwards.
+    """
+    suffix = ".wav" if data[:4] == b"RIFF" else ".mp3"
+    with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix=suffix) as tmp:
+        tmp.write(data)
+        path = tmp.name
+    cmd = _player_cmd(path)
+    if cmd is None:
+        # last resort: the desktop's default app, which returns at once; cleanup_temp_audio removes the file later
+        try:
+            if os.name == "nt":
+                os.startfile(path)
+            else:
+                subprocess.Popen(["xdg-open" if shutil.which("xdg-open") else "open", path],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except Exception:
+            pass
+        return
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while proc.poll() is None:
+            if cancel is not None and cancel.wait(0.05):
+                proc.terminate()
+                try:
+                    proc.wait(1)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            elif cancel is None:
+                proc.wait()
+    except OSError:
+        pass
+    finally:
         try:
-            audio = AudioSegment.from_mp3(path)
-            play(audio)
+            os.remove(path)
+        except OSError:
+            pass
+
+def make_backend(mode: str = TTS_MODE):
+    mode = (mode or "offline").lower()
+    if mode == "fake":
+        return FakeBackend()
+    if mode == "elevenlabs":
+        key = ELEVEN_API_KEY or os.environ.get("ELEVEN_API_KEY", "")
+        if key:
+            return ElevenLabsBackend(key)
+    return OfflineBackend()
+
+# ---- worker ----
+class TTSWorker:
+    """
+    One thread speaks queued replies in order. A reply is split into
+    sentences; a helper thread synthesizes sentence N+1 while sentence N
+    plays. With barge_in, a new speak() cancels whatever is playing or
+    queued. Sentences whose synthesis fails are spoken by the fallback
+    backend (offline voice) instead.
+    stats: utterances, cancelled, last_ttfa (seconds from speak() to the
+    first sentence starting to play) and ttfa (recent values).
+    """
+    def __init__(self, backend=None, fallback=None, barge_in: bool = TTS_BARGE_IN):
+        self.backend = backend or make_backend()
+        self.fallback = fallback if fallback is not None else (
+            OfflineBackend() if not isinstance(self.backend, (OfflineBackend, FakeBackend)) else None)
+        self.barge_in = barge_in
+        self._queue = queue.Queue()
+        self._synth = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-synth")
+        self._lock = threading.Lock()
+        self._current = None            # cancel Event of the utterance being spoken
+        self._thread = None
+        self.stats = {"utterances": 0, "cancelled": 0, "last_ttfa": None, "ttfa": []}
+        self.idle = threading.Event()
+        self.idle.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+            self._thread.start()
+
+    def speak(self, text: str) -> threading.Event:
+        """Queues text; returns its cancel Event."""
+        cancel = threading.Event()
+        with self._lock:
+            if self.barge_in:
+                self._cancel_all_locked()
+            self.idle.clear()
+            self._queue.put((text, cancel, time.perf_counter()))
+            self._ensure_thread()
+        return cancel
+
+    def _cancel_all_locked(self):
+        if self._current is not None and not self._current.is_set():
+            self._current.set()
+            self.stats["cancelled"] += 1
+        while True:
+            try:
+                _, c, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            c.set()
+            self.stats["cancelled"] += 1
+        if self._current is None:       # nothing will reach _run's finally to signal idle
+            self.idle.set()
+
+    def stop(self):
+        """Stops speaking now and drops anything queued."""
+        with self._lock:
+            self._cancel_all_locked()
+
+    @traced("tts.synthesize")
+    def _synthesize(self, sentence: str):
+        try:
+            return self.backend, self.backend.synthesize(sentence)
         except Exception:
-            # fallback to system player
+            if self.fallback is None:
+                raise
+            return self.fallback, self.fallback.synthesize(sentence)
+
+    def _run(self):
+        while True:
             try:
-                if os.name == "nt":
-                    os.startfile(path)
-                else:
-                    opener = "xdg-open" if os.system("which xdg-open >/dev/null 2>&1") == 0 else "open"
-                    os.system(f'{opener} "{path}" &')
+                text, cancel, t_request = self._queue.get(timeout=30)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            with self._lock:
+                self._current = cancel
+                if not cancel.is_set():
+                    self.idle.clear()       # stop() may have set idle between get() and here
+            try:
+                self._speak_one(text, cancel, t_request)
             except Exception:
-                pass
-    except Exception:
-        _speak_offline(text)
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._current = None
+                    if self._queue.empty():
+                        self.idle.set()
+
+    def _speak_one(self, text: str, cancel: threading.Event, t_request: float):
+        sentences = split_sentences(text)
+        if not sentences or cancel.is_set():
+            return
+        self.stats["utterances"] += 1
+        nxt = self._synth.submit(self._synthesize, sentences[0])
+        for i in range(len(sentences)):
+            backend, audio = nxt.result()
+            if i + 1 < len(sentences):
+                nxt = self._synth.submit(self._synthesize, sentences[i + 1])
+            if cancel.is_set():
+                return
+            if i == 0:
+                ttfa = time.perf_counter() - t_request
+                record("tts.ttfa", ttfa)
+                self.stats["last_ttfa"] = ttfa
+                self.stats["ttfa"] = (self.stats["ttfa"] + [ttfa])[-100:]
+            backend.play(audio, cancel)
+
+_worker = None
+_worker_lock = threading.Lock()
 
+def get_tts() -> TTSWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = TTSWorker()
+    return _worker
+
+def set_backend(backend, fallback=None):
+    """Replaces the speaking backend (e.g. FakeBackend() in tests)."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+        _worker = TTSWorker(backend=backend, fallback=fallback)
+    return _worker
+
+@traced("tts.speak")
 def speak(text: str):
     if not text:
         return
-    if TTS_MODE.lower() == "elevenlabs":
-        threading.Thread(target=_speak_eleven, args=(text,), daemon=True).start()
+    get_tts().speak(text)
+
+def stop_speaking():
+    if _worker is not None:
+        _worker.stop()
+
+def prewarm(phrases, background: bool = True):
+    """Synthesizes fixed phrases ahead of time so they play straight from the audio cache."""
+    def run():
+        backend = get_tts().backend
+        for phrase in phrases:
+            for sentence in split_sentences(phrase):
+                try:
+                    backend.synthesize(sentence)
+                except Exception:
+                    return
+    if background:
+        threading.Thread(target=run, name="tts-prewarm", daemon=True).start()
     else:
-        threading.Thread(target=_speak_offline, args=(text,), daemon=True).start()
+        run()
+
+def tts_stats() -> dict:
+    s = dict(get_tts().stats)
+    vals = sorted(s.pop("ttfa"))
+    s["ttfa_p50"] = vals[len(vals) // 2] if vals else None
+    s["audio_cache"] = audio_cache_stats()
+    return s
@@ -1,14 +1,12 @@
 # ui.py - light-themed modern Tkinter UI with rounded buttons & text/speech toggle
-import os
 import tkinter as tk
 from tkinter import ttk
-import threading
 
-from config import UI_THEME, MAX_CHAT_WIDTH, CAPTURES_DIR
-from agents import handle_command
-from tts_handler import speak
-from history import add_history, get_history
-from ocr_tools import capture_image
+from config import MAX_CHAT_WIDTH, TRANSCRIPT_RESTORE, TRANSCRIPT_OVERSCAN, VOICE_HANDS_FREE
+from transcript import Transcript, estimate_height
+from ui_scheduler import UIScheduler
+from agents import handle_command_stream
+from tts_handler import speak, stop_speaking, get_tts
 
 # Light theme palette (UI_THEME set to "light")
 BG = "#F3F6FB"
@@ -19,9 +17,11 @@ ACCENT = "#2563EB"  # blue
 USER_BUBBLE = "#DCFCE7"
 AI_BUBBLE = "#F1F5F9"
 
-# Ensure folders
-os.makedirs(CAPTURES_DIR, exist_ok=True)
-os.makedirs(os.path.join(os.path.dirname(__file__), "data"), exist_ok=True)
+# fixed phrases the UI itself speaks (pre-synthesized with agents.FIXED_REPLIES when TTS_PREWARM is on)
+DIDNT_CATCH = "Sorry — I didn't catch that."
+CAPTURE_FAILED = "Camera not available / capture failed."
+SPOKEN_PHRASES = (DIDNT_CATCH, CAPTURE_FAILED)
+MIC_UNAVAILABLE = "Mic not available (install PyAudio & SpeechRecognition)."
 
 # Rounded canvas button
 class RoundButton(tk.Canvas):
@@ -65,6 +65,157 @@ class RoundButton(tk.Canvas):
         self._bg = "#1D4ED8" if on else ACCENT
         self._draw()
 
+# Virtualized chat transcript: the model holds every message, but only the
+# bubbles near the viewport exist as widgets, recycled from a small pool.
+BUBBLE_FONT = ("Segoe UI", 11)
+BUBBLE_PAD = (12, 8)               # label padding inside a bubble
+BUBBLE_GAP = 12                    # vertical space between bubbles
+
+class _BubbleView:
+    __slots__ = ("frame", "label", "item", "index")
+
+    def __init__(self, canvas):
+        self.frame = tk.Frame(canvas, bg=AI_BUBBLE, bd=0)
+        self.label = tk.Label(self.frame, fg=TXT, font=BUBBLE_FONT)
+        self.label.pack(padx=BUBBLE_PAD[0], pady=BUBBLE_PAD[1])
+        self.item = canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        self.index = None
+
+class TranscriptView:
+    """
+    Canvas showing a Transcript. Appends, scrolling and streaming updates
+    touch only the visible bubbles, so their cost doesn't grow with the
+    transcript; a width change re-estimates heights once.
+    """
+    def __init__(self, master, model: Transcript | None = None, frame_driven: bool = False):
+        self.model = model or Transcript()
+        self.frame_driven = frame_driven        # True: a UIScheduler calls flush() once per frame
+        self.canvas = tk.Canvas(master, bg=BG, highlightthickness=0)
+        self.scroll = ttk.Scrollbar(master, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.free = []                  # pooled, hidden _BubbleView
+        self.live = {}                  # message index -> _BubbleView
+        self.width = 0
+        self.follow = True              # keep pinned to the newest message
+        self._pending = False
+        self._view = None
+        self._region = None
+        self._line_px = 20
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<Enter>", lambda e: self.canvas.bind_all("<MouseWheel>", self._on_wheel))
+        self.canvas.bind("<Leave>", lambda e: self.canvas.unbind_all("<MouseWheel>"))
+
+    # ---- geometry ----
+    def _wrap(self) -> int:
+        return min(MAX_CHAT_WIDTH, int((self.width or MAX_CHAT_WIDTH) * 0.6))
+
+    def estimate(self, text: str, is_user) -> int:
+        chars = max(10, self._wrap() // 8)
+        return estimate_height(text, chars, self._line_px, 2 * BUBBLE_PAD[1] + BUBBLE_GAP)
+
+    def _on_configure(self, event):
+        if event.width != self.width:
+            self.width = event.width
+            self.model.reset_heights(self.estimate)
+            self._release(list(self.live))     # re-fill everything with the new wrap width
+        self.schedule()
+
+    def _on_yscroll(self, first, last):
+        self.scroll.set(first, last)
+        if (first, last) != self._view:     # the canvas also reports unchanged views; don't re-render for those
+            self._view = (first, last)
+            self.follow = float(last) >= 0.999
+            self.schedule()
+
+    def _on_wheel(self, event):
+        self.canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
+
+    # ---- model updates ----
+    def append(self, text: str, is_user: bool = False) -> int:
+        idx = self.model.append(text, is_user, self.estimate(text, is_user))
+        self.schedule()
+        return idx
+
+    def set_text(self, idx: int, text: str):
+        self.model.set_text(idx, text)
+        self.model.set_height(idx, self.estimate(text, self.model.users[idx]))
+        v = self.live.get(idx)
+        if v is not None:
+            v.index = None              # re-fill on the next render
+        self.schedule()
+
+    def schedule(self):
+        """Coalesces any number of changes into one render (next frame, or when Tk is idle)."""
+        if not self._pending:
+            self._pending = True
+            if not self.frame_driven:
+                self.canvas.after_idle(self.render)
+
+    def flush(self):
+        if self._pending:
+            self.render()
+
+    # ---- rendering ----
+    def _release(self, indexes):
+        for i in indexes:
+            v = self.live.pop(i)
+            self.canvas.itemconfigure(v.item, state="hidden")
+            v.index = None
+            self.free.append(v)
+
+    def _fill(self, v: _BubbleView, idx: int):
+        is_user = bool(self.model.users[idx])
+        color = USER_BUBBLE if is_user else AI_BUBBLE
+        v.frame.configure(bg=color)
+        v.label.configure(text=self.model.texts[idx], bg=color, wraplength=self._wrap(),
+                          justify="right" if is_user else "left")
+        v.index = idx
+        # a Label computes its requested size on configure, so this is the real height
+        self.model.set_height(idx, v.label.winfo_reqheight() + 2 * BUBBLE_PAD[1] + BUBBLE_GAP)
+
+    def _set_region(self):
+        region = (0, 0, self.width, max(self.model.total_height, self.canvas.winfo_height()))
+        if region != self._region:
+            self._region = region
+            self.canvas.configure(scrollregion=region)
+        if self.follow:
+            self.canvas.yview_moveto(1.0)
+
+    def render(self):
+        self._pending = False
+        m, c = self.model, self.canvas
+        self._set_region()
+        top = int(c.canvasy(0))
+        bottom = top + c.winfo_height()
+        first = m.index_at(max(0, top - TRANSCRIPT_OVERSCAN))
+        last = m.index_at(bottom + TRANSCRIPT_OVERSCAN) if len(m) else -1
+        self._release([i for i in self.live if i < first or i > last])
+        for i in range(first, last + 1):
+            v = self.live.get(i)
+            if v is None:
+                v = self.free.pop() if self.free else _BubbleView(c)
+                self.live[i] = v
+            if v.index != i:
+                self._fill(v, i)
+        # measured heights may differ from the estimates: place after filling
+        for i, v in self.live.items():
+            is_user = m.users[i]
+            c.coords(v.item, self.width - 8 if is_user else 8, m.offset(i) + BUBBLE_GAP // 2)
+            c.itemconfigure(v.item, anchor="ne" if is_user else "nw", state="normal")
+        self._set_region()
+
+    def scroll_to_end(self):
+        self.follow = True
+        self.schedule()
+
+class _Reply:
+    __slots__ = ("idx",)            # transcript index once the bubble exists
+
+    def __init__(self):
+        self.idx = None
+
 class LyraUI:
     def __init__(self):
         self.root = tk.Tk()
@@ -73,6 +224,15 @@ class LyraUI:
         self.root.configure(bg=BG)
 
         self.voice_enabled = tk.BooleanVar(value=False)
+        self._voice_on = False          # plain copy of voice_enabled that workers may read
+        self.voice_enabled.trace_add("write", lambda *a: setattr(self, "_voice_on", self.voice_enabled.get()))
+        self.hands_free = tk.BooleanVar(value=False)
+        self.hands_free.trace_add("write", lambda *a: self._submit("voice", self._hands_free_worker,
+                                                                   self.hands_free.get(), replace=True))
+        self.last_reply_stats = {}      # ttft/total seconds of the last streamed reply
+        self.sched = UIScheduler(self.root)
+        self._voice = None              # voice_input.VoiceInput once the mic has been used
+        self._heard_over_tts = False
 
         # Header
         top = tk.Frame(self.root, bg=BG)
@@ -82,20 +242,20 @@ class LyraUI:
         # Speak toggle
         voice_chk = ttk.Checkbutton(top, text="Speak replies", variable=self.voice_enabled)
         voice_chk.pack(side=tk.RIGHT)
+        hands_free_chk = ttk.Checkbutton(top, text="Hands-free", variable=self.hands_free)
+        hands_free_chk.pack(side=tk.RIGHT, padx=(0, 12))
+        if VOICE_HANDS_FREE:
+            self.root.after(500, lambda: self.hands_free.set(True))     # once the window is up
 
         # Canvas chat area
         mid = tk.Frame(self.root, bg=BG)
         mid.pack(fill=tk.BOTH, expand=True, padx=12, pady=(0,12))
 
-        self.canvas = tk.Canvas(mid, bg=BG, highlightthickness=0)
-        self.scroll = ttk.Scrollbar(mid, orient="vertical", command=self.canvas.yview)
-        self.canvas.configure(yscrollcommand=self.scroll.set)
-        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        self.chat_frame = tk.Frame(self.canvas, bg=BG)
-        self.canvas.create_window((0,0), window=self.chat_frame, anchor="nw")
-        self.chat_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.transcript = TranscriptView(mid, frame_driven=True)
+        self.canvas = self.transcript.canvas
+        self.transcript.model.load_history(TRANSCRIPT_RESTORE, self.transcript.estimate)
+        self.sched.on_frame(self.transcript.flush)      # one layout/scroll pass per frame
+        self.transcript.schedule()
 
         # Bottom entry / buttons
         bottom = tk.Frame(self.root, bg=BG)
@@ -118,25 +278,34 @@ class LyraUI:
         self._post_ai("Hello — I'm Lyra. Type or press 🎤. Try: 'remember X as Y', 'what did i say about X', 'capture', 'read text', 'describe', 'history'.")
 
     # ---------- bubbles ----------
-    def _bubble(self, text, is_user=False):
-        wrap = min(MAX_CHAT_WIDTH, int(self.root.winfo_width() * 0.6 or MAX_CHAT_WIDTH))
-        outer = tk.Frame(self.chat_frame, bg=BG)
-        outer.pack(fill=tk.X, padx=8, pady=6)
-        holder = tk.Frame(outer, bg=BG)
-        holder.pack(anchor="e" if is_user else "w")
-        bubble = tk.Frame(holder, bg=USER_BUBBLE if is_user else AI_BUBBLE, bd=0)
-        bubble.pack()
-        lbl = tk.Label(bubble, text=text, bg=USER_BUBBLE if is_user else AI_BUBBLE,
-                       fg=TXT, font=("Segoe UI", 11), wraplength=wrap, justify="right" if is_user else "left")
-        lbl.pack(padx=12, pady=8)
-        # scroll to bottom
-        self.root.after(50, lambda: self.canvas.yview_moveto(1.0))
+    # Everything here is safe to call from any thread: updates are queued and
+    # applied by the Tk loop, coalesced per frame.
+    def _show(self, text, is_user=False, reply=None):
+        # Tk thread only
+        if reply is not None and reply.idx is not None:
+            self.transcript.set_text(reply.idx, text)
+            return
+        idx = self.transcript.append(text, is_user)
+        self.transcript.scroll_to_end()
+        if reply is not None:
+            reply.idx = idx
 
     def post_user(self, text: str):
-        self._bubble(text, is_user=True)
+        self.sched.post(self._show, text, True)
+
+    def _post_ai(self, text: str, reply=None):
+        """reply: a _Reply handle to grow one bubble in place (later posts replace its text)."""
+        self.sched.post(self._show, text, False, reply, key=None if reply is None else id(reply))
 
-    def _post_ai(self, text: str):
-        self._bubble(text, is_user=False)
+    def _say(self, text: str):
+        # post a reply and, with voice on, speak it
+        self._post_ai(text)
+        if self._voice_on:
+            speak(text)
+
+    def _submit(self, action: str, fn, *args, replace: bool = False):
+        if self.sched.submit(action, fn, *args, replace=replace) is None:
+            self._post_ai("Busy — still working on earlier requests. Try again in a moment.")
 
     # ---------- actions ----------
     def on_send(self):
@@ -144,55 +313,106 @@ class LyraUI:
         if not text:
             return
         self.entry.delete(0, tk.END)
+        stop_speaking()                 # barge-in: don't talk over the next question
         self.post_user(text)
-        threading.Thread(target=self._process_and_reply, args=(text,), daemon=True).start()
+        self._submit("reply", self._process_and_reply, text)
 
     def on_mic(self):
+        stop_speaking()
         self._post_ai("Listening... (say something)")
-        threading.Thread(target=self._mic_worker, daemon=True).start()
+        self._submit("mic", self._mic_worker, replace=True)
+
+    def _get_voice(self):
+        # the capture pipeline stays open after the first use: no per-press calibration or device open
+        if self._voice is None:
+            from voice_input import get_voice
+            v = get_voice()
+            v.on_text = self._on_heard
+            v.on_speech_start = self._on_speech_start
+            self._voice = v
+        return self._voice
+
+    def _mic_worker(self, task):
+        try:
+            v = self._get_voice()
+            txt = v.listen_once(cancelled=lambda: task.cancelled)
+        except Exception:
+            self._post_ai(MIC_UNAVAILABLE)
+            return
+        if task.cancelled:
+            return
+        if txt is None and v.done.is_set():          # capture couldn't start (no device / PyAudio)
+            self._post_ai(MIC_UNAVAILABLE)
+            return
+        if not txt:
+            if v.error is not None:
+                self._post_ai(f"Speech recognition error: {v.error}")
+                v.error = None
+            else:
+                self._say(DIDNT_CATCH)
+            return
+        self.post_user(txt)
+        self._process_and_reply(task, txt)
 
-    def _mic_worker(self):
+    def _hands_free_worker(self, task, on: bool):
         try:
-            import speech_recognition as sr
-            r = sr.Recognizer()
-            with sr.Microphone() as src:
-                r.adjust_for_ambient_noise(src, duration=0.6)
-                audio = r.listen(src, phrase_time_limit=8)
-            try:
-                txt = r.recognize_google(audio)
-            except sr.UnknownValueError:
-                self._post_ai("Sorry — I didn't catch that.")
-                return
-            except Exception as e:
-                self._post_ai(f"Speech recognition error: {e}")
-                return
-            self.post_user(txt)
-            resp = handle_command(txt)
-            self._post_ai(resp)
-            if self.voice_enabled.get() and resp:
-                speak(resp)
+            v = self._get_voice()
+            v.set_hands_free(on)
+            if on:
+                v.start()
         except Exception:
-            self._post_ai("Mic not available (install PyAudio & SpeechRecognition).")
+            self._post_ai(MIC_UNAVAILABLE)
+
+    def _on_speech_start(self):
+        # capture thread; speech that starts while Lyra is talking is likely her own voice through the mic
+        self._heard_over_tts = not get_tts().idle.is_set()
+
+    def _on_heard(self, text: str, heard):
+        # recognizer thread, hands-free mode only
+        if self._heard_over_tts:
+            return
+        self.post_user(text)
+        self._submit("reply", self._process_and_reply, text)
 
     def on_capture(self):
         self._post_ai("Capturing...")
-        threading.Thread(target=self._capture_worker, daemon=True).start()
+        self._submit("capture", self._capture_worker)
 
-    def _capture_worker(self):
+    def _capture_worker(self, task):
+        from ocr_tools import capture_image
         p = capture_image()
+        if task.cancelled:
+            return
         if not p:
-            self._post_ai("Camera not available / capture failed.")
+            self._say(CAPTURE_FAILED)
             return
         self._post_ai(f"Captured to {p}. You can say 'read text' or 'describe'.")
 
-    def _process_and_reply(self, text: str):
-        resp = handle_command(text)
-        # ensure string
-        if not isinstance(resp, str):
-            resp = str(resp)
-        self._post_ai(resp)
-        if self.voice_enabled.get() and resp:
+    def _process_and_reply(self, task, text: str):
+        # grow one bubble in place as fragments arrive; the scheduler applies only the newest text per frame
+        stats = {}
+        reply, resp = _Reply(), ""
+        for piece in handle_command_stream(text, stats=stats):
+            if task.cancelled:
+                break
+            resp += piece if isinstance(piece, str) else str(piece)
+            self._post_ai(resp, reply)
+        self.last_reply_stats = stats
+        if self._voice_on and resp and not task.cancelled:
             speak(resp)
 
+    def ui_stats(self) -> dict:
+        """Frame rate, update queue depth and worker task counts."""
+        return self.sched.stats()
+
+    def _on_close(self):
+        self.sched.stop()
+        stop_speaking()
+        if self._voice is not None:
+            self._voice.stop()
+        self.root.destroy()
+
     def run(self):
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.sched.start()
         self.root.mainloop()
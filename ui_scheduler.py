@@ -0,0 +1,161 @@
+# ui_scheduler.py - bounded background work + main-thread update queue drained once per Tk frame
+import time, queue, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import UI_WORKERS, UI_MAX_PENDING, UI_FRAME_MS, UI_FRAME_BUDGET_MS
+
+class Task:
+    """Handle for one submitted action; workers poll .cancelled between steps."""
+    __slots__ = ("action", "_cancel", "future")
+
+    def __init__(self, action: str):
+        self.action = action
+        self._cancel = threading.Event()
+        self.future = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+class UIScheduler:
+    """
+    Workers never touch Tk. They submit() their blocking work to a bounded
+    pool and post() UI updates to a thread-safe queue; the Tk loop drains
+    that queue every UI_FRAME_MS, spending at most UI_FRAME_BUDGET_MS per
+    frame. Posts sharing a key within one frame collapse into the last one
+    (e.g. a streaming reply's text), and on_frame callbacks (layout, scroll)
+    run once per frame after the batch.
+    """
+    def __init__(self, root, workers: int = UI_WORKERS, max_pending: int = UI_MAX_PENDING,
+                 frame_ms: int = UI_FRAME_MS, budget_ms: float = UI_FRAME_BUDGET_MS):
+        self.root = root
+        self.max_pending = max_pending
+        self.frame_ms = frame_ms
+        self.budget = budget_ms / 1000.0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ui-worker")
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._tasks = {}                # action -> set of live Tasks
+        self._pending = 0               # submitted, not yet started
+        self._frame_hooks = []
+        self._frame_times = deque(maxlen=120)
+        self._running = False
+        self.counters = {"frames": 0, "posted": 0, "applied": 0, "coalesced": 0, "max_queue_depth": 0,
+                         "rejected": 0, "slow_frames": 0}
+
+    # ---- worker side ----
+    def submit(self, action: str, fn, *args, replace: bool = False):
+        """
+        Runs fn(task, *args) on the pool. replace cancels earlier tasks of the
+        same action first. Returns the Task, or None when too much work is queued.
+        """
+        if replace:
+            self.cancel(action)
+        task = Task(action)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                return None
+            self._pending += 1
+            self._tasks.setdefault(action, set()).add(task)
+        task.future = self._pool.submit(self._run, task, fn, args)
+        task.future.add_done_callback(lambda f: f.cancelled() and self._forget(task, started=False))
+        return task
+
+    def _forget(self, task: Task, started: bool):
+        with self._lock:
+            if not started:
+                self._pending -= 1
+            self._tasks.get(task.action, set()).discard(task)
+
+    def _run(self, task: Task, fn, args):
+        with self._lock:
+            self._pending -= 1
+        try:
+            if not task.cancelled:
+                fn(task, *args)
+        finally:
+            self._forget(task, started=True)
+
+    def cancel(self, action: str | None = None):
+        """Cancels running and queued tasks of one action (or all)."""
+        with self._lock:
+            tasks = [t for a, ts in self._tasks.items() if action is None or a == action for t in ts]
+        for t in tasks:
+            t.cancel()
+
+    def post(self, fn, *args, key=None):
+        """Thread-safe: run fn(*args) on the Tk thread in the next frame."""
+        self._queue.put((key, fn, args))
+        self.counters["posted"] += 1
+
+    # ---- Tk side ----
+    def on_frame(self, fn):
+        """fn() runs on the Tk thread at the end of every frame; keep it cheap when there's nothing to do."""
+        self._frame_hooks.append(fn)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.frame_ms, self._frame)
+
+    def stop(self):
+        self._running = False
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _frame(self):
+        if not self._running:
+            return
+        t0 = time.perf_counter()
+        self._frame_times.append(t0)
+        self.counters["frames"] += 1
+        try:
+            self.drain(deadline=t0 + self.budget)
+        finally:
+            if time.perf_counter() - t0 > self.frame_ms / 1000.0:
+                self.counters["slow_frames"] += 1
+            self.root.after(self.frame_ms, self._frame)
+
+    def drain(self, deadline: float | None = None) -> int:
+        """Applies queued updates (coalesced by key) until empty or past deadline; returns how many ran."""
+        depth = self._queue.qsize()
+        if depth > self.counters["max_queue_depth"]:
+            self.counters["max_queue_depth"] = depth
+        batch, keyed = [], {}
+        while deadline is None or time.perf_counter() < deadline:
+            try:
+                key, fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if key is not None and key in keyed:
+                batch[keyed[key]] = (fn, args)       # keep its place, apply only the newest
+                self.counters["coalesced"] += 1
+                continue
+            if key is not None:
+                keyed[key] = len(batch)
+            batch.append((fn, args))
+        for fn, args in batch:
+            try:
+                fn(*args)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+        self.counters["applied"] += len(batch)
+        for hook in self._frame_hooks:
+            hook()
+        return len(batch)
+
+    def stats(self) -> dict:
+        """Counters plus current fps (frames in the last second), queue depth and task counts."""
+        now = time.perf_counter()
+        with self._lock:
+            running = sum(len(ts) for ts in self._tasks.values()) - self._pending
+            pending = self._pending
+        return {**self.counters, "fps": sum(1 for t in self._frame_times if now - t <= 1.0),
+                "queue_depth": self._queue.qsize(), "tasks_running": running, "tasks_pending": pending}
@@ -0,0 +1,459 @@
+# voice_input.py - persistent audio capture, energy VAD endpointing, pluggable speech recognizers
+import json, time, wave, queue, threading
+import numpy as np
+from config import (VOICE_RECOGNIZER, VOSK_MODEL_PATH, VOICE_DEVICE, VOICE_HANDS_FREE, VOICE_RATE,
+                    VOICE_CHUNK_MS, VOICE_FRAME_MS, VOICE_BUFFER_SECONDS, VOICE_CALIBRATE_SECONDS,
+                    VOICE_START_DB, VOICE_START_MS, VOICE_END_DB, VOICE_HANGOVER_MS, VOICE_PREROLL_MS,
+                    VOICE_MIN_UTTERANCE_MS, VOICE_MAX_UTTERANCE, VOICE_LISTEN_TIMEOUT)
+from tracing import record
+
+# ---- audio sources: chunks(stop) yields mono int16 arrays at .rate ----
+class MicrophoneSource:
+    """The default (or VOICE_DEVICE) input through PyAudio, opened once for as long as capture runs."""
+    def __init__(self, rate: int = VOICE_RATE, chunk_ms: int = VOICE_CHUNK_MS, device=VOICE_DEVICE):
+        self.rate = rate
+        self.chunk = rate * chunk_ms // 1000
+        self.device = int(device) if str(device).isdigit() else None
+
+    def chunks(self, stop: threading.Event):
+        import pyaudio
+        pa = pyaudio.PyAudio()
+        stream = pa.open(format=pyaudio.paInt16, channels=1, rate=self.rate, input=True,
+                         frames_per_buffer=self.chunk, input_device_index=self.device)
+        try:
+            while not stop.is_set():
+                yield np.frombuffer(stream.read(self.chunk, exception_on_overflow=False), dtype=np.int16)
+        finally:
+            stream.stop_stream()
+            stream.close()
+            pa.terminate()
+
+class WavFileSource:
+    """
+    A WAV file as if it were the microphone (fixtures, benchmarks): mixed
+    down to mono and resampled to rate. realtime paces chunks at playback
+    speed; otherwise they come as fast as they're consumed.
+    """
+    def __init__(self, path: str, rate: int = VOICE_RATE, chunk_ms: int = VOICE_CHUNK_MS, realtime: bool = False):
+        self.path = path
+        self.rate = rate
+        self.chunk = rate * chunk_ms // 1000
+        self.realtime = realtime
+
+    def load(self) -> np.ndarray:
+        with wave.open(self.path, "rb") as w:
+            ch, width, src_rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            raw = w.readframes(w.getnframes())
+        if width == 1:
+            x = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) * 256
+        elif width == 2:
+            x = np.frombuffer(raw, "<i2").astype(np.float32)
+        elif width == 4:
+            x = np.frombuffer(raw, "<i4").astype(np.float32) / 65536
+        else:
+            raise ValueError(f"unsupported sample width {width}")
+        x = x.reshape(-1, ch).mean(axis=1)
+        if src_rate != self.rate and len(x):
+            n = int(len(x) * self.rate / src_rate)
+            x = np.interp(np.arange(n) * (src_rate / self.rate), np.arange(len(x)), x)
+        return np.clip(x, -32768, 32767).astype(np.int16)
+
+    def chunks(self, stop: threading.Event):
+        x = self.load()
+        step = self.chunk / self.rate
+        t_next = time.monotonic()
+        for i in range(0, len(x), self.chunk):
+            if stop.is_set():
+                return
+            if self.realtime:
+                t_next += step
+                time.sleep(max(0.0, t_next - time.monotonic()))
+            yield x[i:i + self.chunk]
+
+def write_wav(path: str, samples: np.ndarray, rate: int = VOICE_RATE):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+
+# ---- ring buffer addressed by absolute sample index ----
+class AudioRing:
+    """The last `seconds` of audio; read(start, end) takes absolute sample positions (clamped to what's kept)."""
+    def __init__(self, rate: int, seconds: float = VOICE_BUFFER_SECONDS):
+        self.buf = np.zeros(int(rate * seconds), dtype=np.int16)
+        self.total = 0                  # samples ever written
+        self._lock = threading.Lock()
+
+    def write(self, x: np.ndarray):
+        cap = len(self.buf)
+        with self._lock:
+            if len(x) >= cap:
+                self.total += len(x)
+                self.buf[:] = x[-cap:]
+                self.buf[:] = np.roll(self.buf, self.total % cap)
+                return
+            i = self.total % cap
+            first = min(len(x), cap - i)
+            self.buf[i:i + first] = x[:first]
+            self.buf[:len(x) - first] = x[first:]
+            self.total += len(x)
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        cap = len(self.buf)
+        with self._lock:
+            start, end = max(start, self.total - cap, 0), min(end, self.total)
+            if end <= start:
+                return np.zeros(0, dtype=np.int16)
+            idx = np.arange(start, end) % cap
+            return self.buf[idx]
+
+# ---- voice activity detection ----
+class EnergyVAD:
+    """
+    Per-frame energy (dBFS) computed a chunk at a time with NumPy, compared
+    against a noise floor that's estimated once over the first calibrate_s
+    seconds and then follows the non-speech frames (quickly down, slowly
+    up). Speech starts after start_ms of frames start_db above the floor
+    and ends after hangover_ms of frames under floor + end_db.
+    process(chunk) returns [("start" | "end", sample_index)], where an end
+    index is just past the last voiced frame.
+    """
+    def __init__(self, rate: int = VOICE_RATE, frame_ms: int = VOICE_FRAME_MS, start_db: float = VOICE_START_DB,
+                 end_db: float = VOICE_END_DB, start_ms: int = VOICE_START_MS, hangover_ms: int = VOICE_HANGOVER_MS,
+                 calibrate_s: float = VOICE_CALIBRATE_SECONDS, min_dbfs: float = -70.0):
+        self.frame = rate * frame_ms // 1000
+        self.start_db, self.end_db, self.min_dbfs = start_db, end_db, min_dbfs
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hang_frames = max(1, hangover_ms // frame_ms)
+        self.calib_frames = int(calibrate_s * 1000 / frame_ms)
+        self.floor = None
+        self.in_speech = False
+        self.last_voiced = 0            # sample index just past the last voiced frame
+        self._calib = []
+        self._rest = np.zeros(0, dtype=np.int16)
+        self._pos = 0                   # frames processed
+        self._run = 0                   # consecutive frames counting toward a start / end
+
+    def frame_db(self, x: np.ndarray) -> np.ndarray:
+        n = len(x) // self.frame
+        f = x[:n * self.frame].astype(np.float32).reshape(n, self.frame)
+        rms = np.sqrt(np.mean(f * f, axis=1)) / 32768.0
+        return 20.0 * np.log10(rms + 1e-10)
+
+    def process(self, chunk: np.ndarray) -> list:
+        x = np.concatenate((self._rest, chunk)) if len(self._rest) else chunk
+        db = self.frame_db(x)
+        self._rest = x[len(db) * self.frame:]
+        if self.floor is None:
+            self._calib.extend(db.tolist())
+            self._pos += len(db)
+            if len(self._calib) >= self.calib_frames:
+                self.floor = max(float(np.median(self._calib)), self.min_dbfs)
+                self._calib = []
+            return []
+        events = []
+        start_at, end_at = self.floor + self.start_db, self.floor + self.end_db
+        for i, d in enumerate(db):
+            if not self.in_speech:
+                self._run = self._run + 1 if d > start_at else 0
+                if self._run >= self.start_frames:
+                    self.in_speech, self._run = True, 0
+                    self.last_voiced = (self._pos + i + 1) * self.frame
+                    events.append(("start", (self._pos + i + 1 - self.start_frames) * self.frame))
+            elif d >= end_at:
+                self._run = 0
+                self.last_voiced = (self._pos + i + 1) * self.frame
+            else:
+                self._run += 1
+                if self._run >= self.hang_frames:
+                    self.in_speech, self._run = False, 0
+                    events.append(("end", self.last_voiced))
+        self._pos += len(db)
+        quiet = db[db < start_at] if not self.in_speech else db[:0]
+        if len(quiet):
+            m = float(np.median(quiet))
+            # follow a falling floor quickly, a rising one slowly (so speech doesn't raise it)
+            self.floor += (0.5 if m < self.floor else 0.05) * (m - self.floor)
+            self.floor = max(self.floor, self.min_dbfs)
+        return events
+
+    def flush(self) -> list:
+        """Ends an utterance still open when the source runs out."""
+        if self.in_speech:
+            self.in_speech = False
+            return [("end", self.last_voiced)]
+        return []
+
+# ---- recognizers: recognize(samples int16, rate) -> text ("" when nothing was understood) ----
+def _audio_data(samples: np.ndarray, rate: int):
+    import speech_recognition as sr
+    return sr.AudioData(samples.astype("<i2").tobytes(), rate, 2)
+
+class GoogleRecognizer:
+    name = "google"
+
+    def recognize(self, samples: np.ndarray, rate: int) -> str:
+        import speech_recognition as sr
+        try:
+            return sr.Recognizer().recognize_google(_audio_data(samples, rate))
+        except sr.UnknownValueError:
+            return ""
+
+class SphinxRecognizer:
+    """Offline, through speech_recognition + pocketsphinx."""
+    name = "sphinx"
+
+    def recognize(self, samples: np.ndarray, rate: int) -> str:
+        import speech_recognition as sr
+        try:
+            return sr.Recognizer().recognize_sphinx(_audio_data(samples, rate))
+        except sr.UnknownValueError:
+            return ""
+
+class VoskRecognizer:
+    """Offline, with a local Vosk model (loaded once, on first use)."""
+    name = "vosk"
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def recognize(self, samples: np.ndarray, rate: int) -> str:
+        import vosk
+        with self._lock:
+            if self._model is None:
+                self._model = vosk.Model(self.model_path) if self.model_path else vosk.Model(lang="en-us")
+        rec = vosk.KaldiRecognizer(self._model, rate)
+        rec.AcceptWaveform(samples.astype("<i2").tobytes())
+        return json.loads(rec.FinalResult()).get("text", "")
+
+class FakeRecognizer:
+    """No model: after `delay` seconds returns text_fn(samples, rate), by default a description of the clip."""
+    name = "fake"
+
+    def __init__(self, delay: float = 0.05, text_fn=None):
+        self.delay = delay
+        self.text_fn = text_fn or (lambda s, r: f"utterance of {len(s) / r:.2f} seconds")
+
+    def recognize(self, samples: np.ndarray, rate: int) -> str:
+        time.sleep(self.delay)
+        return self.text_fn(samples, rate)
+
+def make_recognizer(mode: str = VOICE_RECOGNIZER):
+    if mode == "vosk":
+        return VoskRecognizer()
+    if mode == "sphinx":
+        return SphinxRecognizer()
+    if mode == "fake":
+        return FakeRecognizer()
+    return GoogleRecognizer()
+
+# ---- the pipeline ----
+class Heard:
+    __slots__ = ("text", "start", "end", "rate", "end_to_text")
+
+    def __init__(self, text, start, end, rate, end_to_text):
+        self.text, self.start, self.end, self.rate, self.end_to_text = text, start, end, rate, end_to_text
+
+    def __repr__(self):
+        return (f"Heard({self.text!r}, {self.start / self.rate:.2f}-{self.end / self.rate:.2f}s, "
+                f"end_to_text={self.end_to_text * 1000:.0f}ms)")
+
+class _Waiter:
+    __slots__ = ("since", "event", "heard", "caught")
+
+    def __init__(self, since: int):
+        self.since = since              # sample index at the press; utterances ending before it don't count
+        self.event = threading.Event()
+        self.heard = None
+        self.caught = False             # an utterance for it is being recognized
+
+class VoiceInput:
+    """
+    One capture thread keeps the source open, fills an AudioRing and runs
+    the VAD on every chunk; finished utterances go to a recognizer thread,
+    so recognition never stalls capture. An utterance is only recognized
+    when someone wants it: a listen_once() caller whose press came before
+    the speech ended, or on_text in hands-free mode. on_speech_start fires
+    as soon as speech is detected (e.g. to stop TTS talking over the user).
+    end_to_text is the time from the chunk holding the last voiced audio
+    to the recognized text (endpoint hangover + recognition).
+    """
+    def __init__(self, source=None, recognizer=None, hands_free: bool = VOICE_HANDS_FREE, on_text=None,
+                 on_speech_start=None, preroll_ms: int = VOICE_PREROLL_MS,
+                 min_utterance_ms: int = VOICE_MIN_UTTERANCE_MS, max_utterance: float = VOICE_MAX_UTTERANCE, vad=None):
+        self.source = source or MicrophoneSource()
+        self.rate = self.source.rate
+        self.recognizer = recognizer or make_recognizer()
+        self.hands_free = hands_free
+        self.on_text = on_text
+        self.on_speech_start = on_speech_start
+        self.vad = vad or EnergyVAD(self.rate)
+        self.ring = AudioRing(self.rate)
+        self.preroll = self.rate * preroll_ms // 1000
+        self.min_samples = self.rate * min_utterance_ms // 1000
+        self.max_samples = int(self.rate * max_utterance)
+        self.error = None               # why capture stopped, if it failed
+        self.done = threading.Event()   # the source ran out / capture stopped
+        self._stop = threading.Event()
+        self._jobs = queue.Queue(maxsize=8)
+        self._waiters = []              # _Waiter per pending listen_once()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._utt_start = None
+        self._voiced_at = 0.0           # monotonic time of the chunk with the latest voiced audio
+        self.stats = {"utterances": 0, "recognized": 0, "empty": 0, "skipped": 0, "dropped": 0,
+                      "errors": 0, "last_end_to_text": None}
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running:
+            return self
+        self._stop.clear()
+        self.done.clear()
+        self._threads = [threading.Thread(target=self._capture, name="voice-capture", daemon=True),
+                         threading.Thread(target=self._recognize_loop, name="voice-recognize", daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._jobs.put(None)
+
+    def set_hands_free(self, on: bool):
+        self.hands_free = on
+
+    def listen_once(self, timeout: float = VOICE_LISTEN_TIMEOUT, cancelled=None) -> str | None:
+        """
+        Text of the next utterance that ends after this call (speech already
+        in progress counts), "" if it couldn't be understood, None when no
+        speech started within timeout or cancelled() became true.
+        """
+        self.start()
+        waiter = _Waiter(self.ring.total)
+        with self._lock:
+            self._waiters.append(waiter)
+        deadline = time.monotonic() + timeout
+        try:
+            while not waiter.event.wait(0.05):
+                if cancelled is not None and cancelled():
+                    return None
+                if self.done.is_set() and not waiter.caught:
+                    return None
+                # the timeout only covers waiting for speech to start
+                if self._utt_start is None and not waiter.caught and time.monotonic() > deadline:
+                    return None
+            return waiter.heard.text
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _capture(self):
+        try:
+            for chunk in self.source.chunks(self._stop):
+                now = time.monotonic()
+                self.ring.write(chunk)
+                voiced_before = self.vad.last_voiced
+                events = self.vad.process(chunk)
+                if self.vad.last_voiced != voiced_before:
+                    self._voiced_at = now
+                self._handle(events)
+                if self._utt_start is not None and self.vad.last_voiced - self._utt_start > self.max_samples:
+                    # cut very long speech; the rest continues as a new utterance
+                    end = self.vad.last_voiced
+                    self._finish(self._utt_start, end)
+                    self._utt_start = end
+                if self._stop.is_set():
+                    break
+            self._handle(self.vad.flush())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+            self._jobs.put(None)
+
+    def _handle(self, events):
+        for kind, pos in events:
+            if kind == "start":
+                self._utt_start = max(0, pos - self.preroll)
+                if self.on_speech_start is not None:
+                    try:
+                        self.on_speech_start()
+                    except Exception:
+                        pass
+            elif self._utt_start is not None:
+                self._finish(self._utt_start, pos)
+                self._utt_start = None
+
+    def _finish(self, start: int, end: int):
+        self.stats["utterances"] += 1
+        if end - start < self.min_samples:
+            return
+        with self._lock:
+            waiters = [w for w in self._waiters if w.since <= end and not w.caught]
+            for w in waiters:
+                w.caught = True
+        if not waiters and not self.hands_free:
+            self.stats["skipped"] += 1
+            return
+        audio = self.ring.read(start, end + self.rate // 10)        # 100 ms of tail
+        try:
+            self._jobs.put_nowait((audio, start, end, self._voiced_at))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            for w in waiters:
+                w.caught = False
+
+    def _recognize_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                if self._stop.is_set() or self.done.is_set():
+                    return
+                continue
+            audio, start, end, voiced_at = job
+            t0 = time.perf_counter()
+            try:
+                text = (self.recognizer.recognize(audio, self.rate) or "").strip()
+            except Exception as e:
+                self.stats["errors"] += 1
+                text, self.error = "", e
+            record("voice.recognize", time.perf_counter() - t0)
+            latency = time.monotonic() - voiced_at
+            record("voice.end_to_text", latency)
+            self.stats["last_end_to_text"] = latency
+            self.stats["recognized" if text else "empty"] += 1
+            heard = Heard(text, start, end, self.rate, latency)
+            with self._lock:
+                waiters = [w for w in self._waiters if w.caught and w.since <= end and not w.event.is_set()]
+            for w in waiters:
+                w.heard = heard
+                w.event.set()
+            if self.hands_free and not waiters and self.on_text is not None and text:
+                try:
+                    self.on_text(text, heard)
+                except Exception:
+                    pass
+
+_voice = None
+_voice_lock = threading.Lock()
+
+def get_voice() -> VoiceInput:
+    """The shared microphone pipeline (created on first use; capture starts on the first listen)."""
+    global _voice
+    with _voice_lock:
+        if _voice is None:
+            _voice = VoiceInput()
+    return _voice
+
+def stop_voice():
+    with _voice_lock:
+        if _voice is not None:
+            _voice.stop()
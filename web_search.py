@@ -1,35 +1,60 @@
 # web_search.py - DuckDuckGo HTML fallback then try summarizing using LLM
+import re, json, time, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
-from bs4 import BeautifulSoup
-from config import SEARCH_TIMEOUT, USER_AGENT
-from llm_adapter import chat
+from requests.adapters import HTTPAdapter
+from config import (SEARCH_TIMEOUT, SEARCH_URL, USER_AGENT, WEB_FETCH_TOP_N, WEB_FETCH_WORKERS, WEB_MIN_PAGE_CHARS,
+                    WEB_MAX_BYTES, WEB_TEXT_LIMIT, WEB_PARSER, WEB_CACHE_FILE, WEB_PAGE_TTL, WEB_SERP_TTL)
+from llm_adapter import chat_stream
+from disk_cache import DiskCache
+from html_extract import extract_text
+from tracing import traced
 
 HEADERS = {"User-Agent": USER_AGENT}
 
-def search_web_fallback(query: str) -> str:
+# one session = one connection pool per host, shared by the fetch workers
+_http = None
+_http_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=WEB_FETCH_WORKERS, thread_name_prefix="web-fetch")
+
+_serp_cache = DiskCache(WEB_CACHE_FILE, ttl=WEB_SERP_TTL, max_entries=2000, table="serp")
+_page_cache = DiskCache(WEB_CACHE_FILE, ttl=WEB_PAGE_TTL, max_entries=2000, table="pages")
+
+def _get_http() -> requests.Session:
+    global _http
+    with _http_lock:
+        if _http is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=WEB_FETCH_WORKERS)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers.update(HEADERS)
+            _http = s
+    return _http
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+@traced("web.search")
+def search_web_fallback(query: str, cancel: threading.Event | None = None, timeout: float = 60) -> str:
     """
-    Try DuckDuckGo page scrape and summarize the first result with the local LLM.
-    If LLM is offline, return top links.
+    Try DuckDuckGo page scrape and summarize the best of the top results with the local LLM.
+    If LLM is offline, return top links. The summary only gets what is left
+    of timeout; setting cancel stops page fetches and aborts the summary.
     """
+    until = time.monotonic() + timeout
     try:
-        url = f"https://duckduckgo.com/html/?q={requests.utils.quote(query)}"
-        r = requests.get(url, headers=HEADERS, timeout=SEARCH_TIMEOUT)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        results = []
-        for a in soup.select("a.result__a")[:3]:
-            title = a.get_text(strip=True)
-            href = a.get("href", "")
-            results.append({"title": title, "url": href})
+        results = _search(query)
         if not results:
             return "I couldn't find anything relevant online."
 
-        # Try fetch first url text and summarize
-        first_url = results[0]["url"]
-        page_text = _fetch_text(first_url)
-        if len(page_text) > 200:
-            summary = chat(f"Summarize the key points of this page for a user question '{query}':\n\n{page_text[:4000]}")
-            if summary and not summary.startswith("(LLM offline/error)"):
+        # Fetch the top pages concurrently; the first with enough text gets summarized
+        page_text = _first_rich_page([r_["url"] for r_ in results[:WEB_FETCH_TOP_N]], cancel=cancel)
+        left = until - time.monotonic()
+        if page_text and left > 0 and not (cancel is not None and cancel.is_set()):
+            prompt = f"Summarize the key points of this page for a user question '{query}':\n\n{page_text[:WEB_TEXT_LIMIT]}"
+            summary = "".join(chat_stream(prompt, timeout=left, cancel=cancel)).strip()
+            if summary and not summary.startswith("(LLM offline/error)") and not (cancel is not None and cancel.is_set()):
                 return summary
 
         # fallback: return links
@@ -40,14 +65,70 @@ def search_web_fallback(query: str) -> str:
     except Exception as e:
         return f"Search error: {e}"
 
-def _fetch_text(url: str) -> str:
+@traced("web.serp")
+def _search(query: str) -> list:
+    """Top DuckDuckGo results as [{"title", "url"}], cached per normalized query."""
+    key = _normalize_query(query)
+    cached = _serp_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    url = f"{SEARCH_URL}?q={requests.utils.quote(query)}"
+    r = _get_http().get(url, timeout=SEARCH_TIMEOUT)
+    r.raise_for_status()
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(r.text, "html.parser")
+    results = []
+    for a in soup.select("a.result__a")[:3]:
+        title = a.get_text(strip=True)
+        href = a.get("href", "")
+        results.append({"title": title, "url": href})
+    if results:
+        _serp_cache.put(key, json.dumps(results))
+    return results
+
+def _first_rich_page(urls: list, timeout: float = SEARCH_TIMEOUT, cancel: threading.Event | None = None) -> str:
+    """
+    Fetches urls in the worker pool and returns the first extracted text
+    longer than WEB_MIN_PAGE_CHARS, or "". Losing fetches are cancelled,
+    and so is everything if the caller sets cancel.
+    """
+    stop = threading.Event()
+    if cancel is not None and cancel.is_set():
+        return ""
+    futures = [_pool.submit(_fetch_text, u, stop) for u in urls]
+    pending, deadline = set(futures), time.monotonic() + timeout
+    try:
+        # short waits so a cancel lands while every page is still loading
+        while pending and not (cancel is not None and cancel.is_set()):
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=min(left, 0.1), return_when=FIRST_COMPLETED)
+            for f in done:
+                text = f.result()
+                if len(text) > WEB_MIN_PAGE_CHARS:
+                    return text
+    finally:
+        stop.set()
+        for f in futures:
+            f.cancel()
+    return ""
+
+@traced("web.fetch")
+def _fetch_text(url: str, cancel: threading.Event | None = None) -> str:
+    cached = _page_cache.get(url)
+    if cached is not None:
+        return cached
     try:
-        r = requests.get(url, headers=HEADERS, timeout=SEARCH_TIMEOUT)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        for tag in soup(["script","style","noscript"]):
-            tag.extract()
-        text = " ".join(soup.get_text(separator=" ").split())
+        with _get_http().get(url, timeout=SEARCH_TIMEOUT, stream=True) as r:
+            r.raise_for_status()
+            # requests assumes latin-1 for text/* without a charset; most pages are utf-8
+            enc = r.encoding if "charset" in r.headers.get("content-type", "").lower() else "utf-8"
+            # incremental parse of at most WEB_MAX_BYTES; the connection is dropped once enough text is in
+            text = extract_text(r.iter_content(chunk_size=16384), encoding=enc, limit=WEB_TEXT_LIMIT,
+                                max_bytes=WEB_MAX_BYTES, backend=WEB_PARSER, cancel=cancel)
+        if text:
+            _page_cache.put(url, text)
         return text
     except Exception:
         return ""